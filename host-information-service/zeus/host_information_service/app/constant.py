@@ -11,6 +11,9 @@
 # See the Mulan PSL v2 for more details.
 # ******************************************************************************/
 
+# redis hash of host_id -> revision token, refreshed whenever the connection info of a host changes,
+# so that consumers caching resolved host info (e.g. compiled task workflows) can tell it is stale
+HOST_REVISIONS = "host_revisions"
 
 # host template file content
 HOST_TEMPLATE_FILE_CONTENT_FOR_ZH = """host_ip,ssh_port,ssh_user,password,ssh_pkey,host_name,host_group_name,management
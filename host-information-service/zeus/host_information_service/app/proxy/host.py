@@ -15,6 +15,7 @@ import uuid
 from typing import Any, Dict, List, Optional, Tuple
 
 import sqlalchemy
+from redis import RedisError
 from sqlalchemy import or_
 from vulcanus.cache import RedisCacheManage
 from vulcanus.conf.constant import HOST_DELETE_TASK
@@ -33,6 +34,7 @@ from vulcanus.restful.resp.state import (
 )
 
 from zeus.host_information_service.app import cache
+from zeus.host_information_service.app.constant import HOST_REVISIONS
 from zeus.host_information_service.app.serialize.host import (
     GetHostsPage_ResponseSchema,
     HostsInfo_ResponseSchema,
@@ -314,6 +316,7 @@ class HostProxy(MysqlProxy):
             RedisProxy.redis_connect.delete(RedisCacheManage.GROUPS_HOSTS)
             RedisProxy.redis_connect.delete(*RedisProxy.redis_connect.keys("*_group_hosts"))
             RedisProxy.redis_connect.publish(HOST_DELETE_TASK, json.dumps(host_ids))
+            self._refresh_host_revisions(host_ids)
             return SUCCEED
         except sqlalchemy.exc.SQLAlchemyError as error:
             LOGGER.error(error)
@@ -373,12 +376,29 @@ class HostProxy(MysqlProxy):
                 wait_update_host_info, synchronize_session=False
             )
             self.session.commit()
+            self._refresh_host_revisions([host_id])
             return SUCCEED
         except sqlalchemy.exc.SQLAlchemyError as error:
             LOGGER.error(error)
             self.session.rollback()
             return DATABASE_UPDATE_ERROR
 
+    @staticmethod
+    def _refresh_host_revisions(host_ids: list) -> None:
+        """
+        Refresh the revision token of the hosts so that cached host info elsewhere is invalidated
+
+        Args:
+            host_ids: host id list
+        """
+        if not host_ids:
+            return
+        revision = uuid.uuid4().hex
+        try:
+            RedisProxy.redis_connect.hset(HOST_REVISIONS, mapping={host_id: revision for host_id in host_ids})
+        except RedisError as error:
+            LOGGER.warning("refresh revision of hosts %s fail: %s", host_ids, error)
+
     def get_host_info(self, host_id: str) -> Host:
         try:
             host = (
@@ -522,6 +542,46 @@ class HostProxy(MysqlProxy):
             LOGGER.error("query host fail")
             return DATABASE_QUERY_ERROR, None
 
+    def get_hosts_by_ids(self, host_ids: list):
+        """
+        Get hosts info in batch, including ssh login info and cluster name
+
+        Args:
+            host_ids: e.g. ["host_id1", "host_id2"]
+
+        Returns:
+            tuple: status code and {"hosts": [host info], "not_found_ids": []}
+        """
+        groups = cache.get_user_group_hosts()
+        if not groups:
+            return SUCCEED, {"hosts": [], "not_found_ids": host_ids}
+        try:
+            hosts = (
+                self.session.query(
+                    Host.host_id,
+                    Host.host_name,
+                    Host.host_group_name,
+                    Host.host_group_id,
+                    Host.host_ip,
+                    Host.ssh_port,
+                    Host.ssh_user,
+                    Host.pkey,
+                    Host.cluster_id,
+                    Cluster.cluster_name,
+                )
+                .outerjoin(Cluster, Cluster.cluster_id == Host.cluster_id)
+                .filter(Host.host_id.in_(host_ids), Host.host_group_id.in_(list(groups.keys())))
+                .all()
+            )
+            found_ids = {host.host_id for host in hosts}
+            not_found_ids = [host_id for host_id in host_ids if host_id not in found_ids]
+            result = {"hosts": HostsInfo_ResponseSchema(many=True).dump(hosts), "not_found_ids": not_found_ids}
+            return SUCCEED, result
+        except sqlalchemy.exc.SQLAlchemyError as error:
+            LOGGER.error(error)
+            LOGGER.error("query host fail")
+            return DATABASE_QUERY_ERROR, {}
+
     def get_ips_hosts(self, filter_param: dict):
         """
         Get the filtered hosts by ips
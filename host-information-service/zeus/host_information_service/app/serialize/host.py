@@ -157,6 +157,18 @@ class BatchHostsSchema(Schema):
     host_ids = fields.List(fields.String(required=True), required=True, validate=lambda s: len(s) > 0)
 
 
+class HostBatchQuerySchema(Schema):
+    """
+    Query host info in batch, at most 1000 hosts per request
+    """
+
+    host_ids = fields.List(
+        fields.String(required=True, validate=lambda s: 36 >= len(s) > 0),
+        required=True,
+        validate=lambda s: 1000 >= len(s) > 0,
+    )
+
+
 class HostFilterSchema(Schema):
     """
     Filter host info
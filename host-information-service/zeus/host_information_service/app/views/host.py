@@ -38,6 +38,7 @@ from zeus.host_information_service.app.serialize.host import (
     BatchHostsSchema,
     GetHostsPage_RequestSchema,
     HostFilterSchema,
+    HostBatchQuerySchema,
     HostInfoSchema,
     HostsInfo_ResponseSchema,
     TemplateLangSchema,
@@ -701,6 +702,26 @@ class HostFilterAPI(BaseResponse):
         return self.response(code=status_code, data=host_list)
 
 
+class HostBatchQueryAPI(BaseResponse):
+    """
+    Interface for querying hosts in batch
+    """
+
+    @BaseResponse.handle(schema=HostBatchQuerySchema, proxy=HostProxy)
+    def post(self, callback: HostProxy, **param):
+        """
+        Get hosts info with ssh login info in one request, used when a task resolves all of its hosts
+
+        Args:
+            param: e.g
+                {
+                    "host_ids": []
+                }
+        """
+        status_code, result = callback.get_hosts_by_ids(param["host_ids"])
+        return self.response(code=status_code, data=result)
+
+
 class HostIpFilterAPI(BaseResponse):
     """
     Interface for host filter by ips
@@ -27,6 +27,7 @@ from zeus.host_information_service.app.views.host import (
     HostTemplateAPI,
     SingleHostStatusAPI,
     HostIpFilterAPI,
+    HostBatchQueryAPI,
 )
 from zeus.host_information_service.app.views.host_group import (
     AllHostGroupMapAPI,
@@ -38,6 +39,7 @@ URLS = [
     (HostManageAPI, constant.HOSTS),
     (HostInfoManageAPI, constant.HOSTS + "/<string:host_id>"),
     (HostFilterAPI, constant.HOSTS_FILTER),
+    (HostBatchQueryAPI, constant.HOSTS + "/batch_query"),
     (BatchAddHostAPI, constant.BATCH_ADD_HOSTS),
     (HostStatusAPI, constant.HOSTS_STATUS),
     (SingleHostStatusAPI, constant.HOSTS_STATUS + "/<string:host_id>"),
@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2024-2024. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN 'AS IS' BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+"""
+RemoteControl.read_until 单命令时延基准测试：对比原有 sleep 轮询实现与事件驱动实现
+
+用法：python3 ssh_read_until.py [-n 命令次数] [--lines 每条命令输出行数]
+"""
+import argparse
+import socket
+import statistics
+import time
+import types
+
+import sshd_stub
+from zeus.operation_service.app.core.framework.tools.ssh import RemoteControl
+
+
+def legacy_read_until(self, wait_str, timeout, ignore_log=False, wait_list=None):
+    """优化前的实现：每轮固定sleep 0.2s，按1024字节读取，并对全部输出重复扫描"""
+    if wait_list is None:
+        wait_list = []
+    result = b""
+    self.m_channel.settimeout(timeout)
+    begin = time.time()
+    exec_timeout = False
+    while True:
+        time.sleep(0.2)
+        try:
+            while self.m_channel.recv_ready():
+                result = result + self.m_channel.recv(1024)
+        except socket.timeout:
+            continue
+        if time.time() - begin >= timeout:
+            exec_timeout = True
+            break
+        if self.check_return(result, [wait_str] + wait_list):
+            break
+    return result, exec_timeout
+
+
+def measure(ssh_con, command, count):
+    costs = list()
+    for _ in range(count):
+        begin = time.perf_counter()
+        ssh_con.cmd(command, ignorelog=True)
+        costs.append((time.perf_counter() - begin) * 1000)
+    return costs
+
+
+def report(name, costs):
+    print(f"{name:<14} mean {statistics.mean(costs):9.2f} ms   "
+          f"p50 {statistics.median(costs):9.2f} ms   max {max(costs):9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=50, help="每种实现执行的命令次数")
+    parser.add_argument("--lines", type=int, default=1, help="每条命令输出的行数")
+    args = parser.parse_args()
+
+    port = sshd_stub.start()
+    ssh_con = RemoteControl("127.0.0.1", "root", sshd_stub.client_private_key(), port=port, pooled=False)
+    ssh_con.timeout = 60
+    command = f"seq 1 {args.lines}"
+
+    report("event-driven", measure(ssh_con, command, args.n))
+    ssh_con.read_until = types.MethodType(legacy_read_until, ssh_con)
+    report("sleep-poll", measure(ssh_con, command, args.n))
+    ssh_con.close()
+
+
+if __name__ == "__main__":
+    main()
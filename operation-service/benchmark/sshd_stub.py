@@ -0,0 +1,115 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2024-2024. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN 'AS IS' BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+"""
+本地sshd替身：基于paramiko的SSH服务端，接受任意公钥认证，
+shell请求在伪终端中启动bash，exec请求以子进程执行命令，sftp子系统仅支持建立会话，仅用于性能基准测试
+"""
+import io
+import os
+import pty
+import select
+import socket
+import subprocess
+import threading
+
+import paramiko
+
+HOST_KEY = paramiko.RSAKey.generate(2048)
+CLIENT_KEY = paramiko.RSAKey.generate(2048)
+
+
+class StubServer(paramiko.ServerInterface):
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return "publickey"
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        threading.Thread(target=_run_shell, args=(channel,), daemon=True).start()
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=_run_exec, args=(channel, command), daemon=True).start()
+        return True
+
+
+def _run_exec(channel, command):
+    process = subprocess.Popen(command.decode("utf-8"), shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate()
+    channel.sendall(stdout)
+    channel.sendall_stderr(stderr)
+    channel.send_exit_status(process.returncode)
+    channel.close()
+
+
+def _run_shell(channel):
+    pid, master_fd = pty.fork()
+    if pid == 0:
+        os.execvpe("bash", ["bash", "--norc", "--noprofile", "-i"], dict(os.environ, PS1="$ ", TERM="vt100"))
+    try:
+        while True:
+            readable, _, _ = select.select([master_fd, channel], [], [], 1)
+            if master_fd in readable:
+                data = os.read(master_fd, 65536)
+                if not data:
+                    break
+                channel.sendall(data)
+            if channel in readable:
+                data = channel.recv(65536)
+                if not data:
+                    break
+                os.write(master_fd, data)
+    except OSError:
+        pass
+    finally:
+        channel.close()
+        os.kill(pid, 9)
+        os.waitpid(pid, 0)
+
+
+def _serve(client_sock):
+    transport = paramiko.Transport(client_sock)
+    transport.add_server_key(HOST_KEY)
+    # RemoteControl建链时会打开sftp子系统，替身只需能够建立会话
+    transport.set_subsystem_handler("sftp", paramiko.SFTPServer, paramiko.SFTPServerInterface)
+    transport.start_server(server=StubServer())
+
+
+def start():
+    """启动替身服务，返回监听端口"""
+    server_sock = socket.socket()
+    server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server_sock.bind(("127.0.0.1", 0))
+    server_sock.listen(128)
+
+    def accept_loop():
+        while True:
+            client_sock, _ = server_sock.accept()
+            threading.Thread(target=_serve, args=(client_sock,), daemon=True).start()
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+    return server_sock.getsockname()[1]
+
+
+def client_private_key():
+    """返回客户端私钥(PEM)，与zeus主机表中保存的pkey格式一致"""
+    buffer = io.StringIO()
+    CLIENT_KEY.write_private_key(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,102 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2024-2024. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN 'AS IS' BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+"""
+WorkFlow DAG调度基准测试：生成由大量job组成的workflow（每个job包含start/end及若干step节点），
+step替换为不连接主机的空操作，分别统计yaml解析、建图及拓扑排序、执行的耗时
+
+每个job内step串行依赖，job按chain参数分组首尾相连，模拟按主机拆分job的大规模任务
+
+用法：python3 workflow_dag.py [--jobs job数] [--steps 每个job的step数] [--chain 每条job依赖链的长度]
+"""
+import argparse
+import time
+
+import yaml
+
+from zeus.operation_service.app.core.framework.common.result_code import PluginResultCode
+from zeus.operation_service.app.core.framework.workflow import work_node
+from zeus.operation_service.app.core.framework.workflow.workflow import WorkFlow
+
+
+class NoopDispatcher:
+    """替换TaskDispatcher，step不下发到主机，直接回调成功结果"""
+
+    def __init__(self, context):
+        self._context = context
+
+    def run(self):
+        return self._context["callback"]({
+            "work_node_name": self._context["work_node_name"],
+            "result_code": PluginResultCode.SUCCESS,
+            "errors_info": dict()
+        })
+
+
+def generate_workflow(jobs, steps, chain):
+    workflow = {
+        "version": 1.0,
+        "name": "benchmark",
+        "hosts": [{"hostname": "host", "ip": "127.0.0.1", "port": 22, "username": "root", "password": ""}],
+        "jobs": list()
+    }
+    for job_index in range(jobs):
+        dependency = [f"job{job_index - 1}"] if job_index % chain else []
+        workflow["jobs"].append({
+            "name": f"job{job_index}",
+            "dependency": dependency,
+            "steps": [{
+                "name": f"step{step_index}",
+                "module": {"name": "shell"},
+                "dependency": [f"step{step_index - 1}"] if step_index else []
+            } for step_index in range(steps)]
+        })
+    return yaml.safe_dump(workflow)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=2000, help="job数")
+    parser.add_argument("--steps", type=int, default=3, help="每个job的step数")
+    parser.add_argument("--chain", type=int, default=10, help="每条job依赖链的长度")
+    parser.add_argument("--workers", type=int, default=5, help="同时执行的work node数")
+    args = parser.parse_args()
+
+    work_node.TaskDispatcher = NoopDispatcher
+    workflow_yaml = generate_workflow(args.jobs, args.steps, args.chain)
+
+    workflow = WorkFlow(workflow_yaml, {"task_id": "benchmark", "task_name": "benchmark",
+                                        "max_work_jobs": args.workers, "timeout": 3600})
+    begin = time.perf_counter()
+    workflow.parse()
+    parse_cost = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    workflow.init_workflow()
+    if not workflow.validate_workflow():
+        raise RuntimeError("workflow get circle")
+    build_cost = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    workflow.start()
+    execute_cost = time.perf_counter() - begin
+
+    node_number = len(workflow.worknode_map)
+    print(f"work nodes     {node_number}")
+    print(f"parse yaml     {parse_cost:9.3f} s")
+    print(f"build dag      {build_cost:9.3f} s")
+    print(f"execute        {execute_cost:9.3f} s   {node_number / execute_cost:9.0f} nodes/s")
+    print(f"results        {workflow.result.qsize()}")
+
+
+if __name__ == "__main__":
+    main()
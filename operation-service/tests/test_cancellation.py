@@ -0,0 +1,66 @@
+import select
+import threading
+import unittest
+
+from zeus.operation_service.app.core.framework.tools.cancellation import CancellationRegistry, CancellationToken, \
+    TaskCancelledException
+
+
+class CancellationTokenTestCase(unittest.TestCase):
+
+    def test_select_returns_after_cancel(self):
+        token = CancellationToken()
+        self.addCleanup(token.close)
+        self.assertEqual(select.select([token], [], [], 0)[0], [])
+        timer = threading.Timer(0.05, token.cancel)
+        timer.start()
+        readable, _, _ = select.select([token], [], [], 5)
+        timer.join()
+        self.assertEqual(readable, [token])
+        self.assertTrue(token.cancelled)
+
+    def test_check(self):
+        token = CancellationToken()
+        self.addCleanup(token.close)
+        token.check()
+        token.cancel()
+        token.cancel()
+        self.assertRaises(TaskCancelledException, token.check)
+
+    def test_cancel_after_close(self):
+        token = CancellationToken()
+        token.close()
+        token.close()
+        token.cancel()
+        self.assertTrue(token.closed)
+        self.assertTrue(token.cancelled)
+
+
+class CancellationRegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = CancellationRegistry.__new__(CancellationRegistry)
+        self.registry.__init__()
+
+    def test_cancel_registered_task(self):
+        token = self.registry.create("task1")
+        self.assertIs(self.registry.get("task1"), token)
+        self.assertTrue(self.registry.cancel("task1"))
+        self.assertTrue(token.cancelled)
+
+    def test_cancel_task_not_running_here(self):
+        self.assertFalse(self.registry.cancel("task1"))
+
+    def test_create_replaces_token_of_last_run(self):
+        first = self.registry.create("task1")
+        self.registry.cancel("task1")
+        second = self.registry.create("task1")
+        self.assertIsNot(first, second)
+        self.assertFalse(second.cancelled)
+        self.registry.remove("task1")
+        self.assertTrue(second.closed)
+        self.assertFalse(self.registry.cancel("task1"))
+
+
+if __name__ == '__main__':
+    unittest.main()
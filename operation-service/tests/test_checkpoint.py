@@ -0,0 +1,57 @@
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from zeus.operation_service.app.core.framework.tools import checkpoint
+from zeus.operation_service.app.core.framework.tools.checkpoint import WorkflowCheckpoint
+
+
+class WorkflowCheckpointTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.checkpoints_dir = tempfile.mkdtemp()
+        patcher = mock.patch.object(checkpoint, "CHECKPOINTS_DIR", self.checkpoints_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.checkpoints_dir, True)
+
+    def test_succeeded_hosts_are_loaded_on_resume(self):
+        first = WorkflowCheckpoint("task1", 0)
+        first.record("step1", "host1")
+        first.record("step1", "host1")
+        first.record("step2", "host2")
+        first.close()
+        resumed = WorkflowCheckpoint("task1", 0)
+        self.assertTrue(resumed.succeeded("step1", "host1"))
+        self.assertTrue(resumed.succeeded("step2", "host2"))
+        self.assertFalse(resumed.succeeded("step2", "host1"))
+        self.assertEqual(resumed.succeeded_count(), 2)
+
+    def test_cases_are_kept_apart(self):
+        case0 = WorkflowCheckpoint("task1", 0)
+        case0.record("step1", "host1")
+        case0.close()
+        case1 = WorkflowCheckpoint("task1", 1)
+        self.assertFalse(case1.succeeded("step1", "host1"))
+
+    def test_incomplete_last_line_is_ignored(self):
+        first = WorkflowCheckpoint("task1", 0)
+        first.record("step1", "host1")
+        first.close()
+        with open(WorkflowCheckpoint.checkpoint_file("task1"), "a", encoding="utf-8") as f:
+            f.write('{"case": 0, "node": "step1", "ho')
+        self.assertEqual(WorkflowCheckpoint("task1", 0).succeeded_count(), 1)
+
+    def test_clear(self):
+        first = WorkflowCheckpoint("task1", 0)
+        first.record("step1", "host1")
+        first.close()
+        self.assertTrue(WorkflowCheckpoint.exists("task1"))
+        WorkflowCheckpoint.clear("task1")
+        self.assertFalse(WorkflowCheckpoint.exists("task1"))
+        self.assertEqual(WorkflowCheckpoint("task1", 0).succeeded_count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from zeus.operation_service.app.core.file_util import FileUtil
+
+
+class SeekFileBytesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.path, "result.log")
+        with open(self.file_path, "wb") as file_obj:
+            file_obj.write("ab中文\n".encode("utf-8"))
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_read_from_index(self):
+        self.assertEqual(FileUtil.seek_file_bytes(self.file_path, 2, 100), ("中文\n", 9))
+
+    def test_incomplete_character_is_left_for_next_read(self):
+        content, index = FileUtil.seek_file_bytes(self.file_path, 0, 4)
+        self.assertEqual((content, index), ("ab", 2))
+        self.assertEqual(FileUtil.seek_file_bytes(self.file_path, index, 3), ("中", 5))
+
+    def test_read_at_end_of_file(self):
+        self.assertEqual(FileUtil.seek_file_bytes(self.file_path, 9, 100), ("", 9))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from zeus.operation_service.app.core.framework.task.task_result.host_log_reader import FileHostLogReader, \
+    HostLogReader
+
+
+class HostLogReaderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.result_path = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.result_path, "result_192.168.0.1.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.result_path, ignore_errors=True)
+
+    def _reader(self, content):
+        with open(self.file_path, "wb") as file_obj:
+            file_obj.write(content)
+        return FileHostLogReader(self.file_path)
+
+    def test_tail(self):
+        reader = self._reader(b"line1\nline2\nline3\n")
+        page = reader.tail(2, 1024)
+        self.assertEqual(page["content"], "line2\nline3\n")
+        self.assertEqual(page["offset"], 6)
+        self.assertEqual(page["next_offset"], 18)
+        self.assertFalse(page["has_more"])
+
+    def test_tail_without_trailing_newline(self):
+        reader = self._reader(b"line1\nline2\nline3")
+        self.assertEqual(reader.tail(1, 1024)["content"], "line3")
+        self.assertEqual(reader.tail(5, 1024)["content"], "line1\nline2\nline3")
+
+    def test_tail_is_limited_by_max_size(self):
+        reader = self._reader(b"a" * 100 + b"\n")
+        page = reader.tail(1, 10)
+        self.assertEqual(page["offset"], 91)
+        self.assertEqual(page["content"], "a" * 9 + "\n")
+
+    def test_tail_does_not_split_characters(self):
+        reader = self._reader("中文\n".encode("utf-8"))
+        self.assertEqual(reader.tail(1, 1024)["content"], "中文\n")
+
+    def test_grep(self):
+        reader = self._reader(b"ok\nerror 1\nok\nerror 2\n")
+        page = reader.grep(HostLogReader.compile("error"), 0, 1, 1024)
+        self.assertEqual(page["matches"], [{"offset": 3, "line": "error 1"}])
+        page = reader.grep(HostLogReader.compile("error"), page["next_offset"], 10, 1024)
+        self.assertEqual(page["matches"], [{"offset": 14, "line": "error 2"}])
+        self.assertFalse(page["has_more"])
+
+    def test_grep_stops_after_max_scan(self):
+        reader = self._reader(b"ok\nok\nerror\n")
+        page = reader.grep(HostLogReader.compile("error"), 0, 10, 4)
+        self.assertEqual(page["matches"], [])
+        self.assertEqual(page["next_offset"], 6)
+        self.assertTrue(page["has_more"])
+        page = reader.grep(HostLogReader.compile("error"), page["next_offset"], 10, 1024)
+        self.assertEqual(page["matches"], [{"offset": 6, "line": "error"}])
+
+    def test_compile(self):
+        self.assertIsNone(HostLogReader.compile("a.b").search(b"axb"))
+        self.assertIsNotNone(HostLogReader.compile("ERROR", ignore_case=True).search(b"error"))
+        self.assertIsNotNone(HostLogReader.compile(r"error \d+", regex=True).search(b"error 12"))
+        self.assertRaises(re.error, HostLogReader.compile, "(a+)+$", True)
+        self.assertRaises(re.error, HostLogReader.compile, "a" * 257, True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+
+from zeus.operation_service.app.core.framework.tools.output_group import OutputDigest, OutputGroups
+
+
+class OutputDigestTestCase(unittest.TestCase):
+
+    def test_blank_lines_and_trailing_spaces_are_ignored(self):
+        self.assertEqual(OutputDigest.of("a\nb\n"), OutputDigest.of("a  \r\n\nb"))
+        self.assertNotEqual(OutputDigest.of("a\nb\n"), OutputDigest.of("a\n b\n"))
+
+    def test_update_in_parts(self):
+        digest = OutputDigest()
+        digest.update("li")
+        digest.update("ne1\nline")
+        digest.update("2\n")
+        self.assertEqual(digest.hexdigest(), OutputDigest.of("line1\nline2\n"))
+
+
+class OutputGroupsTestCase(unittest.TestCase):
+
+    def test_group_by_exitcode_and_output(self):
+        groups = OutputGroups()
+        first = {"echo": "ok\n", "exitcode": True}
+        self.assertIs(groups.add("host1", 0, first), first)
+        self.assertIs(groups.add("host2", 0, {"echo": "ok \n", "exitcode": True}), first)
+        groups.add("host3", 0, {"echo": "ok\n", "exitcode": False})
+        result = groups.groups()
+        self.assertEqual([group["count"] for group in result], [2, 1])
+        self.assertEqual(result[0]["hosts"], ["host1", "host2"])
+        self.assertFalse(result[1]["exitcode"])
+
+    def test_same_output_with_different_code_is_not_grouped(self):
+        groups = OutputGroups()
+        groups.add("host1", 0, "timeout")
+        groups.add("host2", 1, "timeout")
+        groups.add("host3", 1, "timeout")
+        result = groups.groups()
+        self.assertEqual([(group["code"], group["hosts"]) for group in result],
+                         [(1, ["host2", "host3"]), (0, ["host1"])])
+        self.assertIsNone(result[0]["exitcode"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+
+from zeus.operation_service.app.core.framework.tools.ssh import PromptMatcher
+
+
+class PromptMatcherTestCase(unittest.TestCase):
+
+    def test_match_new_data(self):
+        matcher = PromptMatcher(["[root@host ~]# ", "password:"])
+        buffer = b"output\npassword:"
+        self.assertTrue(matcher.match(buffer, 7))
+        self.assertFalse(matcher.match(b"output\n", 0))
+
+    def test_match_prompt_split_between_reads(self):
+        matcher = PromptMatcher(["$ "])
+        buffer = b"output\n$"
+        self.assertFalse(matcher.match(buffer, 0))
+        scan_start = len(buffer)
+        buffer += b" "
+        self.assertTrue(matcher.match(buffer, scan_start))
+
+    def test_data_before_look_behind_is_not_scanned(self):
+        matcher = PromptMatcher(["$ "])
+        self.assertFalse(matcher.match(b"$ output\n", 5))
+
+    def test_multibyte_prompt_split_between_reads(self):
+        matcher = PromptMatcher(["密码："])
+        prompt = "密码：".encode("utf-8")
+        buffer = b"output\n" + prompt[:4]
+        self.assertFalse(matcher.match(buffer, 0))
+        scan_start = len(buffer)
+        buffer += prompt[4:]
+        self.assertTrue(matcher.match(buffer, scan_start))
+
+    def test_empty_wait_strings_are_ignored(self):
+        matcher = PromptMatcher(["", None])
+        self.assertEqual(matcher.look_behind, 0)
+        self.assertFalse(matcher.match(b"output", 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
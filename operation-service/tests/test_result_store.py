@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from zeus.operation_service.app.core.framework.common.constant import ResultCompression
+from zeus.operation_service.app.core.framework.task.task_result.host_log_reader import HostLogReader, \
+    StoreHostLogReader
+from zeus.operation_service.app.core.framework.tools import result_store
+from zeus.operation_service.app.core.framework.tools.output_stream import OutputStream
+from zeus.operation_service.app.core.framework.tools.result_store import ResultStore, ResultStoreRegistry
+
+HOST = {"ip": "192.168.0.1", "hostname": "host1"}
+
+
+@mock.patch.object(result_store, "_compression", lambda: ResultCompression.ZLIB)
+class ResultStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.result_path = tempfile.mkdtemp()
+        self.spool_file = os.path.join(self.result_path, f"result_{HOST['ip']}.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.result_path, ignore_errors=True)
+
+    def _write(self, store, text, exit_code=0, header="[time]: cmd\n"):
+        record = store.record(HOST, "step1")
+        record.write(header, header=True)
+        record.write(text)
+        record.close(exit_code)
+
+    def _run_step(self, text):
+        """与Shell插件相同，输出同时写入主机结果文件和结果存储"""
+        record = ResultStoreRegistry().get(self.result_path).record(HOST, "step1")
+        output = OutputStream(self.spool_file, header="[time]: cmd\n", record=record)
+        output.write(text)
+        output.close()
+        record.close(0)
+
+    def test_records_of_host_are_contiguous(self):
+        store = ResultStore(self.result_path)
+        self._write(store, "line1\nline2\n")
+        self._write(store, "line3\n", exit_code=1)
+        store.close()
+
+        store = ResultStore(self.result_path)
+        records = store.records()
+        self.assertEqual(records[1]["host_offset"], records[0]["size"])
+        self.assertEqual(store.host_size(HOST["ip"]), records[0]["size"] + records[1]["size"])
+        self.assertEqual(store.read(HOST["ip"], 0, 100), b"[time]: cmd\nline1\nline2\n[time]: cmd\nline3\n")
+        self.assertEqual(store.read(HOST["ip"], 18, 12), b"line2\n[time]")
+        self.assertEqual(store.statistics()["failed_hosts"], [HOST["ip"]])
+
+    def test_same_output_is_stored_once(self):
+        store = ResultStore(self.result_path)
+        self._write(store, "same output\n")
+        self._write(store, "same output\n")
+        records = store.records()
+        store.close()
+        self.assertEqual(records[0]["blocks"], records[1]["blocks"])
+        self.assertEqual(store.read(HOST["ip"], 0, 100), b"[time]: cmd\nsame output\n" * 2)
+
+    def test_output_larger_than_block(self):
+        text = "x" * (result_store.BLOCK_SIZE + 10) + "\n"
+        store = ResultStore(self.result_path)
+        self._write(store, text, header="")
+        store.close()
+        self.assertEqual(len(store.records()[0]["blocks"]), 2)
+        self.assertEqual(store.read(HOST["ip"], result_store.BLOCK_SIZE - 2, 4), b"xxxx")
+
+    def test_indexes_of_named_stores_are_merged(self):
+        first = ResultStore(self.result_path, "worker1")
+        second = ResultStore(self.result_path, "worker2")
+        self._write(first, "first\n")
+        self._write(second, "second\n")
+        first.close()
+        second.close()
+        store = ResultStore(self.result_path)
+        self.assertEqual(store.read(HOST["ip"], 0, 100), b"[time]: cmd\nfirst\n[time]: cmd\nsecond\n")
+        self.assertEqual(len(store.groups("step1")), 2)
+
+    def test_offsets_are_kept_when_retried(self):
+        registry = ResultStoreRegistry()
+        registry.acquire(self.result_path)
+        self._run_step("first run\n")
+        registry.release(self.result_path)
+        self.assertFalse(os.path.exists(self.spool_file))
+
+        # 重试时主机结果文件从头写入，偏移仍按主机日志计算
+        registry.acquire(self.result_path)
+        self._run_step("second run\n")
+        running = HostLogReader.create(self.result_path, HOST["ip"])
+        page = running.tail(2, 1024)
+        size = running.size()
+        registry.release(self.result_path)
+
+        finished = HostLogReader.create(self.result_path, HOST["ip"])
+        self.assertIsInstance(finished, StoreHostLogReader)
+        self.assertEqual(finished.size(), size)
+        self.assertEqual(finished.read(page["offset"], 1024)["content"], page["content"])
+
+    def test_store_is_closed_by_last_release(self):
+        registry = ResultStoreRegistry()
+        registry.acquire(self.result_path, "worker1")
+        registry.acquire(self.result_path, "worker1")
+        self._run_step("shard\n")
+        registry.release(self.result_path)
+        self.assertTrue(os.path.exists(self.spool_file))
+        self.assertIs(registry.get(self.result_path).name, "worker1")
+        registry.release(self.result_path)
+        self.assertFalse(os.path.exists(self.spool_file))
+        self.assertIsNone(registry.get(self.result_path))
+
+    def test_get_without_acquire(self):
+        self.assertIsNone(ResultStoreRegistry().get(self.result_path))
+        self.assertFalse(ResultStore.exists(self.result_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
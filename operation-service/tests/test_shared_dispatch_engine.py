@@ -0,0 +1,58 @@
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from zeus.operation_service.app.core.framework import shared_dispatch_engine
+from zeus.operation_service.app.core.framework.shared_dispatch_engine import SharedDispatchEngine
+
+
+def _engine(max_sessions, max_sessions_per_cluster):
+    """不经过单例创建引擎，各用例使用独立的线程池"""
+    config = SimpleNamespace(task=SimpleNamespace(max_concurrent_sessions=max_sessions,
+                                                  max_sessions_per_cluster=max_sessions_per_cluster))
+    with mock.patch.object(shared_dispatch_engine, "configuration", config):
+        engine = SharedDispatchEngine.__new__(SharedDispatchEngine)
+        engine.__init__()
+    return engine
+
+
+class SharedDispatchEngineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.executed = list()
+
+    def _func(self, name):
+        def func():
+            self.executed.append(name)
+            self.release.wait(5)
+            return name
+        return func
+
+    def test_cancel_host_waiting_for_worker(self):
+        engine = _engine(1, 10)
+        first = engine.submit(self._func("first"), "cluster1")
+        second = engine.submit(self._func("second"), "cluster1")
+        self.assertTrue(second.cancel())
+        self.release.set()
+        self.assertEqual(first.result(5), "first")
+        engine._executor.shutdown(wait=True)
+        self.assertEqual(self.executed, ["first"])
+        self.assertEqual(engine.statistics()["running"], 0)
+
+    def test_cancel_host_waiting_for_cluster_slot(self):
+        engine = _engine(4, 1)
+        first = engine.submit(self._func("first"), "cluster1")
+        second = engine.submit(self._func("second"), "cluster1")
+        third = engine.submit(self._func("third"), "cluster1")
+        self.assertEqual(engine.statistics()["waiting"], 2)
+        self.assertTrue(second.cancel())
+        self.release.set()
+        self.assertEqual(third.result(5), "third")
+        self.assertEqual(first.result(5), "first")
+        self.assertEqual(self.executed, ["first", "third"])
+
+
+if __name__ == '__main__':
+    unittest.main()
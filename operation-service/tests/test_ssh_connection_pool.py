@@ -0,0 +1,88 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from zeus.operation_service.app.core.framework.tools import ssh
+from zeus.operation_service.app.core.framework.tools.ssh import SshConnectionPool
+
+
+def _client(alive=True):
+    client = mock.MagicMock()
+    if not alive:
+        client.get_transport.return_value = None
+    return client
+
+
+class SshConnectionPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(ssh, "time", SimpleNamespace(time=lambda: self.now))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_release_and_acquire(self):
+        pool = SshConnectionPool(capacity=2, idle_timeout=60)
+        client, sftp = _client(), mock.MagicMock()
+        self.assertEqual(pool.acquire("a"), (None, None))
+        pool.release("a", client, sftp)
+        self.assertEqual(pool.acquire("a"), (client, sftp))
+        # 连接以独占方式借出，归还前不能再次取得
+        self.assertEqual(pool.acquire("a"), (None, None))
+        self.assertEqual(pool.statistics()["hits"], 1)
+        self.assertEqual(pool.statistics()["misses"], 2)
+
+    def test_least_recently_used_is_evicted(self):
+        pool = SshConnectionPool(capacity=2, idle_timeout=60)
+        clients = {key: _client() for key in ("a", "b", "c")}
+        pool.release("a", clients["a"])
+        pool.release("b", clients["b"])
+        pool.release("a", pool.acquire("a")[0])
+        pool.release("c", clients["c"])
+        clients["b"].close.assert_called_once()
+        self.assertEqual(pool.acquire("b"), (None, None))
+        self.assertIs(pool.acquire("a")[0], clients["a"])
+        self.assertIs(pool.acquire("c")[0], clients["c"])
+        self.assertEqual(pool.statistics()["evictions"], 1)
+
+    def test_idle_connections_are_reaped_on_release(self):
+        pool = SshConnectionPool(capacity=4, idle_timeout=60)
+        idle_client = _client()
+        pool.release("a", idle_client)
+        self.now += 61
+        pool.release("b", _client())
+        idle_client.close.assert_called_once()
+        self.assertEqual(pool.statistics()["size"], 1)
+        self.assertEqual(pool.statistics()["evictions"], 0)
+
+    def test_idle_connection_is_not_acquired(self):
+        pool = SshConnectionPool(capacity=4, idle_timeout=60)
+        client = _client()
+        pool.release("a", client)
+        self.now += 61
+        self.assertEqual(pool.acquire("a"), (None, None))
+        client.close.assert_called_once()
+
+    def test_dead_connection_is_closed(self):
+        pool = SshConnectionPool(capacity=4, idle_timeout=60)
+        client = _client(alive=False)
+        pool.release("a", client)
+        client.close.assert_called_once()
+        self.assertEqual(pool.statistics()["size"], 0)
+
+    def test_pool_disabled(self):
+        pool = SshConnectionPool(capacity=0, idle_timeout=60)
+        client = _client()
+        pool.release("a", client)
+        client.close.assert_called_once()
+        self.assertEqual(pool.acquire("a"), (None, None))
+
+    def test_key_does_not_contain_private_key(self):
+        key = SshConnectionPool.make_key("192.168.0.1", 22, "root", "PRIVATE KEY")
+        self.assertNotIn("PRIVATE KEY", key)
+        self.assertNotEqual(key, SshConnectionPool.make_key("192.168.0.1", 22, "root", "OTHER KEY"))
+        self.assertTrue(SshConnectionPool.make_key("192.168.0.1", 22, "root", None).endswith("#passwordless"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from zeus.operation_service.app.core.framework import task_dispatcher
+from zeus.operation_service.app.core.framework.common.constant import DispatcherEngine
+from zeus.operation_service.app.core.framework.common.result_code import PluginResultCode
+from zeus.operation_service.app.core.framework.task_dispatcher import TaskDispatcher
+from zeus.operation_service.app.core.framework.tools.task_result import TaskResult
+
+
+class FakeExecutor:
+    """前fail_fast台主机立即失败，其余主机等待一段时间后失败"""
+    created = 0
+    lock = threading.Lock()
+    fail_fast = 3
+
+    def __init__(self, host, task, *args):
+        self.host = host
+        self.task = task
+        with FakeExecutor.lock:
+            FakeExecutor.created += 1
+            self.index = FakeExecutor.created
+
+    def run(self):
+        if self.index > FakeExecutor.fail_fast:
+            threading.Event().wait(0.5)
+        return TaskResult(self.host, self.task, {"error_code": PluginResultCode.FAILED, "error_msg": "failed"})
+
+    def abort(self):
+        pass
+
+
+class HangingExecutor(FakeExecutor):
+    """执行到被abort为止"""
+    aborted = 0
+
+    def __init__(self, host, task, *args):
+        super().__init__(host, task, *args)
+        self._aborted = threading.Event()
+
+    def run(self):
+        self._aborted.wait(5)
+        return TaskResult(self.host, self.task, {"error_code": PluginResultCode.FAILED, "error_msg": "aborted"})
+
+    def abort(self):
+        with FakeExecutor.lock:
+            HangingExecutor.aborted += 1
+        self._aborted.set()
+
+
+class CountingExecutor(FakeExecutor):
+    """记录同时执行的最大主机数，执行成功"""
+    running = 0
+    peak = 0
+
+    def run(self):
+        with FakeExecutor.lock:
+            CountingExecutor.running += 1
+            CountingExecutor.peak = max(CountingExecutor.peak, CountingExecutor.running)
+        threading.Event().wait(0.05)
+        with FakeExecutor.lock:
+            CountingExecutor.running -= 1
+        return TaskResult(self.host, self.task, {"error_code": PluginResultCode.SUCCESS, "error_msg": "ok"})
+
+
+@mock.patch.object(task_dispatcher, "HostStatusRecorder", mock.MagicMock())
+@mock.patch.object(task_dispatcher, "TaskProgress", mock.MagicMock())
+@mock.patch.object(task_dispatcher, "TaskExecutor", FakeExecutor)
+@mock.patch.object(task_dispatcher, "configuration",
+                   SimpleNamespace(task=SimpleNamespace(dispatcher_engine=DispatcherEngine.THREAD)))
+class TaskDispatcherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        FakeExecutor.created = 0
+        HangingExecutor.aborted = 0
+        CountingExecutor.running = CountingExecutor.peak = 0
+        self.results = list()
+
+    def _dispatcher(self, host_num, **policy):
+        context = {
+            "hosts": [{"hostname": f"host{index}", "ip": f"192.168.0.{index}"} for index in range(host_num)],
+            "task": {"name": "step1"},
+            "task_id": "task1",
+            "work_node_name": "step1",
+            "batch_size": 5,
+            "callback": self.results.append
+        }
+        context.update(policy)
+        return TaskDispatcher(context)
+
+    def test_max_fail_percent_without_window(self):
+        dispatcher = self._dispatcher(20, max_fail_percent=10)
+        result = dispatcher.run()
+        # 失败数超过2台后，排队中的主机不再建链执行
+        self.assertLessEqual(FakeExecutor.created, 8)
+        self.assertEqual(result["result_code"], PluginResultCode.FAILED)
+        self.assertEqual(len(result["errors_info"]), 20)
+        skipped = [msg for msg in result["errors_info"].values() if "failure threshold" in str(msg)]
+        self.assertEqual(len(skipped), 20 - FakeExecutor.created)
+        self.assertEqual(self.results, [result])
+
+    def test_parallelism_limits_running_hosts(self):
+        dispatcher = self._dispatcher(4, parallelism=2, max_fail_percent=100)
+        result = dispatcher.run()
+        self.assertEqual(FakeExecutor.created, 4)
+        self.assertEqual(len(result["errors_info"]), 4)
+
+    def test_batch_percent_rolls_window(self):
+        dispatcher = self._dispatcher(8, batch_percent=25)
+        with mock.patch.object(task_dispatcher, "TaskExecutor", CountingExecutor):
+            dispatcher.run()
+        # 8台主机的25%，同时最多2台执行，有主机完成就补充，所有主机都会执行
+        self.assertEqual(CountingExecutor.peak, 2)
+        self.assertEqual(FakeExecutor.created, 8)
+
+    def test_checkpoint_skips_succeeded_hosts(self):
+        checkpoint = mock.MagicMock()
+        checkpoint.succeeded.side_effect = lambda node, hostname: hostname in ("host0", "host1")
+        dispatcher = self._dispatcher(5, checkpoint=checkpoint)
+        with mock.patch.object(task_dispatcher, "TaskExecutor", CountingExecutor):
+            result = dispatcher.run()
+        self.assertEqual(FakeExecutor.created, 3)
+        self.assertEqual(result["result_code"], PluginResultCode.SUCCESS)
+        self.assertEqual(len(result["errors_info"]), 5)
+        # 跳过的主机不再重复记录检查点
+        recorded = sorted(call.args[1] for call in checkpoint.record.call_args_list)
+        self.assertEqual(recorded, ["host2", "host3", "host4"])
+
+    def test_cancel_skips_queued_hosts(self):
+        cancel_token = mock.MagicMock(cancelled=False)
+        dispatcher = self._dispatcher(10, parallelism=2, cancel_token=cancel_token)
+
+        def cancel_on_first_result(exec_result, record=True):
+            cancel_token.cancelled = True
+            TaskDispatcher.handle_result(dispatcher, exec_result, record)
+
+        with mock.patch.object(dispatcher, "handle_result", cancel_on_first_result):
+            result = dispatcher.run()
+        # 取消前最多有窗口内的2台主机开始执行，其余主机不再建链
+        self.assertLessEqual(FakeExecutor.created, 2)
+        self.assertEqual(result["result_code"], PluginResultCode.CANCELED)
+        skipped = [msg for msg in result["errors_info"].values() if "task cancelled" in str(msg)]
+        self.assertEqual(len(skipped), 10 - FakeExecutor.created)
+
+    def test_timeout_stops_unfinished_hosts(self):
+        dispatcher = self._dispatcher(10, timeout=0.3)
+        with mock.patch.object(task_dispatcher, "TaskExecutor", HangingExecutor):
+            result = dispatcher.run()
+        self.assertEqual(result["result_code"], PluginResultCode.FAILED)
+        # 线程池5个工作线程，超时后排队的主机不再执行，执行中的主机连接被关闭
+        threading.Event().wait(0.2)
+        self.assertEqual(FakeExecutor.created, 5)
+        self.assertEqual(HangingExecutor.aborted, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from zeus.operation_service.app.core.framework.task import task_pool
+from zeus.operation_service.app.core.framework.task.task_pool import TaskPool
+
+
+@mock.patch.object(task_pool, "HostStatusRecorder", mock.MagicMock())
+@mock.patch.object(task_pool, "worker_id", lambda: "worker1")
+@mock.patch.object(task_pool, "configuration", SimpleNamespace(task=SimpleNamespace(max_running_tasks=2)))
+class TaskPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.task_proxy = mock.MagicMock()
+        self.registry = mock.MagicMock()
+        self.heartbeat = mock.MagicMock()
+        for name, value in (("TaskProxy", self.task_proxy), ("CancellationRegistry", self.registry),
+                            ("WorkerHeartbeat", self.heartbeat)):
+            patcher = mock.patch.object(task_pool, name, mock.MagicMock(return_value=value))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _pool():
+        pool = TaskPool.__new__(TaskPool)
+        pool.__init__()
+        return pool
+
+    def test_only_claimed_tasks_run(self):
+        pool = self._pool()
+        tasks = [SimpleNamespace(task_id=task_id, task_name=task_id, priority=0) for task_id in ("task1", "task2")]
+        self.task_proxy.get_waiting_tasks.return_value = tasks
+        # task1已被其他进程取出或已被取消
+        self.task_proxy.claim_waiting_task.side_effect = lambda task_id, owner: task_id == "task2"
+        with mock.patch.object(pool, "_run") as run:
+            pool._dispatch(2, ["task0"])
+        self.task_proxy.get_waiting_tasks.assert_called_once_with(2, ["task0"])
+        self.task_proxy.claim_waiting_task.assert_any_call("task1", "worker1")
+        run.assert_called_once_with("task2")
+        self.registry.remove.assert_called_once_with("task1")
+
+    def test_slot_is_released_after_all_cases_finish(self):
+        pool = self._pool()
+        pool._running_tasks["task1"] = 2
+        pool._wakeup = False
+        pool._release("task1")
+        self.assertEqual(pool.running_tasks(), ["task1"])
+        self.assertFalse(pool._wakeup)
+        pool._release("task1")
+        self.assertEqual(pool.running_tasks(), [])
+        self.assertTrue(pool._wakeup)
+        self.registry.remove.assert_called_once_with("task1")
+
+    def test_recover_tasks_of_exited_workers(self):
+        self.task_proxy.get_running_task_owners.return_value = ["worker1", "worker2", "worker3", None]
+        self.heartbeat.alive_workers.side_effect = lambda owners: {"worker2"} & set(owners)
+        self._pool()._recover_interrupted()
+        # 本进程和心跳存活的进程的任务不处理，没有记录执行进程的任务视为已退出
+        self.task_proxy.set_interrupted_tasks_status.assert_called_once_with({"worker3", None})
+
+    def test_nothing_to_recover_when_owners_are_alive(self):
+        self.task_proxy.get_running_task_owners.return_value = ["worker1", "worker2"]
+        self.heartbeat.alive_workers.side_effect = lambda owners: set(owners)
+        self._pool()._recover_interrupted()
+        self.task_proxy.set_interrupted_tasks_status.assert_not_called()
+
+    def test_recover_is_skipped_when_heartbeat_cannot_be_read(self):
+        self.task_proxy.get_running_task_owners.return_value = ["worker2"]
+        self.heartbeat.alive_workers.side_effect = ConnectionError("redis is unavailable")
+        self._pool()._recover_interrupted()
+        self.task_proxy.set_interrupted_tasks_status.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
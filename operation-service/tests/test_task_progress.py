@@ -0,0 +1,70 @@
+import unittest
+from unittest import mock
+
+from zeus.operation_service.app.core.framework.common.result_code import TaskResultCode
+from zeus.operation_service.app.core.framework.task.task_progress import TaskProgress, TaskStatus
+
+
+class TaskProgressTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.progress = TaskProgress.__new__(TaskProgress)
+        self.progress.__init__()
+        # 不启动后台刷新线程，由测试调用flush
+        self.progress._flusher = mock.MagicMock()
+        self.writes = list()
+        self.progress._write = self.writes.append
+
+    def test_workflows_of_task_are_aggregated(self):
+        self.progress.register("task1", 2)
+        self.progress.add_workflow("task1", 4)
+        self.progress.add_workflow("task1", 4)
+        self.progress.advance("task1", 2)
+        self.progress.advance("task1")
+        self.assertEqual(self.progress.get("task1"), TaskStatus(TaskResultCode.RUNNING.code, 0.375))
+
+    def test_flush_writes_changed_tasks_once(self):
+        for task_id in ("task1", "task2"):
+            self.progress.register(task_id, 1)
+            self.progress.add_workflow(task_id, 2)
+        for _ in range(3):
+            self.progress.advance("task1")
+        self.progress.flush()
+        self.progress.flush()
+        # 进度完成前不超过0.99，没有变化的任务不写入
+        self.assertEqual(self.writes, [{"task1": 0.99}])
+
+    def test_last_workflow_writes_final_progress(self):
+        self.progress.register("task1", 2)
+        self.progress.add_workflow("task1", 2)
+        self.progress.advance("task1")
+        self.assertFalse(self.progress.finish_workflow("task1"))
+        self.assertEqual(self.writes, [])
+        self.assertTrue(self.progress.finish_workflow("task1"))
+        self.assertEqual(self.writes, [{"task1": 0.5}])
+        self.assertIsNone(self.progress.get("task1"))
+        self.progress.flush()
+        self.assertEqual(len(self.writes), 1)
+
+    def test_cancelled_status_is_kept(self):
+        self.progress.register("task1", 1)
+        self.progress.set_status("task1", TaskResultCode.CANCELED.code)
+        self.progress.set_status("task1", TaskResultCode.FAILED.code)
+        self.assertEqual(self.progress.get("task1").status, TaskResultCode.CANCELED.code)
+
+    def test_shard_reports_increments_to_channel(self):
+        channel = mock.MagicMock()
+        self.progress.register("task1", 1, channel)
+        self.progress.add_workflow("task1", 10)
+        self.progress.advance("task1", 3)
+        self.assertIsNone(self.progress.get("task1"))
+        self.progress.flush()
+        self.progress.advance("task1", 2)
+        self.progress.flush()
+        self.progress.finish_workflow("task1")
+        self.assertEqual(channel.report_progress.call_args_list, [mock.call(3, 10), mock.call(2, 0)])
+        self.assertEqual(self.writes, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
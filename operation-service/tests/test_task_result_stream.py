@@ -0,0 +1,73 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from zeus.operation_service.app.core.framework.common.constant import HostStatus
+from zeus.operation_service.app.core.framework.task.task_result import task_result_stream
+from zeus.operation_service.app.core.framework.task.task_result.task_result_stream import TaskResultStream
+from zeus.operation_service.app.core.framework.tools.host_status import HostStatusRecorder
+
+
+class TaskResultStreamTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.status_file = os.path.join(self.path, "task1.jsonl")
+        self.result_path = os.path.join(self.path, "command", "task1")
+        os.makedirs(self.result_path)
+        patchers = [
+            mock.patch.object(task_result_stream, "RESULTS_DIR", self.path),
+            mock.patch.object(HostStatusRecorder, "status_file", staticmethod(lambda task_id: self.status_file))
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.task = SimpleNamespace(task_id="task1", task_type="command")
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def _status(self, ip, status):
+        with open(self.status_file, "a") as status_file:
+            status_file.write(json.dumps({"node": "step1", "host": ip, "ip": ip, "status": status}) + "\n")
+        return os.path.getsize(self.status_file)
+
+    def _output(self, ip, content):
+        with open(os.path.join(self.result_path, f"result_{ip}.log"), "a") as result_file:
+            result_file.write(content)
+
+    @staticmethod
+    def _outputs(events):
+        return [json.loads(event.split("data: ", 1)[1]) for event in events if event.startswith("event: output")]
+
+    def test_resume_keeps_running_hosts_active(self):
+        self._status("192.168.0.1", HostStatus.SUCCESS)
+        self._status("192.168.0.2", HostStatus.RUNNING)
+        status_offset = self._status("192.168.0.3", HostStatus.RUNNING)
+        self._output("192.168.0.1", "done\n")
+        self._output("192.168.0.2", "first\n")
+
+        stream = TaskResultStream(self.task, status_offset, {"192.168.0.2": 6})
+        self.assertEqual(list(stream._read_status()), [])
+        self.assertEqual(self._outputs(stream._read_outputs()), [])
+
+        # 重连前已开始执行的主机之后的输出继续推送
+        self._output("192.168.0.2", "second\n")
+        self._output("192.168.0.3", "third\n")
+        outputs = self._outputs(stream._read_outputs())
+        self.assertEqual(sorted((output["ip"], output["content"]) for output in outputs),
+                         [("192.168.0.2", "second\n"), ("192.168.0.3", "third\n")])
+
+        self._status("192.168.0.2", HostStatus.SUCCESS)
+        self.assertEqual(len(list(stream._read_status())), 1)
+        self.assertEqual(self._outputs(stream._read_outputs()), [])
+        self.assertNotIn("192.168.0.2", stream._active_hosts)
+        self.assertIn("192.168.0.3", stream._active_hosts)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+
+from zeus.operation_service.app.core.framework.task.task_shard import ShardedTask
+
+
+class PartitionTestCase(unittest.TestCase):
+
+    def test_hosts_of_each_case_are_split(self):
+        task_case_nodes = [
+            {"case_name": "case1", "node_indexes": [0, 1, 2, 3, 4]},
+            {"case_name": "case2", "node_indexes": [5, 6]}
+        ]
+        shards = ShardedTask.partition(task_case_nodes, 2)
+        self.assertEqual([shard["node_indexes"] for shard in shards], [[0, 1], [2, 3], [4], [5, 6]])
+        self.assertEqual([shard["shard"] for shard in shards], [0, 1, 2, 3])
+
+    def test_shard_size_larger_than_case(self):
+        shards = ShardedTask.partition([{"node_indexes": [0, 1, 2]}], 10)
+        self.assertEqual(shards, [{"shard": 0, "node_indexes": [0, 1, 2]}])
+
+    def test_case_without_hosts(self):
+        self.assertEqual(ShardedTask.partition([{"node_indexes": []}], 2), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
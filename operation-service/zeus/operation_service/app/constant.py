@@ -12,6 +12,7 @@
 # ******************************************************************************/
 
 
+import threading
 from enum import Enum
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
@@ -23,17 +24,25 @@ SCRIPTS_DIR = '/opt/aops/task/scripts'
 WORK_DIR = '/opt/aops/task/work_dir'
 # 存储任务执行结果信息，目录为RESULTS_DIR/<task_id>
 RESULTS_DIR = '/opt/aops/task/results'
+# redis中主机的版本号，主机连接信息变化时由主机服务刷新，与host_information_service中的定义相同
+HOST_REVISIONS = 'host_revisions'
+# redis中命令、脚本的版本号，修改、删除时刷新，字段为command:<command_id>、script:<script_id>
+OPERATION_REVISIONS = 'operation_revisions'
 
 
 class SingletonMeta(type):
 
     def __init__(cls, *args, **kwargs):
         cls.__instance = None
+        cls.__lock = threading.RLock()
         super().__init__(*args, **kwargs)
     
     def __call__(cls, *args, **kwargs):
+        # 多个线程同时首次获取实例时只创建一个，已创建后不再加锁
         if cls.__instance is None:
-            cls.__instance = super().__call__(*args, **kwargs)
+            with cls.__lock:
+                if cls.__instance is None:
+                    cls.__instance = super().__call__(*args, **kwargs)
         return cls.__instance
 
 
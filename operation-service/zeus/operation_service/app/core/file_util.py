@@ -63,6 +63,33 @@ class FileUtil:
             file_obj.seek(index)
             return file_obj.read(size)
 
+    @staticmethod
+    def seek_file_bytes(file_path: str, index: int, size: int = FileSize.READ_SIZE):
+        """通过字节游标获取文件内容，用于读取仍在追加写入的文件
+            params:
+                file_path: 读取的文件路径
+                index: 指定的游标位置，单位为字节
+                size: 读取的最大字节数
+            return:
+                (文件内容, 下一次读取的游标位置)，末尾不完整的utf-8字符留到下一次读取
+        """
+        with open(file_path, 'rb') as file_obj:
+            file_obj.seek(index)
+            data = file_obj.read(size)
+        content, length = FileUtil.decode_bytes(data)
+        return content, index + length
+
+    @staticmethod
+    def decode_bytes(data: bytes):
+        """按utf-8解码读取到的字节，返回(内容, 已解码的字节数)，末尾不完整的字符不解码"""
+        # utf-8字符最长4字节，末尾最多截掉3个字节即可得到完整字符
+        for cut in range(min(4, len(data) + 1)):
+            try:
+                return data[:len(data) - cut].decode('utf-8'), len(data) - cut
+            except UnicodeDecodeError:
+                continue
+        return data.decode('utf-8', 'replace'), len(data)
+
     @staticmethod
     def unzip(zip_path, unzip_path):
         """解压压缩包到指定路径
@@ -12,3 +12,7 @@ def init_dependency(json_object):
     if "dependency" not in json_object.keys():
         return []
     return json_object.get("dependency")
+
+
+def init_barrier(json_object):
+    return str(json_object.get("barrier", False)).lower() == "true"
@@ -12,6 +12,87 @@ class TaskType:
     COMMAND_EXECUTION = "COMMAND_EXECUTION"
     SCRIPT_EXECUTION = "SCRIPT_EXECUTION"
 
+
+class TaskPriority:
+    """任务优先级，取值范围0~9，数值越大越先执行"""
+    LOW = 0
+    NORMAL = 5
+    HIGH = 9
+
+
+class ExecMode:
+    """shell类插件的命令执行方式，在workflow.yaml的step模块中通过exec_mode指定"""
+    # 交互式伪终端，通过提示符判断命令结束，默认方式
+    PTY = "pty"
+    # 非交互式exec_command，一次往返返回退出码、标准输出和标准错误
+    EXEC = "exec"
+
+
+class DispatcherEngine:
+    """TaskDispatcher的执行引擎，在配置文件task.dispatcher_engine中指定"""
+    # 进程级共享的有界线程池，支持全局和按集群的并发上限，默认方式
+    SHARED = "shared"
+    # 每个work node独立的线程池，池大小为task.batch_size_hosts
+    THREAD = "thread"
+
+
+class TransferMode:
+    """脚本目录的传输方式，任务创建时通过transfer_mode指定，未指定时使用配置文件task.transfer_mode"""
+    # 逐个文件传输，只上传内容有变化的文件
+    FILE = "file"
+    # 本地打包为一个压缩包，每台主机一次传输、一条命令解压并校验
+    BUNDLE = "bundle"
+
+
+class WorkflowMode:
+    """workflow的调度粒度，任务创建时通过workflow_mode指定，未指定时使用配置文件task.workflow_mode"""
+    # 每个step在所有主机执行完成后才开始下一个step
+    STEP = "step"
+    # 每个(step, 主机)单独调度，按主机解析依赖，仅在step或job声明barrier时等待所有主机
+    PIPELINE = "pipeline"
+
+
+class BundleCompression:
+    """bundle传输方式的压缩格式，zstd需要管理节点安装zstandard模块且远端安装zstd命令"""
+    GZIP = "gzip"
+    ZSTD = "zstd"
+
+
+class ResultStoreType:
+    """主机命令输出的存储方式，配置文件task.result_store指定"""
+    # 每台主机一个结果文件result_<ip>.log
+    FILE = "file"
+    # 任务结束后所有主机的输出保存在一个段文件和索引中，执行中仍写入主机结果文件供实时查看
+    SEGMENT = "segment"
+
+
+class ResultCompression:
+    """结果存储段文件的压缩格式，zstd需要安装zstandard模块，未安装时使用zlib"""
+    NONE = "none"
+    ZLIB = "zlib"
+    ZSTD = "zstd"
+
+
+class HostStatus:
+    """主机在work node上的执行状态，记录在主机状态文件中供任务结果流接口推送"""
+    RUNNING = "running"
+    SUCCESS = "success"
+    FAILED = "failed"
+    CANCELED = "canceled"
+
+
+class ShardEvent:
+    """分片执行时执行进程发送给协调者的事件类型"""
+    STARTED = "started"
+    FINISHED = "finished"
+
+
 class FileSize:
     # 读取的默认文件大小为10k
     READ_SIZE = 10 * 1024
+    # 任务结果流每次读取单台主机输出的最大字节数，也是分页查询主机结果的默认大小
+    STREAM_READ_SIZE = 64 * 1024
+    # 分页查询主机结果单页的最大字节数
+    PAGE_MAX_SIZE = 1024 * 1024
+    # 搜索主机结果时单次请求扫描的最大字节数，超出时由客户端从返回的位置继续搜索
+    GREP_SCAN_SIZE = 64 * 1024 * 1024
@@ -10,6 +10,7 @@ class PluginResultCode(ResultCodeEnum):
     FAILED = (1002, '失败')
     PARTIAL_PASSED = (1003, '部分通过')
     PRE_DEPENDENCY_ERROR = (1004, '前置依赖报错')
+    CANCELED = (1006, '已取消')
 
     UNKNOWN = (1005, '未知异常')
 
@@ -58,6 +59,7 @@ class WorkFlowResultCode(ResultCodeEnum):
     ERR_WORKFLOW_TIMEOUT = (4002005, "workflow execute timeout")
     ERR_WORKFLOW_EXECUTE = (4002006, "workflow run error")
     ERR_WORKFLOW_CIRCLE = (4002007, "workflow relation circle")
+    ERR_WORKFLOW_CANCELED = (4002008, "workflow canceled")
 
     ERR_UNKNOWN = (4002999, 'Unknown error in Asset')
 
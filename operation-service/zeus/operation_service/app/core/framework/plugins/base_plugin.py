@@ -1,5 +1,8 @@
+import re
 from abc import abstractmethod, ABC
 
+COLOR_PATTERN = r'\x1b(\[.*?[@-~]|\].*?(\x07|\x1b\\))'
+
 
 class BasePlugin(ABC):
     def __init__(self, ssh_con, sftp_con, task_vars, host):
@@ -17,3 +20,8 @@ class BasePlugin(ABC):
 
     def get_sftp_con(self):
         return self._sftp_con
+
+    def handle_tilde(self, remote_path):
+        home_path = self._ssh_con.cmd("cd ~ && pwd")
+        home_path_without_color = re.sub(COLOR_PATTERN, '', home_path).strip("\r")
+        return remote_path.replace("~", home_path_without_color, 1)
@@ -0,0 +1,97 @@
+import os
+import shlex
+import uuid
+from pathlib import Path
+
+from zeus.operation_service.app.core.framework.common.constant import BundleCompression
+from zeus.operation_service.app.core.framework.common.result_code import PluginResultCode
+from zeus.operation_service.app.core.framework.plugins.base_plugin import BasePlugin
+from zeus.operation_service.app.core.framework.tools.bundle_cache import BundleCache
+from zeus.operation_service.app.core.framework.tools.transfer import TransferEngine
+from zeus.operation_service.app.core.framework.tools.transfer_cache import TransferStatistics
+from vulcanus.log.log import LOGGER
+
+REMOTE_BUNDLE_DIR = "/tmp"
+
+
+class Bundle(BasePlugin):
+    """
+    功能：将本地目录打包后传输到远端并解压
+    参数：
+        src: 本地目录
+        dest: 远端目录
+        owner, group (optional): 解压后文件的属主
+        mode (optional): 解压后文件的权限
+    """
+
+    def run(self):
+        result = dict()
+        src = self._task_vars["src"]
+        dest = Path(self._task_vars["dest"]).as_posix()
+        if dest.startswith("~"):
+            dest = self.handle_tilde(dest)
+        LOGGER.info("[Bundle]: From %s to %s", src, dest)
+        if not os.path.isdir(src):
+            result["error_code"] = PluginResultCode.ERROR
+            result["error_msg"] = "no such dir exist:" + src
+            return result
+
+        bundle = BundleCache().get(src)
+        try:
+            return self._transfer(bundle, src, dest)
+        finally:
+            BundleCache().release(bundle)
+
+    def _transfer(self, bundle, src, dest):
+        result = dict()
+        # 同一主机上可能有多个任务同时传输同一个压缩包，远端文件名需唯一
+        remote_bundle = f"{REMOTE_BUNDLE_DIR}/.{uuid.uuid4().hex[:8]}-{os.path.basename(bundle.path)}"
+        engine = TransferEngine(self._ssh_con)
+        try:
+            engine.upload(bundle.path, remote_bundle)
+        except Exception as e:
+            LOGGER.error(f"[Bundle]: upload bundle failed: {e}")
+            result["error_code"] = PluginResultCode.ERROR
+            result["error_msg"] = "upload bundle failed: " + src
+            return result
+
+        # 校验压缩包、解压、校验解压后的文件及修改权限在同一条命令中完成
+        returncode, _, stderr = self._ssh_con.exec_command(self._extract_command(bundle, remote_bundle, dest))
+        if returncode != 0:
+            LOGGER.error(f"[Bundle]: extract bundle failed: {stderr}")
+            # 其他主机可能正在上传同一个压缩包，只在本地压缩包损坏时重新生成
+            BundleCache().invalidate(bundle)
+            result["error_code"] = PluginResultCode.ERROR
+            result["error_msg"] = f"extract bundle failed: {src}, {stderr.strip()}"
+            return result
+
+        TransferStatistics().record(self._task_vars.get("task_metadata", dict()).get("task_id"),
+                                    sent_bytes=engine.transferred_bytes, sent_files=len(bundle.files))
+        LOGGER.info(f"[Bundle]: {len(bundle.files)} files extracted, {engine.statistics()}")
+        result["error_code"] = PluginResultCode.SUCCESS
+        result["error_msg"] = "success"
+        return result
+
+    def _extract_command(self, bundle, remote_bundle, dest):
+        quoted_dest = shlex.quote(dest)
+        quoted_bundle = shlex.quote(remote_bundle)
+        if bundle.compression == BundleCompression.ZSTD:
+            extract = f"zstd -dcq {quoted_bundle} | tar --no-same-owner -xf - -C {quoted_dest}"
+        else:
+            extract = f"tar --no-same-owner -xzf {quoted_bundle} -C {quoted_dest}"
+        bundle_digest = shlex.quote(f"{bundle.sha256}  {remote_bundle}")
+        file_digests = " ".join(shlex.quote(f"{digest}  {path}") for path, digest in bundle.files.items())
+        files = " ".join(shlex.quote(path) for path in bundle.files)
+        commands = [
+            f"mkdir -p {quoted_dest}",
+            f"echo {bundle_digest} | sha256sum -c --quiet -",
+            extract,
+            f"cd {quoted_dest}",
+            f"printf '%s\\n' {file_digests} | sha256sum -c --quiet -"
+        ]
+        if "owner" in self._task_vars and "group" in self._task_vars:
+            commands.append(f"chown {self._task_vars['owner']}:{self._task_vars['group']} {files}")
+        if "mode" in self._task_vars:
+            mode = self._task_vars["mode"]
+            commands.append(f"chmod {format(mode, 'o') if isinstance(mode, int) else mode} {files}")
+        return " && ".join(commands) + f"; rc=$?; rm -f {quoted_bundle}; exit $rc"
@@ -1,12 +1,13 @@
 import os
-import re
+import shlex
 from pathlib import Path
 from zeus.operation_service.app.core.framework.common.result_code import PluginResultCode
 from zeus.operation_service.app.core.framework.plugins.base_plugin import BasePlugin
-from zeus.operation_service.app.core.framework.tools.common_tools import compare_remote_and_local_file
+from zeus.operation_service.app.core.framework.tools.common_tools import remote_sha256sum
+from zeus.operation_service.app.core.framework.tools.transfer import TransferEngine, list_local_files
+from zeus.operation_service.app.core.framework.tools.transfer_cache import LocalDigestManifest, TransferStatistics
 from vulcanus.log.log import LOGGER
 
-COLOR_PATTERN = r'\x1b(\[.*?[@-~]|\].*?(\x07|\x1b\\))'
 class Copy(BasePlugin):
 
     def run(self):
@@ -17,55 +18,80 @@ class Copy(BasePlugin):
         if dest.startswith("~"):
             dest = self.handle_tilde(dest)
         LOGGER.info("[Copy]: From %s to %s", src, dest)
-        if not os.path.exists(src) or os.path.isdir(src):
+        if not os.path.exists(src):
             result["error_code"] = PluginResultCode.ERROR
-            result["error_msg"] = "no such file exist or the path is dir:" + src
+            result["error_msg"] = "no such file exist:" + src
             return result
 
-        remote_dir = os.path.dirname(dest)
+        # 源路径为目录时，目录下的所有文件在同一连接上并行传输到dest目录下
+        if os.path.isdir(src):
+            file_pairs = list_local_files(src, dest)
+        else:
+            file_pairs = [(src, dest)]
+
+        # 对比本地和远端的摘要，只上传内容有差异的文件
+        manifest = LocalDigestManifest()
+        local_digests = {remote_path: manifest.digest(local_path) for local_path, remote_path in file_pairs}
+        manifest.save()
+        remote_digests = remote_sha256sum(self._ssh_con, list(local_digests.keys()))
+        to_upload = [(local_path, remote_path) for local_path, remote_path in file_pairs
+                     if remote_digests.get(remote_path) != local_digests[remote_path]]
+        skipped_bytes = sum(os.path.getsize(local_path) for local_path, remote_path in file_pairs
+                            if remote_digests.get(remote_path) == local_digests[remote_path])
+        LOGGER.info(f"[Copy]: {len(to_upload)} files to upload, {len(file_pairs) - len(to_upload)} files unchanged")
 
+        engine = TransferEngine(self._ssh_con)
+        if to_upload:
+            error_result = self._upload(engine, src, to_upload)
+            if error_result:
+                return error_result
+        self._set_permissions(file_pairs)
+        TransferStatistics().record(self._task_vars.get("task_metadata", dict()).get("task_id"),
+                                    sent_bytes=engine.transferred_bytes, skipped_bytes=skipped_bytes,
+                                    sent_files=len(to_upload), skipped_files=len(file_pairs) - len(to_upload))
+        LOGGER.info(f"[Copy]: copy file success, {engine.statistics()}")
+        result["error_code"] = PluginResultCode.SUCCESS
+        result["error_msg"] = "success"
+        return result
+
+    def _upload(self, engine, src, file_pairs):
+        result = dict()
         # 递归创建目录
-        if not self._sftp_con.exists(remote_dir):
-            self.mkdirs(remote_dir)
-        if not self._sftp_con.exists(remote_dir):
-            LOGGER.error(f"[Copy]: make remote dir failed: {remote_dir}")
+        remote_dirs = sorted({os.path.dirname(remote_path) for _, remote_path in file_pairs})
+        returncode, _, stderr = self._ssh_con.exec_command(
+            "mkdir -p " + " ".join(shlex.quote(remote_dir) for remote_dir in remote_dirs))
+        if returncode != 0:
+            LOGGER.error(f"[Copy]: create remote directory failed, exit code: {returncode}, error: {stderr}")
+            result["error_code"] = PluginResultCode.ERROR
+            result["error_msg"] = "create remote directory failed: " + (stderr.strip() or f"exit code {returncode}")
+            return result
 
         # 传输文件
-        if self._sftp_con.exists(dest):
-            self._sftp_con.delete(dest)
-        self._sftp_con.PutBinFile(src, dest)
-        if not self._sftp_con.exists(dest):
-            LOGGER.error("[Copy]: copy file failed, remote file not exists")
+        try:
+            local_digests = engine.upload_files(file_pairs)
+        except Exception as e:
+            LOGGER.error(f"[Copy]: copy file failed: {e}")
             result["error_code"] = PluginResultCode.ERROR
             result["error_msg"] = "upload file failed: " + src
             return result
 
-        # 通过 sha256 摘要信息判断是否上传成功
-        if not compare_remote_and_local_file(self.get_ssh_con(), dest, src):
+        # 通过 sha256 摘要信息判断是否上传成功，所有文件只需一次远端校验
+        remote_digests = remote_sha256sum(self._ssh_con, [remote_path for _, remote_path in file_pairs])
+        mismatched = [local_path for local_path, remote_path in file_pairs
+                      if remote_digests.get(remote_path) != local_digests.get(remote_path)]
+        if mismatched:
             LOGGER.error("[Copy]: copy file failed, incorrect SHA256 digest information")
             result["error_code"] = PluginResultCode.ERROR
-            result["error_msg"] = "check sha256sum failed: " + src
+            result["error_msg"] = "check sha256sum failed: " + ",".join(mismatched)
             return result
-        # chmod chown
-        # 验证用户是否合法
-        if "owner" in self._task_vars and "group" in self._task_vars:
-            self._sftp_con.chown(dest, self._task_vars["owner"], self._task_vars["group"])
-        if "mode" in self._task_vars:
-            self._sftp_con.chmod(dest, self._task_vars["mode"])
-        LOGGER.info("[Copy]: copy file success")
-        result["error_code"] = PluginResultCode.SUCCESS
-        result["error_msg"] = "success"
         return result
 
-    def mkdirs(self, remote_dir):
-        if not self._sftp_con.exists(remote_dir):
-            self.mkdirs(os.path.dirname(remote_dir))
-        else:
-            return
-        self._sftp_con.mkdir(remote_dir)
-        LOGGER.info(f"[Copy]: mkdir {remote_dir} successfully")
-
-    def handle_tilde(self, remote_path):
-        home_path = self._ssh_con.cmd("cd ~ && pwd")
-        home_path_without_color = re.sub(COLOR_PATTERN, '', home_path).strip("\r")
-        return remote_path.replace("~", home_path_without_color, 1)
+    def _set_permissions(self, file_pairs):
+        """内容未变化而跳过上传的文件同样设置属主和权限"""
+        # chmod chown
+        # 验证用户是否合法
+        for _, remote_path in file_pairs:
+            if "owner" in self._task_vars and "group" in self._task_vars:
+                self._sftp_con.chown(remote_path, self._task_vars["owner"], self._task_vars["group"])
+            if "mode" in self._task_vars:
+                self._sftp_con.chmod(remote_path, self._task_vars["mode"])
@@ -5,6 +5,7 @@ from pathlib import Path
 from zeus.operation_service.app.constant import BASE_DIR
 from zeus.operation_service.app.core.framework.common.result_code import PluginResultCode
 from zeus.operation_service.app.core.framework.plugins.base_plugin import BasePlugin
+from zeus.operation_service.app.core.framework.tools.transfer import TransferEngine
 from vulcanus.log.log import LOGGER
 
 
@@ -52,15 +53,16 @@ class Fetch(BasePlugin):
                     local_dest_path += "(1)"
                 local_dest_path = re.sub(r'\(\d+\)$', f'({i})', local_dest_path)
                 i += 1
+        engine = TransferEngine(self._ssh_con)
         try:
-            self._sftp_con.GetBinFile(remote_src, local_dest_path)
+            engine.download(remote_src, local_dest_path)
         except Exception as e:
             LOGGER.exception("Catch an exception: %s", traceback.format_exc())
             result["error_code"] = PluginResultCode.ERROR
             result["error_msg"] = "Fetch file failed"
             return result
         #  chmod chown
-        LOGGER.info("fetch success")
+        LOGGER.info(f"fetch success, {engine.statistics()}")
 
         result["error_code"] = PluginResultCode.SUCCESS
         result["error_msg"] = "success"
@@ -1,29 +1,80 @@
-import re
+import os
+from datetime import datetime
+
+from zeus.operation_service.app.core.framework.common.constant import ExecMode, ResultStoreType
 from zeus.operation_service.app.core.framework.common.result_code import PluginResultCode
 from zeus.operation_service.app.core.framework.plugins.base_plugin import BasePlugin
+from zeus.operation_service.app.core.framework.tools.output_stream import OutputStream
+from zeus.operation_service.app.core.framework.tools.result_store import ResultStoreRegistry
+from zeus.operation_service.app.settings import configuration
 from vulcanus.log.log import LOGGER
 
-COLOR_PATTERN = r'\x1b(\[.*?[@-~]|\].*?(\x07|\x1b\\))'
-
 
 class Shell(BasePlugin):
 
     def run(self):
         result = dict()
         exitcode = False
+        # 命令的退出码，超时或执行异常时为None
+        exit_code = None
         result["error_code"] = PluginResultCode.SUCCESS
         cmd = self._task_vars["cmd"]
-        echo = ""
         LOGGER.info("[Shell]: %s", cmd)
+        exec_mode = self._task_vars.get("exec_mode")
+        formatted_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        record = self._result_record()
+        # 输出边读边写入结果文件，内存中只保留首尾部分用于返回
+        output = OutputStream(self._result_file_path(), header=f'[{formatted_time}]: {cmd}\n',
+                              head_size=configuration.task.output_head_size,
+                              tail_size=configuration.task.output_tail_size,
+                              pty=exec_mode != ExecMode.EXEC, record=record, prompt=self._ssh_con.waitstr)
         try:
-            echo = self._ssh_con.cmd(cmd)
-            exitcode = self._ssh_con.get_last_result()
+            if exec_mode == ExecMode.EXEC:
+                returncode, _, _ = self._ssh_con.exec_command(cmd, sink=output)
+                exitcode = returncode == 0
+                exit_code = returncode
+            else:
+                self._ssh_con.cmd_to_stream(cmd, output)
+                result_codes = list()
+                exitcode = self._ssh_con.get_last_result(process_method=result_codes.append)
+                if result_codes and str(result_codes[0]).isdigit():
+                    exit_code = int(result_codes[0])
         except Exception:
             result["error_code"] = PluginResultCode.FAILED
+        finally:
+            output.close()
+            self._close_record(record, exit_code)
 
-        echo_without_color = re.sub(COLOR_PATTERN, '', echo).strip("\r")
         result["error_msg"] = {
-            "echo": echo_without_color,
+            "echo": output.getvalue(),
             "exitcode": exitcode
         }
         return result
+
+    def _result_file_path(self):
+        """命令输出的落盘文件，返回None时输出只在内存中保留首尾部分"""
+        return None
+
+    def _result_record(self):
+        """
+        命令输出在结果存储中的写入端，未启用结果存储或输出不落盘时返回None；
+        所属workflow已结束、结果存储已关闭时（如超时后仍在执行的主机）只写入主机结果文件
+        """
+        file_path = self._result_file_path()
+        if not file_path or configuration.task.result_store != ResultStoreType.SEGMENT:
+            return None
+        store = ResultStoreRegistry().get(os.path.dirname(file_path))
+        if store is None:
+            LOGGER.warning(f"result store of {os.path.dirname(file_path)} is closed, "
+                           f"write {self._host['ip']} output to result file only")
+            return None
+        return store.record(self._host, self._task_vars["task_metadata"].get("work_node_name"))
+
+    @staticmethod
+    def _close_record(record, exit_code):
+        if record is None:
+            return
+        try:
+            record.close(exit_code)
+        except OSError as e:
+            LOGGER.warning(f"save result to result store failed: {e}")
@@ -1,3 +1,6 @@
+import threading
+
+from zeus.operation_service.app.core.framework.common.constant import ExecMode
 from zeus.operation_service.app.core.framework.common.result_code import PluginResultCode
 from zeus.operation_service.app.core.framework.tools import ssh, sftp
 from zeus.operation_service.app.core.framework.tools.task_result import TaskResult
@@ -5,18 +8,60 @@ from vulcanus.log.log import LOGGER
 
 
 class TaskExecutor:
-    def __init__(self, host, task):
+    def __init__(self, host, task, timeout=None, session_broker=None, cancel_token=None):
         self._host = host
         self._task = task
-        self._ssh_con = ssh.RemoteControl(self._host["ip"],
-                                          self._host["username"],
-                                          self._host["password"],
-                                          self._host["passwordless"],
-                                          self._host["port"])
+        self._timeout = timeout
+        self._cancel_token = cancel_token
+        self._session_broker = session_broker
+        self._session = None
+        self._ssh_con = None
+        self._sftp_con = None
+        self._aborted = False
+        self._abort_lock = threading.Lock()
+
+    def _connect(self):
+        if self._cancel_token is not None:
+            self._cancel_token.check()
+        self._session = self._session_broker.acquire(self._host) if self._session_broker else None
+        try:
+            ssh_con = ssh.RemoteControl(self._host["ip"],
+                                        self._host["username"],
+                                        self._host["password"],
+                                        self._host["passwordless"],
+                                        self._host["port"],
+                                        interactive=self._task.get("exec_mode") != ExecMode.EXEC,
+                                        session=self._session,
+                                        cancel_token=self._cancel_token,
+                                        banner_timeout=self._timeout)
+        except Exception:
+            self._release_session()
+            raise
+        with self._abort_lock:
+            self._ssh_con = ssh_con
+            aborted = self._aborted
+        if aborted:
+            # 建链期间主机已执行超时，连接不再使用
+            ssh_con.abort()
+            ssh_con.close()
+            self._release_session()
+            raise TimeoutError(f"{self._host['ip']} execution timeout while connecting")
         self._sftp_con = sftp.FileMgr(self._ssh_con)
-        self._ssh_con.timeout = 60 * 60
+        self._ssh_con.timeout = self._timeout if self._timeout else 60 * 60
+
+    def abort(self):
+        """
+        单主机执行超时后由分发线程调用：关闭该主机的连接，阻塞在命令输出或SFTP传输上的工作线程随即出错返回；
+        仍在建链的，建链完成后直接关闭连接并结束
+        """
+        with self._abort_lock:
+            self._aborted = True
+            ssh_con = self._ssh_con
+        if ssh_con is not None:
+            ssh_con.abort()
 
     def run(self):
+        self._connect()
         self._build_handler()
         module_result = dict()
         module_result["error_msg"] = "Module execution failed"
@@ -27,9 +72,19 @@ class TaskExecutor:
             LOGGER.error(e)
         finally:
             self._ssh_con.close()
+            self._release_session()
+        # 插件执行中被取消时保留已读到的输出，结果标记为已取消
+        if self._cancel_token is not None and self._cancel_token.cancelled \
+                and module_result.get("error_code") != PluginResultCode.SUCCESS:
+            module_result["error_code"] = PluginResultCode.CANCELED
 
         return TaskResult(self._host, self._task, module_result)
 
+    def _release_session(self):
+        if self._session is not None:
+            self._session_broker.release(self._session)
+            self._session = None
+
     def _build_handler(self):
         module_name = self._task["name"]
         package = __import__("zeus.operation_service.app.core.framework.plugins", fromlist=[module_name])
@@ -0,0 +1,88 @@
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from zeus.operation_service.app.constant import SingletonMeta
+from zeus.operation_service.app.settings import configuration
+from vulcanus.log.log import LOGGER
+
+
+class ClusterSlots:
+    """一个集群正在执行的主机数和等待执行的主机"""
+
+    def __init__(self):
+        self.running = 0
+        self.waiting = deque()
+
+
+class SharedDispatchEngine(metaclass=SingletonMeta):
+    """
+    进程级共享分发引擎，所有TaskDispatcher共用一个有界线程池执行阻塞的paramiko会话，
+    线程池大小即全局并发上限；同一集群正在执行的主机数达到上限后，后续主机在引擎内排队，
+    有主机结束时再提交，不占用线程池的工作线程。
+    服务以gevent方式运行时，线程池的工作线程经monkey patch后为协程，等待SSH输出时让出执行权。
+    调用方拿到concurrent.futures.Future，可以在主机完成时逐个处理结果；
+    主机开始执行前Future都可以cancel，包括在集群内排队和在线程池队列中等待工作线程的主机。
+    """
+
+    def __init__(self):
+        self.max_sessions = configuration.task.max_concurrent_sessions
+        self.max_sessions_per_cluster = configuration.task.max_sessions_per_cluster
+        self._executor = ThreadPoolExecutor(max_workers=self.max_sessions, thread_name_prefix="SharedDispatch")
+        self._lock = threading.Lock()
+        # cluster_id -> ClusterSlots，集群没有执行中和等待中的主机时移除
+        self._clusters = dict()
+        LOGGER.warning(f"shared dispatch engine started, max sessions: {self.max_sessions}, "
+                       f"max sessions per cluster: {self.max_sessions_per_cluster}")
+
+    def submit(self, func, cluster_id=None):
+        """
+        提交一个阻塞的单主机执行函数
+        :param func: 无参可调用对象，在线程池中执行
+        :param cluster_id: 主机所属集群，用于按集群限制并发
+        :return: concurrent.futures.Future
+        """
+        future = Future()
+        with self._lock:
+            slots = self._clusters.setdefault(cluster_id, ClusterSlots())
+            if slots.running >= self.max_sessions_per_cluster:
+                slots.waiting.append((func, future))
+                return future
+            slots.running += 1
+        self._executor.submit(self._run, func, future, cluster_id)
+        return future
+
+    def _run(self, func, future, cluster_id):
+        try:
+            # 工作线程取到时才置为执行中，在此之前已被取消的主机不再执行
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(func())
+            except BaseException as e:
+                future.set_exception(e)
+        finally:
+            self._next(cluster_id)
+
+    def _next(self, cluster_id):
+        """主机结束后提交该集群下一个等待的主机，已被取消的跳过"""
+        while True:
+            with self._lock:
+                slots = self._clusters[cluster_id]
+                if not slots.waiting:
+                    slots.running -= 1
+                    if slots.running == 0:
+                        del self._clusters[cluster_id]
+                    return
+                func, future = slots.waiting.popleft()
+            if not future.cancelled():
+                self._executor.submit(self._run, func, future, cluster_id)
+                return
+
+    def statistics(self):
+        with self._lock:
+            return {
+                "clusters": len(self._clusters),
+                "running": sum(slots.running for slots in self._clusters.values()),
+                "waiting": sum(len(slots.waiting) for slots in self._clusters.values())
+            }
@@ -20,6 +20,13 @@ class TaskDetail:
         self.ext_props['only_push'] = validated_data.get('only_push', False)
         self.ext_props['remote_path'] = validated_data.get('remote_path', None)
         self.ext_props['scheduler_info'] = validated_data.get('scheduler_info', None)
+        self.ext_props['exec_mode'] = validated_data.get('exec_mode', None)
+        self.ext_props['parallelism'] = validated_data.get('parallelism', None)
+        self.ext_props['batch_percent'] = validated_data.get('batch_percent', None)
+        self.ext_props['max_fail_percent'] = validated_data.get('max_fail_percent', None)
+        self.ext_props['per_host_timeout'] = validated_data.get('per_host_timeout', None)
+        self.ext_props['transfer_mode'] = validated_data.get('transfer_mode', None)
+        self.ext_props['workflow_mode'] = validated_data.get('workflow_mode', None)
 
     def get_task_detail(self):
         LOGGER.warning(f"start build task detail, [task_name]: {self.task_name}")
@@ -5,7 +5,7 @@ import shutil
 import traceback
 from abc import abstractmethod
 from flask import render_template
-from zeus.operation_service.app.constant import WORK_DIR
+from zeus.operation_service.app.constant import WORK_DIR, RESULTS_DIR
 from zeus.operation_service.app.core.file_util import U_RW, G_READ, O_READ
 from zeus.operation_service.app.core.framework.workflow.workflow_exception import WorkFlowException
 from vulcanus.log.log import LOGGER
@@ -13,7 +13,14 @@ from zeus.operation_service.app.proxy.host import HostProxy
 from zeus.operation_service.app.core.framework.common.result_code import TaskResultCode, WorkFlowResultCode
 from zeus.operation_service.app.proxy.task import TaskProxy
 from zeus.operation_service.app.core.framework.workflow.workflow import WorkFlow
+from zeus.operation_service.app.core.framework.workflow.step import EXECUTION_POLICY_FIELDS
 from zeus.operation_service.app.core.framework.task.task_detail.task_detail_parser import TaskDetailParser
+from zeus.operation_service.app.core.framework.task.task_progress import TaskProgress
+from zeus.operation_service.app.core.framework.tools.cancellation import CancellationRegistry
+from zeus.operation_service.app.core.framework.tools.result_store import ResultStoreRegistry
+from zeus.operation_service.app.core.framework.tools.transfer_cache import TransferStatistics
+from zeus.operation_service.app.core.framework.tools.worker import worker_id
+from zeus.operation_service.app.settings import configuration
 
 
 class BaseTask:
@@ -23,28 +30,54 @@ class BaseTask:
         self.task_name = task_param.get("task_name")
         self.node_indexes = task_param.get('node_indexes')
         self.task_hosts = task_param.get('task_hosts')
-        self.workflow = WorkFlow(os.path.join(task_param.get("local_path"), "workflow.yaml"), task_param)
+        self.task_type = task_param.get('task').task_type
+        # 分片执行时为分片序号，任务状态由协调者根据所有分片的结果设置
+        self.shard = task_param.get('shard')
+        # 同一任务的所有子任务共用一个取消令牌
+        self.cancel_token = CancellationRegistry().get(self.task_id)
+        # workflow定义由TaskYaml直接生成，未生成时读取workflow.yaml
+        workflow = task_param.get("workflow") or os.path.join(task_param.get("local_path"), "workflow.yaml")
+        self.workflow = WorkFlow(workflow, task_param,
+                                 self.cancel_token)
 
     def init(self):
         self.workflow.init()
+        TaskProgress().add_workflow(self.task_id, self.workflow.host_work_count())
 
     def _pre_start(self):
+        # 任务池取出任务时已置为运行状态，进度由TaskProgress在内存中统计并定时写入
         LOGGER.warning(f"{self.task_name} begin running")
-        task_proxy = TaskProxy()
-        task = task_proxy.get_task_by_id(self.task_id)
-        # 任务已经为运行状态，则返回，避免同个task的多个workflow重复设置
-        if task.status == TaskResultCode.RUNNING.code:
-            return
-        task_proxy.set_running_status(self.task_id)
-        task_proxy.update_progress(self.task_id, 0.005)
 
     def _post_success(self):
         """任务完成后的操作，子类实现"""
         pass
 
+    def _acquire_result_store(self):
+        """分片执行时写入以进程标识命名的结果存储，不与其他进程写入同一个段文件"""
+        result_path = os.path.join(RESULTS_DIR, self.task_type, self.task_id)
+        ResultStoreRegistry().acquire(result_path, worker_id() if self.shard is not None else None)
+
+    def _release_result_store(self):
+        """本进程内该任务的workflow都结束后关闭结果存储，主机结果文件由结果存储代替"""
+        result_path = os.path.join(RESULTS_DIR, self.task_type, self.task_id)
+        try:
+            ResultStoreRegistry().release(result_path)
+        except OSError as e:
+            LOGGER.warning(f"close {self.task_name} result store failed: {e}")
+
+    def _save_transfer_statistics(self):
+        result_path = os.path.join(RESULTS_DIR, self.task_type, self.task_id)
+        try:
+            statistics = TransferStatistics().flush(self.task_id, result_path)
+        except OSError as e:
+            LOGGER.warning(f"save {self.task_name} transfer statistics failed: {e}")
+            return
+        if statistics:
+            LOGGER.info(f"{self.task_name} transfer statistics: {statistics}")
+
     def _clean_env(self):
         LOGGER.warning(f"begin to clean {self.task_name} env")
-        shutil.rmtree(os.path.join(WORK_DIR, self.task_id))
+        shutil.rmtree(os.path.join(WORK_DIR, self.task_id), ignore_errors=True)
         LOGGER.warning(f"clean {self.task_name} env successfully")
 
     def _handle_error_result(self, result_msg):
@@ -66,17 +99,30 @@ class BaseTask:
         task_proxy.set_failed_status(self.task_id, TaskResultCode.UNKNOWN.code)
 
     def run(self):
+        last_workflow = False
         try:
             self._pre_start()
-            self.workflow.start()
-            if self.workflow.status == WorkFlowResultCode.NORMAL.code:
-                self._post_success()
+            self._acquire_result_store()
+            try:
+                self.workflow.start()
+            finally:
+                last_workflow = TaskProgress().finish_workflow(self.task_id)
+                self._release_result_store()
+            if self.cancel_token.cancelled:
+                LOGGER.warning(f"{self.task_name} cancelled")
+            elif self.workflow.status == WorkFlowResultCode.NORMAL.code:
+                # 同一任务的所有workflow都结束后才置为成功，失败状态不会被覆盖
+                if last_workflow and self.shard is None:
+                    self._post_success()
             else:
                 TaskProxy().set_failed_status(self.task_id, TaskResultCode.UNKNOWN.code)
         except Exception as e:
             self._handle_exception(e)
         finally:
-            self._clean_env()
+            self._save_transfer_statistics()
+            # 同一任务的其他workflow可能仍在准备或执行，最后一个workflow结束后才清理
+            if last_workflow:
+                self._clean_env()
         return self
 
     class TaskYaml:
@@ -93,11 +139,45 @@ class BaseTask:
             self.workflow_template = "workflow_template.yml"
             self.task_type = str()
 
-        def generate_workflow_yaml(self):
+        def generate_workflow(self):
+            """
+            根据init_context_params的上下文直接生成workflow定义，结构与workflow.yaml解析结果相同，
+            不再渲染模板、写入文件后再解析；配置task.dump_workflow_yaml时另外写入workflow.yaml用于定位问题
+            """
             ctx = self.init_context_params()
+            ctx.setdefault("mode", self.generate_workflow_mode())
+            if configuration.task.dump_workflow_yaml:
+                self.generate_workflow_yaml(ctx)
+            return {
+                "version": 1.0,
+                "name": "task",
+                "mode": ctx["mode"],
+                "hosts": [dict(host) for host in ctx["hosts"]],
+                "jobs": [self._job_definition(job) for job in ctx["jobs"]]
+            }
+
+        @staticmethod
+        def _job_definition(job):
+            steps = list()
+            for step in job["steps"]:
+                step_json = {
+                    "name": step["name"],
+                    "module": dict(step["module"]),
+                    "dependency": [step["dependency"]] if step["dependency"] else []
+                }
+                if step.get("barrier"):
+                    step_json["barrier"] = True
+                steps.append(step_json)
+            job_json = {"name": job["name"], "dependency": [], "hosts": list(job["hosts"]), "steps": steps}
+            job_json.update(job["policy"])
+            return job_json
+
+        def generate_workflow_yaml(self, ctx):
+            """workflow定义写入workflow.yaml，只用于定位问题，任务执行不读取该文件"""
             from zeus.operation_service.manage import app
             with app.app_context():
                 workflow_yaml = render_template(self.workflow_template, **ctx)
+            os.makedirs(self.local_path, exist_ok=True)
             # LOGGER.info(f"{self.local_path} workflow yaml: {workflow_yaml}")
             workflow_fd = os.open(os.path.join(self.local_path, "workflow.yaml"), os.O_WRONLY | os.O_CREAT,
                                   U_RW | G_READ | O_READ)
@@ -108,16 +188,50 @@ class BaseTask:
         def init_context_params(self):
             pass
 
+        def revision_sources(self):
+            """workflow定义引用的主机、命令、脚本，其中任一项变化时缓存的workflow定义失效，子类补充命令、脚本"""
+            return {"hosts": [self.task_hosts[node_index]["host_id"] for node_index in self.node_indexes]}
+
+        def generate_job_policy(self):
+            """任务创建时指定的分批执行策略，作为job级配置对job下所有step生效"""
+            ext_props = TaskDetailParser(self.task.task_detail).get_task_ext_props()
+            return {field: ext_props.get(field) for field in EXECUTION_POLICY_FIELDS if ext_props.get(field) is not None}
+
+        def generate_workflow_mode(self):
+            """任务创建时指定的workflow调度粒度，未指定时使用配置文件中的默认值"""
+            ext_props = TaskDetailParser(self.task.task_detail).get_task_ext_props()
+            return ext_props.get("workflow_mode") or configuration.task.workflow_mode
+
         def generate_host_list(self):
+            """
+            生成workflow的主机列表，查询失败或已不存在的主机带有error，执行时直接按失败处理，不建链
+            """
             context_hosts = list()
+            # 所有主机的信息和私钥批量查询，不再每台主机单独请求两次
+            hosts, failed_host_ids = HostProxy().get_hosts_by_ids([self.task_hosts[node_index]["host_id"]
+                                                                   for node_index in self.node_indexes])
             for node_index in self.node_indexes:
                 host_json = self.task_hosts[node_index]
-                host = HostProxy().get_host_by_id(host_json["host_id"])
+                host = hosts.get(host_json["host_id"])
+                if host is None:
+                    reason = "query host info failed" if host_json["host_id"] in failed_host_ids else "host not found"
+                    LOGGER.error(f"{self.task_id} host {host_json['host_id']}: {reason}")
+                    context_hosts.append({
+                        "hostname": host_json.get("host_name"),
+                        "ip": host_json.get("ip"),
+                        "port": None,
+                        "username": None,
+                        "cluster_id": None,
+                        "password": "",
+                        "error": f"Host info unavailable: {reason}"
+                    })
+                    continue
                 context_hosts.append({
                     "hostname": host.get("host_name"),
                     "ip": host.get("host_ip"),
                     "port": host.get("ssh_port"),
                     "username": host.get("ssh_user"),
-                    "password": HostProxy().get_host_pkey_by_id(host_json["host_id"]).replace('\n','\\n')
+                    "cluster_id": host.get("cluster_id"),
+                    "password": host.get("pkey") or ""
                 })
             return context_hosts
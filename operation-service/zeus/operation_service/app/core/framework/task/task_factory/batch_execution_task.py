@@ -1,5 +1,4 @@
 #  Copyright (c) Huawei Technologies Co., Ltd. 2023-2023. All rights reserved.
-from datetime import datetime
 import time
 from vulcanus.log.log import LOGGER
 
@@ -7,22 +6,13 @@ from zeus.operation_service.app.proxy.task import TaskProxy
 from zeus.operation_service.app.proxy.command import CommandProxy
 from zeus.operation_service.app.core.framework.task.task_detail.task_detail_parser import TaskDetailParser
 from zeus.operation_service.app.core.framework.common.constant import TaskType
-from zeus.operation_service.app.core.framework.common.result_code import TaskResultCode
 from zeus.operation_service.app.core.framework.task.task_factory.base_task import BaseTask
 
 
 class BatchExecutionTask(BaseTask):
 
     def _post_success(self):
-        dbproxy = TaskProxy()
-        task = dbproxy.get_task_by_id(self.task_id)
-        if task.status == TaskResultCode.RUNNING.code:
-            dbproxy.update_task(
-                task_id=self.task_id, 
-                status=TaskResultCode.SUCCESS.code, 
-                end_time=datetime.now(),
-                progress=1.0
-            )
+        TaskProxy().set_success_status(self.task_id)
 
     class TaskYaml(BaseTask.TaskYaml):
         def __init__(self, task_params: dict):
@@ -40,18 +30,26 @@ class BatchExecutionTask(BaseTask):
                 "hosts": context_hosts,
                 "jobs": [{
                     "name": "command_job",
-                    "hosts": "[" + ",".join([x["hostname"] for x in context_hosts]) + "]",
+                    "hosts": [x["hostname"] for x in context_hosts],
+                    "policy": self.generate_job_policy(),
                     "steps": context_steps
                 }],
                 
             }
             return context
 
+        def revision_sources(self):
+            sources = super().revision_sources()
+            task_case_list = TaskDetailParser(self.task.task_detail).get_task_case_list()
+            sources["commands"] = [command["id"] for command in task_case_list[0]["commands"]]
+            return sources
+
         def generate_command_list(self):
             context_steps = list()
             task_detail_parser = TaskDetailParser(self.task.task_detail)
             task_case_list = task_detail_parser.get_task_case_list()
             command_ids = list(map(lambda x: x["id"], task_case_list[0]["commands"]))
+            exec_mode = task_detail_parser.get_task_ext_props().get("exec_mode")
 
             db_proxy = CommandProxy()
             db_proxy.connect()
@@ -62,9 +60,9 @@ class BatchExecutionTask(BaseTask):
                 step_info["name"] = f"command_{command.command_id}"
                 step_info["dependency"] = dependency
                 dependency = step_info["name"]
-                step_items_info = list()
-                step_items_info.append("name: batch_execution_shell")
-                step_items_info.append(f"cmd: {command.content}")
-                step_info["step_items"] = step_items_info
+                step_module = {"name": "batch_execution_shell", "cmd": command.content}
+                if exec_mode:
+                    step_module["exec_mode"] = exec_mode
+                step_info["module"] = step_module
                 context_steps.append(step_info)
             return context_steps
@@ -1,28 +1,19 @@
 #  Copyright (c) Huawei Technologies Co., Ltd. 2023-2023. All rights reserved.
 import time
 import os
-from datetime import datetime
 from vulcanus.log.log import LOGGER
 from zeus.operation_service.app.proxy.task import TaskProxy
 from zeus.operation_service.app.core.framework.task.task_detail.task_detail_parser import TaskDetailParser
-from zeus.operation_service.app.core.framework.common.constant import TaskType
-from zeus.operation_service.app.core.framework.common.result_code import TaskResultCode
+from zeus.operation_service.app.core.framework.common.constant import TaskType, TransferMode
 from zeus.operation_service.app.core.framework.task.task_factory.base_task import BaseTask
 from zeus.operation_service.app.constant import SCRIPTS_DIR
+from zeus.operation_service.app.settings import configuration
 
 
 class BatchScriptExecutionTask(BaseTask):
 
     def _post_success(self):
-        dbproxy = TaskProxy()
-        task = dbproxy.get_task_by_id(self.task_id)
-        if task.status == TaskResultCode.RUNNING.code:
-            dbproxy.update_task(
-                task_id=self.task_id, 
-                status=TaskResultCode.SUCCESS.code, 
-                end_time=datetime.now(),
-                progress=1.0
-            )
+        TaskProxy().set_success_status(self.task_id)
 
     class TaskYaml(BaseTask.TaskYaml):
         def __init__(self, task_params: dict):
@@ -42,6 +33,12 @@ class BatchScriptExecutionTask(BaseTask):
             }
             return context
 
+        def revision_sources(self):
+            sources = super().revision_sources()
+            task_case_list = TaskDetailParser(self.task.task_detail).get_task_case_list()
+            sources["scripts"] = [script["script_id"] for script in task_case_list[0]["scripts"]]
+            return sources
+
         def generate_step_list(self, case_idx):
             context_steps = list()
             task_detail_parser = TaskDetailParser(self.task.task_detail)
@@ -53,34 +50,35 @@ class BatchScriptExecutionTask(BaseTask):
             script_path = os.path.join(SCRIPTS_DIR, script['script_id'])
 
             step_info = dict()
-            # 获取当前脚本文件并传送到远端
-            copy_list = list()
-            for index, file in enumerate(os.listdir(script_path)):
-                copy_info = dict()
-                copy_name = f"copy_file_to_cluster{index}"
-                copy_list.append(copy_name)
-                copy_info["name"] = copy_name
-                copy_item_info = list()
-                copy_item_info.append("name: copy")
-                copy_item_info.append(f"src: {os.path.join(script_path, file)}")
-                copy_item_info.append(f"dest: {os.path.join(self.remote_path, file)}")
-                copy_item_info.append("owner: 0")
-                copy_item_info.append("group: 0")
-                copy_item_info.append("mode: 0755")
-                copy_info["dependency"] = dependency
-                copy_info["step_items"] = copy_item_info
-                context_steps.append(copy_info)
+            # 脚本目录作为一个整体传送到远端：file方式下目录下的文件在同一连接上并行传输，
+            # bundle方式下目录打包为一个压缩包传输后在远端解压
+            transfer_mode = task_detail_parser.get_task_ext_props().get("transfer_mode") \
+                or configuration.task.transfer_mode
+            copy_info = dict()
+            copy_name = "copy_file_to_cluster"
+            copy_info["name"] = copy_name
+            copy_info["dependency"] = dependency
+            copy_info["module"] = {
+                "name": "bundle" if transfer_mode == TransferMode.BUNDLE else "copy",
+                "src": script_path,
+                "dest": self.remote_path,
+                "owner": 0,
+                "group": 0,
+                "mode": 0o755
+            }
+            context_steps.append(copy_info)
 
             only_push = task_detail_parser.get_task_ext_props()['only_push']
             if not only_push:
                 step_info["name"] = f"command_{script['script_id']}"
-                step_info["dependency"] = ','.join(copy_list)
-                step_items_info = list()
-                step_items_info.append("name: script_execution_shell")
+                step_info["dependency"] = copy_name
                 command_format = script['command'].replace('\r\n', ' ').replace('\n', ' ')
                 path = self.remote_path.replace('\\', '/')   # 避免后续在远端执行命令时反斜杠被转义
-                step_items_info.append(f"cmd: cd {path}; {command_format}")
-                step_info["step_items"] = step_items_info
+                step_module = {"name": "script_execution_shell", "cmd": f"cd {path}; {command_format}"}
+                exec_mode = task_detail_parser.get_task_ext_props().get("exec_mode")
+                if exec_mode:
+                    step_module["exec_mode"] = exec_mode
+                step_info["module"] = step_module
                 context_steps.append(step_info)
             return context_steps
 
@@ -94,8 +92,12 @@ class BatchScriptExecutionTask(BaseTask):
             for case_idx, case in enumerate(case_list[0]['scripts']):
                 job_info = dict()
                 job_info['name'] = case['name']
-                host_idxs = case_node['case_indexes'][str(case_idx)]
-                job_info['hosts'] = "[" + ",".join([node_list[idx]['host_name'] for idx in host_idxs]) + "]"
+                # 分片执行时只包含本分片的主机
+                host_idxs = [idx for idx in case_node['case_indexes'][str(case_idx)] if idx in self.node_indexes]
+                if not host_idxs:
+                    continue
+                job_info['hosts'] = [node_list[idx]['host_name'] for idx in host_idxs]
+                job_info['policy'] = self.generate_job_policy()
                 job_info['steps'] = self.generate_step_list(case_idx)
                 context_jobs.append(job_info)
             return context_jobs
@@ -1,6 +1,8 @@
 import os
 import shutil
-
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 from vulcanus.log.log import LOGGER
 from zeus.operation_service.app.constant import WORK_DIR
@@ -8,11 +10,19 @@ from zeus.operation_service.app.core.framework.task.task_factory.batch_script_ex
 from zeus.operation_service.database import Task
 from zeus.operation_service.app.core.framework.task.task_detail.task_detail_parser import TaskDetailParser
 from zeus.operation_service.app.core.framework.common.constant import TaskType
+from zeus.operation_service.app.core.framework.common.result_code import TaskResultCode
 from zeus.operation_service.app.core.framework.task.task_factory.batch_execution_task import BatchExecutionTask
+from zeus.operation_service.app.core.framework.task.task_progress import TaskProgress
+from zeus.operation_service.app.core.framework.tools.workflow_cache import WorkflowCache
+from zeus.operation_service.app.proxy.task import TaskProxy
+from zeus.operation_service.app.settings import configuration
 
 
 
 class TaskFactory:
+    # 所有任务共用的子任务准备线程池，并发数为task.prepare_concurrency
+    _prepare_pool = None
+    _prepare_pool_lock = threading.Lock()
 
     @staticmethod
     def task_factory():
@@ -27,34 +37,71 @@ class TaskFactory:
 
     @staticmethod
     def get_tasks_with_task_type(task: Task, params: dict):
+        """
+        对多个不同类型的节点资产包任务初始化任务：各子任务的准备（生成workflow定义、查询主机、初始化workflow）
+        在有界线程池中并发执行，返回每个子任务的Future，准备完成的子任务即可提交执行，不等待其他子任务
+        """
         LOGGER.warning(f"{task.task_name} {params.get('task_id')} begin to {task.task_type} tasks")
         task_detail_parser = TaskDetailParser(task.task_detail)
         task_hosts = task_detail_parser.get_task_hosts()
         params['task_hosts'] = task_hosts
         params['task_assets'] = task_detail_parser.get_task_assets()
         task_case_nodes = task_detail_parser.get_task_case_nodes()
-        to_do_tasks = list()
-        # 对多个不同类型的节点资产包任务初始化任务
-        for index, task_case_node in enumerate(task_case_nodes):
+        # 先登记子任务数，先执行完的子任务不会被当作最后一个子任务
+        TaskProgress().register(task.task_id, len(task_case_nodes))
+        prepare_pool = TaskFactory._get_prepare_pool()
+        # 每个子任务使用独立的参数，避免并发准备时互相覆盖
+        return [prepare_pool.submit(TaskFactory.prepare_case, task, index, task_case_node, dict(params))
+                for index, task_case_node in enumerate(task_case_nodes)]
+
+    @staticmethod
+    def prepare_case(task: Task, index, task_case_node, params):
+        """准备单个子任务，失败时任务置为失败状态，该子任务按已结束处理"""
+        try:
             TaskFactory.pre_task(task, index, task_case_node, params)
             LOGGER.warning(f"{params['task_name']} init: timeout={params.get('task_timeout')}")
             to_do_task = TaskFactory.init_task(task_type=task.task_type)(task_param=params)
             to_do_task.init()
-            to_do_tasks.append(to_do_task)
-        return to_do_tasks
+            return to_do_task
+        except Exception:
+            LOGGER.error(f"{task.task_name} prepare case {index} failed: {traceback.format_exc()}")
+            TaskProxy().set_failed_status(task.task_id, TaskResultCode.FAILED.code)
+            if TaskProgress().finish_workflow(task.task_id):
+                shutil.rmtree(os.path.join(WORK_DIR, task.task_id), ignore_errors=True)
+            raise
+
+    @staticmethod
+    def _get_prepare_pool():
+        with TaskFactory._prepare_pool_lock:
+            if TaskFactory._prepare_pool is None:
+                TaskFactory._prepare_pool = ThreadPoolExecutor(configuration.task.prepare_concurrency,
+                                                               thread_name_prefix="TaskPrepare")
+            return TaskFactory._prepare_pool
 
     @staticmethod
     def pre_task(task: Task, index, task_case_node, params):
-        """初始化任务agent压缩包和workflow.yaml生成
+        """初始化任务agent压缩包和生成workflow定义，
+        task_detail、主机、命令、脚本都未变化时复用上次生成的定义（定时任务周期执行）
         """
         task_name = "_".join([task.task_name, str(task.task_id), str(index)])
-        # agent临时路径
+        # agent临时路径，只在写入workflow.yaml时创建
         local_path = os.path.join(WORK_DIR, params.get('task_id'), task_name, 'agent')
-        os.makedirs(local_path)
         params['node_indexes'] = task_case_node.get('node_indexes')
+        # 子任务序号，检查点按任务ID和子任务序号记录
+        params['case_index'] = index
         params['task_name'] = task_name
         params['local_path'] = local_path
         params['task'] = task
         task_yaml = TaskFactory.init_task(task_type=task.task_type).TaskYaml(params)
-        # 生成workflow.yaml文件，任务根据workflow.yaml执行
-        task_yaml.generate_workflow_yaml()
+        workflow_cache = WorkflowCache()
+        cache_key = workflow_cache.key(task, params['node_indexes'], task_yaml.revision_sources())
+        workflow = workflow_cache.get(task.task_id, index, cache_key)
+        if workflow is None:
+            # 生成workflow定义，任务根据该定义执行
+            workflow = task_yaml.generate_workflow()
+            # 有主机信息查询失败时不缓存，重试时重新查询
+            if not any(host.get("error") for host in workflow["hosts"]):
+                workflow_cache.put(task.task_id, index, cache_key, workflow)
+        else:
+            LOGGER.info(f"{task_name} reuse cached workflow")
+        params['workflow'] = workflow
@@ -1,90 +1,153 @@
-import queue
+import functools
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+from concurrent.futures import ThreadPoolExecutor
 from vulcanus.log.log import LOGGER
-from zeus.operation_service.database import Task
+from zeus.operation_service.app.constant import SingletonMeta
 from zeus.operation_service.app.settings import configuration
 from zeus.operation_service.app.core.framework.common.result_code import TaskResultCode
-from zeus.operation_service.app.core.framework.task.task_factory.base_task import BaseTask
+from zeus.operation_service.app.core.framework.task.task_progress import TaskProgress
+from zeus.operation_service.app.core.framework.tools.cancellation import CancellationRegistry
+from zeus.operation_service.app.core.framework.tools.host_status import HostStatusRecorder
+from zeus.operation_service.app.core.framework.tools.worker import WorkerHeartbeat, worker_id
 from zeus.operation_service.app.proxy.task import TaskProxy
 
-class TaskPool:
 
-    def __init__(self, max_running_job=5, timeout=300):
+class TaskPool(metaclass=SingletonMeta):
+    """
+    常驻的任务调度器：
+    1. 等待执行的任务以WAITING状态持久化在operation_task表中，按优先级从高到低、入队时间从早到晚调度；
+    2. 同时执行的任务数不超过task.max_running_tasks，有空闲槽位时才取出任务生成workflow，内存占用与排队任务数无关；
+    3. 等待中的任务数达到task.max_task_number_in_task_pool时拒绝新任务入队；
+    4. 服务重启后继续调度仍处于等待状态的任务；
+    5. 任务记录取出它的进程，各进程定期把执行进程心跳已过期的运行中任务置为服务重启状态，不影响其他存活进程的任务。
+    """
+
+    def __init__(self):
+        self._max_running_tasks = configuration.task.max_running_tasks
+        self._workers = ThreadPoolExecutor(self._max_running_tasks, thread_name_prefix="TaskPool")
+        self._condition = threading.Condition()
+        # task_id -> 未结束的子任务数
+        self._running_tasks = dict()
+        self._wakeup = True
+        self._scheduler = None
+        self._last_recover = 0
+
+    def start(self):
+        """启动调度线程，重复调用无影响；线程不会保留到fork出的子进程中，需要在fork后的进程中调用"""
+        with self._condition:
+            if self._scheduler is not None:
+                return
+            self._scheduler = threading.Thread(target=self._schedule, name="TaskPool-scheduler", daemon=True)
+        WorkerHeartbeat().start()
+        self._recover_interrupted()
+        self._scheduler.start()
+        LOGGER.warning(f"task pool started, max running tasks: {self._max_running_tasks}")
+
+    def notify(self):
+        """有任务入队时唤醒调度线程"""
+        with self._condition:
+            self._wakeup = True
+            self._condition.notify()
+
+    @staticmethod
+    def admit():
+        """准入控制：等待中的任务数未达到上限时才允许新任务入队"""
+        return TaskProxy().count_waiting_tasks() < configuration.task.max_task_number_in_task_pool
+
+    def running_tasks(self):
+        with self._condition:
+            return list(self._running_tasks)
+
+    def _recover_interrupted(self):
+        """执行进程已退出的运行中任务置为服务重启状态，无法读取心跳时不处理"""
+        self._last_recover = time.monotonic()
         try:
-            if not hasattr(TaskPool, "_pool_size"):
-                self.running_tasks = list()
-                self.waiting_queue = queue.Queue()
-                self.timeout = timeout
-                TaskPool._pool_size = max_running_job
-                self.POLL_PRODUCE_POOL = ThreadPoolExecutor(TaskPool._pool_size,
-                                                            thread_name_prefix=f"TaskPool-{id(self)}")
-                LOGGER.warning(f"init pool size {max_running_job}, pool:{id(self.POLL_PRODUCE_POOL)},{id(self)}")
-                threading.Thread(target=self.start, name="TaskPool-thread").start()
+            task_proxy = TaskProxy()
+            owners = set(task_proxy.get_running_task_owners())
+            owners.discard(worker_id())
+            exited = owners - WorkerHeartbeat().alive_workers(owner for owner in owners if owner is not None)
+            if not exited:
+                return
+            interrupted = task_proxy.set_interrupted_tasks_status(exited)
+            if interrupted:
+                LOGGER.warning(f"{interrupted} tasks interrupted by service restart, owners: {exited}")
         except Exception as e:
-            LOGGER.error(f"TaskPool __init__ failed, exception: {e}")
-            self.handle_exception()
+            LOGGER.error(f"TaskPool set interrupted tasks status failed, exception: {e}")
 
-    def __new__(cls, *args, **kwargs):
-        if not hasattr(TaskPool, "_instance"):
-            LOGGER.info("task pool create new")
-            TaskPool._instance = object.__new__(cls)
-        return TaskPool._instance
+    def _free_slots(self):
+        return self._max_running_tasks - len(self._running_tasks)
 
-    def handle_exception(self):
-        for task in self.running_tasks:
+    def _schedule(self):
+        while True:
+            with self._condition:
+                # 定时轮询作为兜底，其他进程入队的任务也能被调度
+                self._condition.wait_for(lambda: self._wakeup and self._free_slots() > 0,
+                                         timeout=configuration.task.task_pool_poll_interval)
+                self._wakeup = False
+                free_slots = self._free_slots()
+                running_task_ids = list(self._running_tasks)
+            if time.monotonic() - self._last_recover >= configuration.task.worker_heartbeat_interval:
+                self._recover_interrupted()
+            if free_slots <= 0:
+                continue
             try:
-                task = Task.objects.get(pk=task.task_id)
-                if task.status == TaskResultCode.RUNNING.code or task.status == TaskResultCode.WAITING.code:
-                    LOGGER.error(f"taskpool exception, set {task.task_type} {task.name} failed")
-                    TaskProxy().set_failed_status(task.task_id, TaskResultCode.UNKNOWN.code)
+                self._dispatch(free_slots, running_task_ids)
             except Exception as e:
-                LOGGER.error(f"TaskPool handle exception get exception {e}")
+                LOGGER.error(f"task pool dispatch failed, exception: {e}")
 
-    def submit_task(self, task: BaseTask):
-        LOGGER.warning(f"find pool, put task:{id(task)} into pool:{id(self.POLL_PRODUCE_POOL)}")
-        self.running_tasks.append(task)
-        self.waiting_queue.put(task)
-        # 如果池子的任务大于最大任务数，则重启任务池，等待任务结束;避免持续启动任务，内存增大
-        if len(self.running_tasks) >= configuration.task.max_task_number_in_task_pool:
-            self.__del_self()
-            self.POLL_PRODUCE_POOL.shutdown(wait=False)
-            LOGGER.warning(
-                f"task in pool exceed max task number; shutdown pool: {id(self.POLL_PRODUCE_POOL)} successfully")
+    def _dispatch(self, free_slots, running_task_ids):
+        task_proxy = TaskProxy()
+        for task in task_proxy.get_waiting_tasks(free_slots, running_task_ids):
+            # 先登记取消令牌再取出任务，任务进入运行状态后的取消请求都能中断执行
+            CancellationRegistry().create(task.task_id)
+            # 任务可能已被取消，或已被其他调度线程取出
+            if not task_proxy.claim_waiting_task(task.task_id, worker_id()):
+                CancellationRegistry().remove(task.task_id)
+                continue
+            LOGGER.info(f"get task: {task.task_name}, priority: {task.priority}")
+            self._run(task.task_id)
 
-    def start(self):
-        all_tasks = list()
-        try:
-            while True:
-                task_pool_timeout = configuration.task.task_pool_timeout
-                task = self.waiting_queue.get(timeout=task_pool_timeout)
-                LOGGER.info(f"get task: {task.task_name}, put into pool: {id(self.POLL_PRODUCE_POOL)}")
-                all_tasks.append(self.POLL_PRODUCE_POOL.submit(task.run))
-        except queue.Empty:
-            self.__del_self()
-            LOGGER.warning(f"get no task in {task_pool_timeout}s, begin to stop task pool")
+    def _run(self, task_id):
+        # task_manager依赖本模块，在使用时导入
+        from zeus.operation_service.app.core.task_manager import TaskManager
+        prepared_tasks = TaskManager().prepare_task(task_id)
+        if not prepared_tasks:
+            CancellationRegistry().remove(task_id)
+            TaskProgress().discard(task_id)
+            return
+        with self._condition:
+            self._running_tasks[task_id] = len(prepared_tasks)
+        # 子任务准备完成即提交执行，先准备好的子任务不等待其他子任务
+        for prepared_task in prepared_tasks:
+            prepared_task.add_done_callback(functools.partial(self._on_prepared, task_id))
+
+    def _on_prepared(self, task_id, prepared_task):
+        if prepared_task.exception() is not None:
+            # 准备失败时任务已置为失败状态
+            self._release(task_id)
+            return
+        future = self._workers.submit(prepared_task.result().run)
+        future.add_done_callback(functools.partial(self._on_finished, task_id))
+
+    def _on_finished(self, task_id, future):
+        if future.exception() is not None:
+            LOGGER.error(f"task {task_id} run failed, exception: {future.exception()}")
             try:
-                task_timeout = configuration.task.task_timeout
-                for task in as_completed(all_tasks):
-                    LOGGER.warning(
-                        f"task {task.result(timeout=task_timeout)} finished")
-                    self.running_tasks.remove(task.result())
-                    LOGGER.warning(f"tasks {str(self.running_tasks)} is running")
-                LOGGER.warning("all tasks finished")
+                TaskProxy().set_failed_status(task_id, TaskResultCode.UNKNOWN.code)
             except Exception as e:
-                LOGGER.error(f"get task result error: {e}, shutdown task pool: {id(self.POLL_PRODUCE_POOL)}")
-                self.handle_exception()
-        except Exception as e:
-            LOGGER.error(f"task pool exception: {e}, shutdown task pool: {id(self.POLL_PRODUCE_POOL)}")
-            self.__del_self()
-            self.handle_exception()
-        finally:
-            self.POLL_PRODUCE_POOL.shutdown(wait=False)
-            LOGGER.warning(f"shutdown pool: {id(self.POLL_PRODUCE_POOL)} successfully")
+                LOGGER.error(f"set task {task_id} failed status error: {e}")
+        self._release(task_id)
 
-    def __del_self(self):
-        LOGGER.warning(f"kill taskpool {id(self)}")
-        if hasattr(TaskPool, "_instance"):
-            delattr(TaskPool, "_instance")
-        if hasattr(TaskPool, "_pool_size"):
-            delattr(TaskPool, "_pool_size")
+    def _release(self, task_id):
+        """子任务结束，同一任务的子任务全部结束后释放槽位"""
+        with self._condition:
+            self._running_tasks[task_id] -= 1
+            if self._running_tasks[task_id] > 0:
+                return
+            self._running_tasks.pop(task_id)
+            CancellationRegistry().remove(task_id)
+            HostStatusRecorder().close(task_id)
+            LOGGER.warning(f"task {task_id} finished, running tasks: {list(self._running_tasks)}")
+            self._wakeup = True
+            self._condition.notify()
@@ -0,0 +1,187 @@
+import threading
+import time
+from collections import namedtuple
+from vulcanus.log.log import LOGGER
+from zeus.operation_service.app.constant import SingletonMeta
+from zeus.operation_service.app.core.framework.common.result_code import TaskResultCode
+from zeus.operation_service.app.settings import configuration
+
+# 任务结束前进度最大值，完成时由任务结果统一置为1.0
+MAX_RUNNING_PROGRESS = 0.99
+
+# 与TaskProxy.get_task_status的查询结果字段相同
+TaskStatus = namedtuple("TaskStatus", ["status", "progress"])
+
+
+class _Progress:
+    def __init__(self, channel=None):
+        self.total = 0
+        self.finished = 0
+        self.workflows = 0
+        self.status = TaskResultCode.RUNNING.code
+        # 分片执行时进度通过channel汇报给协调者，记录已汇报的部分
+        self.channel = channel
+        self.reported_total = 0
+        self.reported_finished = 0
+
+
+class TaskProgress(metaclass=SingletonMeta):
+    """
+    任务进度聚合：
+    1. 任务开始准备时登记workflow数，每个workflow初始化后登记其需要执行的(work node, 主机)数，同一任务的多个workflow累加；
+    2. 每台主机执行完成时只在内存中计数，不访问数据库；
+    3. 后台线程每task.progress_flush_interval秒把有变化的任务进度合并为一次提交写入operation_task；
+    4. 任务的最后一个workflow结束时立即写入最终进度并清除内存中的记录；
+    5. 执行分片的进程不写数据库，把本进程各分片的增量计数通过ShardChannel汇报给协调者，由协调者合并后写入；
+    6. 本进程执行中任务的状态和进度查询直接读取内存，不在本进程执行的任务由调用方查询数据库。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._progresses = dict()
+        self._dirty = set()
+        self._flusher = None
+        # 写入进度复用同一个数据库会话，刷新线程和结束的workflow都会写入，按锁串行
+        self._write_lock = threading.Lock()
+        self._task_proxy = None
+
+    def register(self, task_id, workflows, channel=None):
+        """
+        登记任务的workflow数，workflow边准备边执行，先结束的workflow据此判断是否还有未结束的workflow；
+        channel为分片执行时汇报进度的ShardChannel
+        """
+        with self._lock:
+            progress = self._progresses.setdefault(task_id, _Progress(channel))
+            progress.workflows += workflows
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="TaskProgress-flusher", daemon=True)
+                self._flusher.start()
+
+    def add_workflow(self, task_id, total):
+        """workflow初始化完成，登记其需要执行的(work node, 主机)数"""
+        with self._lock:
+            progress = self._progresses.get(task_id)
+            if progress is not None:
+                progress.total += total
+                if progress.channel is not None:
+                    self._dirty.add(task_id)
+
+    def advance(self, task_id, count=1):
+        with self._lock:
+            progress = self._progresses.get(task_id)
+            if progress is None:
+                return
+            progress.finished += count
+            self._dirty.add(task_id)
+
+    def get(self, task_id):
+        """
+        内存中的任务状态和进度，返回TaskStatus；
+        任务不在本进程执行或在本进程执行分片、进度由协调者汇总时返回None，由调用方查询数据库
+        """
+        with self._lock:
+            progress = self._progresses.get(task_id)
+            if progress is None or progress.channel is not None:
+                return None
+            return TaskStatus(progress.status, self._ratio(progress))
+
+    def set_status(self, task_id, status):
+        """本进程执行中的任务失败或被取消时同步内存中的状态，已取消的任务状态不再被覆盖"""
+        with self._lock:
+            progress = self._progresses.get(task_id)
+            if progress is not None and progress.status != TaskResultCode.CANCELED.code:
+                progress.status = status
+
+    def finish_workflow(self, task_id):
+        """workflow结束，返回是否为该任务最后一个结束的workflow"""
+        with self._lock:
+            progress = self._progresses.get(task_id)
+            if progress is None:
+                return True
+            progress.workflows -= 1
+            if progress.workflows > 0:
+                return False
+            self._progresses.pop(task_id)
+            self._dirty.discard(task_id)
+            ratio = self._ratio(progress)
+            report = self._report(progress)
+        if progress.channel is not None:
+            self._send(progress.channel, report)
+        else:
+            self._write({task_id: ratio})
+        return True
+
+    def discard(self, task_id):
+        """任务准备失败时清除已登记的workflow"""
+        with self._lock:
+            self._progresses.pop(task_id, None)
+            self._dirty.discard(task_id)
+
+    @staticmethod
+    def _ratio(progress):
+        if progress.total <= 0:
+            return 0.0
+        return round(min(progress.finished / progress.total, MAX_RUNNING_PROGRESS), 4)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(configuration.task.progress_flush_interval)
+            self.flush()
+
+    @staticmethod
+    def _report(progress):
+        """分片进度自上次汇报后的增量"""
+        report = (progress.finished - progress.reported_finished, progress.total - progress.reported_total)
+        progress.reported_finished = progress.finished
+        progress.reported_total = progress.total
+        return report
+
+    def flush(self):
+        with self._lock:
+            progresses = dict()
+            reports = list()
+            for task_id in self._dirty:
+                progress = self._progresses.get(task_id)
+                if progress is None:
+                    continue
+                if progress.channel is None:
+                    progresses[task_id] = self._ratio(progress)
+                else:
+                    reports.append((progress.channel, self._report(progress)))
+            self._dirty.clear()
+        if progresses:
+            self._write(progresses)
+        for channel, report in reports:
+            self._send(channel, report)
+
+    @staticmethod
+    def _send(channel, report):
+        finished, total = report
+        if not finished and not total:
+            return
+        try:
+            channel.report_progress(finished, total)
+        except Exception as e:
+            LOGGER.warning(f"report shard progress of task {channel.task_id} failed: {e}")
+
+    def _write(self, progresses):
+        # 执行框架只在写入时依赖数据库，在使用时导入
+        from zeus.operation_service.app.proxy.task import TaskProxy
+        with self._write_lock:
+            try:
+                if self._task_proxy is None:
+                    self._task_proxy = TaskProxy()
+                self._task_proxy.update_progresses(progresses)
+            except Exception as e:
+                LOGGER.warning(f"update task progress failed: {e}")
+                # 会话可能已不可用，下次写入时重新建立
+                self._close_task_proxy()
+
+    def _close_task_proxy(self):
+        if self._task_proxy is None:
+            return
+        try:
+            self._task_proxy.session.close()
+        except Exception as e:
+            LOGGER.warning(f"close task progress session failed: {e}")
+        self._task_proxy = None
@@ -0,0 +1,230 @@
+import os
+import re
+import time
+from abc import ABC, abstractmethod
+try:
+    import re._parser as sre_parse
+except ImportError:
+    import sre_parse
+from zeus.operation_service.app.core.file_util import FileUtil
+from zeus.operation_service.app.core.framework.tools.result_store import ResultStore
+
+# 从文件末尾向前读取、逐行读取时每次读取的字节数
+TAIL_BLOCK_SIZE = 64 * 1024
+# 单次搜索返回的最大匹配行数
+GREP_MAX_MATCHES = 1000
+# 单次读取末尾的最大行数
+TAIL_MAX_LINES = 10000
+# 搜索时单行读取的最大字节数，超长的行分段匹配，避免整行读入内存
+LINE_MAX_SIZE = 1024 * 1024
+# 单次搜索的最长耗时（秒），超时后从next_offset继续搜索
+GREP_TIME_LIMIT = 5
+# 正则表达式的最大长度
+REGEX_MAX_LENGTH = 256
+
+
+class HostLogReader(ABC):
+    """
+    单台主机结果日志的读取：按字节游标分页、读取末尾若干行、按行搜索。
+    所有读取都只在内存中保留一页或一行，日志大小不影响工作进程内存；
+    返回的next_offset可作为下一次读取的游标，任务执行中日志仍在追加时同样适用。
+    日志来源由子类实现：执行中或未启用结果存储时为主机结果文件，任务结束后为结果存储。
+    两种来源的偏移都是主机日志偏移，重试的任务执行中读取主机结果文件时，之前执行的部分从结果存储读取，
+    任务结束后切换为读取结果存储，已返回的next_offset仍然有效。
+    """
+
+    @staticmethod
+    def create(result_path, ip, store=None):
+        """
+        主机结果文件存在时读取文件，否则读取任务的结果存储
+        :param store: 同一任务读取多台主机时共用的ResultStore，避免重复加载索引
+        """
+        file_path = os.path.join(result_path, f"result_{ip}.log")
+        if not ResultStore.exists(result_path):
+            return FileHostLogReader(file_path)
+        store_reader = StoreHostLogReader(store or ResultStore(result_path), ip)
+        if os.path.exists(file_path):
+            return FileHostLogReader(file_path, ResultStore.spool_base(file_path), store_reader)
+        return store_reader
+
+    @abstractmethod
+    def exists(self):
+        """主机日志是否存在"""
+
+    @abstractmethod
+    def size(self):
+        """主机日志的总字节数"""
+
+    @abstractmethod
+    def _read_bytes(self, offset, size):
+        """读取主机日志中从offset开始最多size字节的原始内容"""
+
+    def read(self, offset, size):
+        """从offset开始读取最多size字节"""
+        file_size = self.size()
+        offset = min(offset, file_size)
+        content, length = FileUtil.decode_bytes(self._read_bytes(offset, size))
+        return self._page(content, offset, offset + length, file_size)
+
+    def tail(self, lines, max_size):
+        """读取最后lines行，最多读取max_size字节，从返回的next_offset继续读取即可跟踪后续输出"""
+        file_size = self.size()
+        start = file_size
+        newlines = 0
+        # 末尾的换行符不算作一行
+        if self._read_bytes(max(0, file_size - 1), 1) == b"\n":
+            newlines = -1
+        while start > 0 and newlines < lines and file_size - start < max_size:
+            block_size = min(TAIL_BLOCK_SIZE, start, max_size - (file_size - start))
+            block = self._read_bytes(start - block_size, block_size)
+            start -= block_size
+            for index in range(len(block) - 1, -1, -1):
+                if block[index] != ord("\n"):
+                    continue
+                newlines += 1
+                if newlines == lines:
+                    start += index + 1
+                    break
+        content, length = FileUtil.decode_bytes(self._read_bytes(start, file_size - start))
+        return self._page(content, start, start + length, file_size)
+
+    def grep(self, pattern, offset, max_matches, max_scan, max_seconds=GREP_TIME_LIMIT):
+        """
+        从offset开始逐行搜索，找到max_matches个匹配行、扫描max_scan字节或耗时超过max_seconds后返回，
+        未扫描完时从next_offset继续搜索
+        :param pattern: 编译后的bytes正则表达式
+        """
+        matches = list()
+        file_size = self.size()
+        offset = min(offset, file_size)
+        position = offset
+        deadline = time.monotonic() + max_seconds
+        for line_offset, line in self.lines(offset):
+            position = line_offset + len(line)
+            if pattern.search(line):
+                matches.append({"offset": line_offset, "line": line.decode("utf-8", "replace").rstrip("\r\n")})
+                if len(matches) >= max_matches:
+                    break
+            if position - offset >= max_scan or time.monotonic() >= deadline:
+                break
+        return {
+            "matches": matches,
+            "offset": offset,
+            "next_offset": position,
+            "file_size": file_size,
+            "has_more": position < file_size
+        }
+
+    def lines(self, offset=0):
+        """从offset开始逐行读取，返回(行的偏移, 行内容)，超过LINE_MAX_SIZE的行分段返回"""
+        position = offset
+        buffer = b""
+        while True:
+            data = self._read_bytes(position + len(buffer), TAIL_BLOCK_SIZE)
+            if not data:
+                break
+            buffer += data
+            while buffer:
+                index = buffer.find(b"\n", 0, LINE_MAX_SIZE)
+                if index == -1 and len(buffer) < LINE_MAX_SIZE:
+                    break
+                end = index + 1 if index != -1 else LINE_MAX_SIZE
+                yield position, buffer[:end]
+                position += end
+                buffer = buffer[end:]
+        if buffer:
+            yield position, buffer
+
+    @staticmethod
+    def compile(pattern, regex=False, ignore_case=False):
+        """
+        搜索条件编译为bytes正则，默认按字面量匹配。
+        正则表达式不合法、超过REGEX_MAX_LENGTH或包含嵌套的重复量词时抛出re.error，
+        嵌套量词（如(a+)+）在不匹配的行上会指数级回溯，re模块无法中断单次匹配
+        """
+        if not regex:
+            return re.compile(re.escape(pattern.encode("utf-8")), re.IGNORECASE if ignore_case else 0)
+        if len(pattern) > REGEX_MAX_LENGTH:
+            raise re.error(f"regex is longer than {REGEX_MAX_LENGTH}")
+        expression = pattern.encode("utf-8")
+        if HostLogReader._has_nested_repeat(sre_parse.parse(expression)):
+            raise re.error("nested quantifiers are not allowed")
+        return re.compile(expression, re.IGNORECASE if ignore_case else 0)
+
+    @staticmethod
+    def _has_nested_repeat(parsed, in_repeat=False):
+        """解析后的正则中，不限次数的重复内部是否还有不限次数的重复"""
+        for op, av in parsed:
+            subpatterns = list()
+            repeat = in_repeat
+            if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+                unbounded = av[1] == sre_parse.MAXREPEAT
+                if unbounded and in_repeat:
+                    return True
+                repeat = in_repeat or unbounded
+                subpatterns.append(av[2])
+            elif op == sre_parse.SUBPATTERN:
+                subpatterns.append(av[-1])
+            elif op == sre_parse.BRANCH:
+                subpatterns.extend(av[1])
+            elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+                subpatterns.append(av[1])
+            if any(HostLogReader._has_nested_repeat(sub, repeat) for sub in subpatterns):
+                return True
+        return False
+
+    @staticmethod
+    def _page(content, offset, next_offset, file_size):
+        return {
+            "content": content,
+            "offset": offset,
+            "next_offset": next_offset,
+            "file_size": file_size,
+            "has_more": next_offset < file_size
+        }
+
+
+class FileHostLogReader(HostLogReader):
+    """
+    读取主机结果文件result_<ip>.log，文件内容从主机日志的base偏移处开始，
+    base之前为之前执行保存在结果存储中的部分，由base_reader读取
+    """
+
+    def __init__(self, file_path, base=0, base_reader=None):
+        self._file_path = file_path
+        self._base = base if base_reader is not None else 0
+        self._base_reader = base_reader
+
+    def exists(self):
+        return os.path.exists(self._file_path)
+
+    def size(self):
+        return self._base + os.path.getsize(self._file_path)
+
+    def _read_bytes(self, offset, size):
+        data = b""
+        if offset < self._base:
+            data = self._base_reader._read_bytes(offset, min(size, self._base - offset))
+            if len(data) < min(size, self._base - offset):
+                return data
+        offset = max(offset, self._base) - self._base
+        with open(self._file_path, "rb") as file_obj:
+            file_obj.seek(offset)
+            return data + file_obj.read(size - len(data))
+
+
+class StoreHostLogReader(HostLogReader):
+    """从任务结果存储中读取单台主机的日志，偏移量与原主机结果文件一致"""
+
+    def __init__(self, store, ip):
+        self._store = store
+        self._ip = ip
+
+    def exists(self):
+        return self._ip in self._store.hosts()
+
+    def size(self):
+        return self._store.host_size(self._ip)
+
+    def _read_bytes(self, offset, size):
+        return self._store.read(self._ip, offset, size)
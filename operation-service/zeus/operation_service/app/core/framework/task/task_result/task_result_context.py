@@ -18,5 +18,17 @@ class TaskResultContext:
     def get_items_detail(self, data):
         return self.task_result_detail.get_items_detail(data)
 
+    def search_hosts(self, data):
+        return self.task_result_detail.search_hosts(data)
+
+    def get_result_summary(self):
+        return self.task_result_detail.get_result_summary()
+
+    def get_output_groups(self, data):
+        return self.task_result_detail.get_output_groups(data)
+
+    def get_transfer_statistics(self):
+        return self.task_result_detail.get_transfer_statistics()
+
     def generate_hosts_assets(self):
         return self.task_result_detail.generate_hosts_assets()
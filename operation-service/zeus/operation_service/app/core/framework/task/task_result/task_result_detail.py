@@ -1,11 +1,26 @@
 import json
 import os
+import re
+import time
 from abc import ABC
 from vulcanus.log.log import LOGGER
-from zeus.operation_service.app.constant import TaskOperationResultCode
+from vulcanus.restful.resp import state
+from zeus.operation_service.app.constant import TaskOperationResultCode, RESULTS_DIR
 from zeus.operation_service.database import Task
+from zeus.operation_service.app.core.file_util import FileUtil
 from zeus.operation_service.app.core.task_exception import TaskException
-from zeus.operation_service.app.core.framework.common.constant import TaskType
+from zeus.operation_service.app.core.framework.common.constant import TaskType, FileSize
+from zeus.operation_service.app.core.framework.common.result_code import TaskResultCode
+from zeus.operation_service.app.core.framework.task.task_result.host_log_reader import HostLogReader, \
+    GREP_MAX_MATCHES, GREP_TIME_LIMIT, TAIL_MAX_LINES
+from zeus.operation_service.app.core.framework.tools.result_store import ResultStore
+from zeus.operation_service.app.core.framework.tools.transfer_cache import TransferStatistics
+from zeus.operation_service.app.proxy.host import HostProxy
+
+# 指定其中任一参数时按分页方式查询主机结果
+PAGE_PARAMS = ("offset", "size", "tail", "pattern")
+# 跨主机搜索单次调用最多检查的主机数
+SEARCH_MAX_HOSTS = 1000
 
 
 class TaskResultDetail(ABC):
@@ -19,8 +34,138 @@ class TaskResultDetail(ABC):
     def update_progress(self, request):
         pass
 
-    def get_items_detail(self, request):
-        pass
+    def get_items_detail(self, data):
+        """
+        查询单台主机的执行结果：
+        1. 指定pattern时从offset开始逐行搜索，返回匹配行及其位置；
+        2. 指定tail时返回最后tail行；
+        3. 指定offset/size时从offset开始读取最多size字节；
+        4. 都未指定时返回整个结果文件的所有行，任务执行中不允许查询。
+        分页方式返回的next_offset作为下一次查询的offset，任务执行中也可以查询
+        """
+        node_index = data['node_index']
+        host_id = self.node_list[node_index]['host_id']
+        host = HostProxy().get_host_by_id(host_id)
+        reader = HostLogReader.create(self._result_path(), host.get('host_ip'))
+
+        if not any(data.get(param) is not None for param in PAGE_PARAMS):
+            return self._read_all(reader)
+        if not reader.exists():
+            return state.TASK_RESULT_NOT_FOUND, {}
+        # 参数已由TaskResultSchema校验
+        offset = data.get("offset", 0)
+        if data.get("pattern") is not None:
+            try:
+                pattern = HostLogReader.compile(data["pattern"], data["regex"], data["ignore_case"])
+            except re.error as e:
+                LOGGER.error(f"query task result failed, invalid pattern: {e}")
+                return state.PARAM_ERROR, {}
+            max_matches = min(data.get("max_matches", GREP_MAX_MATCHES), GREP_MAX_MATCHES)
+            return state.SUCCEED, reader.grep(pattern, offset, max_matches, FileSize.GREP_SCAN_SIZE)
+        if data.get("tail") is not None:
+            return state.SUCCEED, reader.tail(min(data["tail"], TAIL_MAX_LINES), FileSize.PAGE_MAX_SIZE)
+        size = min(data.get("size", FileSize.STREAM_READ_SIZE), FileSize.PAGE_MAX_SIZE)
+        return state.SUCCEED, reader.read(offset, size)
+
+    def search_hosts(self, data):
+        """
+        从node_index主机日志的offset处开始逐行搜索，返回输出匹配的主机及其第一个匹配行。
+        单次调用最多扫描FileSize.GREP_SCAN_SIZE字节、GREP_TIME_LIMIT秒，检查SEARCH_MAX_HOSTS台主机，
+        未搜索完时返回的next_node_index、next_offset作为下一次搜索的起点
+        """
+        try:
+            pattern = HostLogReader.compile(data["pattern"], data.get("regex", False), data.get("ignore_case", False))
+        except re.error as e:
+            LOGGER.error(f"search task result failed, invalid pattern: {e}")
+            return state.PARAM_ERROR, {}
+        node_index = data.get("node_index", 0)
+        offset = data.get("offset", 0)
+        matched_hosts = list()
+        scanned_hosts = 0
+        remaining = FileSize.GREP_SCAN_SIZE
+        deadline = time.monotonic() + GREP_TIME_LIMIT
+        result_path = self._result_path()
+        store = ResultStore(result_path)
+        end_index = min(len(self.node_list), node_index + SEARCH_MAX_HOSTS)
+        while node_index < end_index and remaining > 0 and time.monotonic() < deadline:
+            node = self.node_list[node_index]
+            reader = HostLogReader.create(result_path, node['ip'], store)
+            if reader.exists():
+                scanned_hosts += 1
+                page = reader.grep(pattern, offset, 1, remaining, deadline - time.monotonic())
+                remaining -= page["next_offset"] - page["offset"]
+                if page["matches"]:
+                    matched_hosts.append({
+                        "node_index": node_index,
+                        "host_id": node['host_id'],
+                        "host_name": node.get('host_name'),
+                        "ip": node['ip'],
+                        "offset": page["matches"][0]["offset"],
+                        "line": page["matches"][0]["line"]
+                    })
+                elif page["has_more"]:
+                    # 扫描量或扫描时间达到上限时停在该主机的next_offset处
+                    offset = page["next_offset"]
+                    break
+            node_index += 1
+            offset = 0
+        return state.SUCCEED, {
+            "hosts": matched_hosts,
+            "scanned_hosts": scanned_hosts,
+            "total_hosts": len(self.node_list),
+            "next_node_index": node_index,
+            "next_offset": offset,
+            "has_more": node_index < len(self.node_list)
+        }
+
+    def get_result_summary(self):
+        """
+        任务结果汇总：退出码分布、失败主机、不同输出的数量等，只读取结果存储的索引，
+        未启用结果存储执行的任务没有汇总结果
+        """
+        result_path = self._result_path()
+        if not ResultStore.exists(result_path):
+            return state.TASK_RESULT_NOT_FOUND, {}
+        return state.SUCCEED, ResultStore(result_path).statistics()
+
+    def get_output_groups(self, data):
+        """
+        按(step, 退出码, 归一化输出)对主机分组，每组只返回一份输出，
+        输出超过FileSize.STREAM_READ_SIZE时截断，完整内容通过单台主机结果查询
+        """
+        result_path = self._result_path()
+        if not ResultStore.exists(result_path):
+            return state.TASK_RESULT_NOT_FOUND, {}
+        store = ResultStore(result_path)
+        node_indexes = {node['ip']: node_index for node_index, node in enumerate(self.node_list)}
+        groups = list()
+        for group in store.groups(data.get("work_node_name")):
+            record = group["record"]
+            content, _ = FileUtil.decode_bytes(store.read_output(record, FileSize.STREAM_READ_SIZE))
+            groups.append({
+                "work_node_name": group["node"],
+                "exit_code": group["exit_code"],
+                "count": len(group["hosts"]),
+                "hosts": [{"ip": ip, "node_index": node_indexes.get(ip)} for ip in group["hosts"]],
+                "output": content,
+                "truncated": record["size"] - len(record["header"].encode("utf-8")) > FileSize.STREAM_READ_SIZE
+            })
+        return state.SUCCEED, {"groups": groups, "total_hosts": len(self.node_list)}
+
+    def _result_path(self):
+        return os.path.join(RESULTS_DIR, self.task.task_type, self.task.task_id)
+
+    def _read_all(self, reader):
+        if self.task.status == TaskResultCode.RUNNING.code:
+            return state.REPEAT_TASK_EXECUTION, {}
+        if not reader.exists():
+            return state.TASK_RESULT_NOT_FOUND, {}
+        host_result = [line.decode("utf-8", "replace") for _, line in reader.lines()]
+        return state.SUCCEED, host_result
+
+    def get_transfer_statistics(self):
+        """任务文件传输统计：实际发送和因远端内容一致而跳过的字节数、文件数"""
+        return TransferStatistics().get(self.task.task_id, self._result_path())
 
     def generate_hosts_assets(self):
         '''
@@ -0,0 +1,161 @@
+import json
+import os
+import time
+from collections import defaultdict
+from vulcanus.log.log import LOGGER
+from zeus.operation_service.app.constant import RESULTS_DIR
+from zeus.operation_service.app.core.file_util import FileUtil
+from zeus.operation_service.app.core.framework.common.constant import FileSize, HostStatus
+from zeus.operation_service.app.core.framework.common.result_code import TaskResultCode
+from zeus.operation_service.app.core.framework.task.task_result.host_log_reader import HostLogReader
+from zeus.operation_service.app.core.framework.tools.host_status import HostStatusRecorder
+from zeus.operation_service.app.core.framework.tools.result_store import ResultStore
+from zeus.operation_service.app.proxy.task import TaskProxy
+from zeus.operation_service.app.settings import configuration
+
+
+class TaskResultStream:
+    """
+    任务结果流，以server-sent events格式推送任务执行过程，事件类型：
+    - status：主机在work node上的状态变化，offset为主机状态文件中下一条记录的字节位置
+    - output：主机命令输出的增量内容，offset为该主机结果日志中下一次读取的字节位置
+    - progress：任务状态或进度变化
+    - end：任务已结束且所有输出都已推送
+    只读取正在执行的主机的输出，客户端断线重连时通过status_offset和offsets从上次收到的位置继续推送，
+    重连时先重放status_offset之前的状态记录，恢复仍在执行的主机，不重复推送
+    """
+    ACTIVE_TASK_STATUS = (TaskResultCode.RUNNING.code, TaskResultCode.WAITING.code)
+
+    def __init__(self, task, status_offset=0, offsets=None):
+        self._task_id = task.task_id
+        self._status_file = HostStatusRecorder.status_file(task.task_id)
+        self._result_path = os.path.join(RESULTS_DIR, task.task_type, task.task_id)
+        # 任务结束后主机结果文件由结果存储代替，索引只增量加载一次
+        self._store = ResultStore(self._result_path)
+        self._status_offset = status_offset
+        # ip -> 结果文件下一次读取的位置
+        self._offsets = dict(offsets or {})
+        # ip -> 正在执行的work node数，为0时读完剩余输出后不再读取
+        self._running = defaultdict(int)
+        self._active_hosts = set(self._offsets)
+        self._has_more = False
+        self._replay_status()
+
+    @staticmethod
+    def parse_offsets(offsets):
+        """解析客户端上报的输出位置：ip:offset，多个以逗号分隔，ipv6地址按最后一个冒号拆分"""
+        result = dict()
+        for item in filter(None, (offsets or "").split(",")):
+            ip, _, offset = item.strip().rpartition(":")
+            if ip and offset.isdigit():
+                result[ip] = int(offset)
+        return result
+
+    def events(self):
+        task_proxy = TaskProxy()
+        last_task_status = None
+        while True:
+            # 先读取任务状态再读取文件：任务结束前主机的状态和输出都已写入文件，本轮读不到新数据即可结束
+            task_status = task_proxy.get_task_status(self._task_id)
+            if task_status is None:
+                yield self._event("end", {"status": None})
+                return
+            if tuple(task_status) != last_task_status:
+                last_task_status = tuple(task_status)
+                yield self._event("progress", {"status": task_status.status, "progress": task_status.progress})
+
+            self._has_more = False
+            events = list(self._read_status())
+            events.extend(self._read_outputs())
+            for event in events:
+                yield event
+            if task_status.status not in self.ACTIVE_TASK_STATUS and not events:
+                yield self._event("end", {"status": task_status.status})
+                return
+            if self._has_more:
+                continue
+            if not events:
+                # 保持连接，避免中间代理因长时间无数据断开
+                yield ": keep-alive\n\n"
+            time.sleep(configuration.task.stream_poll_interval)
+
+    def _read_status(self):
+        if not os.path.exists(self._status_file):
+            return
+        content, next_offset = FileUtil.seek_file_bytes(self._status_file, self._status_offset,
+                                                        FileSize.STREAM_READ_SIZE)
+        if next_offset - self._status_offset >= FileSize.STREAM_READ_SIZE - 3:
+            self._has_more = True
+        # 只处理完整的行，不完整的行留到下一次读取
+        for line in content.splitlines(keepends=True):
+            if not line.endswith("\n"):
+                break
+            self._status_offset += len(line.encode("utf-8"))
+            try:
+                record = json.loads(line)
+            except ValueError:
+                LOGGER.warning(f"task {self._task_id} invalid host status: {line}")
+                continue
+            self._update_running(record)
+            record["offset"] = self._status_offset
+            yield self._event("status", record)
+
+    def _replay_status(self):
+        """
+        重放status_offset之前的状态记录，只恢复各主机执行中的work node数：
+        重连前已开始执行的主机继续读取输出，重连前已结束的主机由客户端上报的offsets决定是否读取剩余输出
+        """
+        if self._status_offset <= 0 or not os.path.exists(self._status_file):
+            return
+        position = 0
+        with open(self._status_file, "rb") as status_file:
+            for line in status_file:
+                position += len(line)
+                if position > self._status_offset or not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self._count_running(record)
+        self._active_hosts.update(ip for ip, count in self._running.items() if count > 0)
+
+    def _count_running(self, record):
+        ip = record["ip"]
+        if record["status"] == HostStatus.RUNNING:
+            self._running[ip] += 1
+        elif self._running[ip] > 0:
+            self._running[ip] -= 1
+
+    def _update_running(self, record):
+        self._count_running(record)
+        # 结束的主机在读完剩余输出后移出
+        self._active_hosts.add(record["ip"])
+
+    def _read_outputs(self):
+        for ip in list(self._active_hosts):
+            reader = HostLogReader.create(self._result_path, ip, self._store)
+            if reader.exists():
+                yield from self._read_output(ip, reader)
+            if self._running[ip] == 0:
+                self._active_hosts.discard(ip)
+
+    def _read_output(self, ip, reader):
+        while True:
+            offset = self._offsets.get(ip, 0)
+            page = reader.read(offset, FileSize.STREAM_READ_SIZE)
+            content, next_offset = page["content"], page["next_offset"]
+            if next_offset <= offset:
+                return
+            self._offsets[ip] = next_offset
+            yield self._event("output", {"ip": ip, "offset": next_offset, "content": content})
+            if next_offset - offset < FileSize.STREAM_READ_SIZE - 3:
+                return
+            # 执行中的主机每轮只推送一块，避免单台主机的大量输出阻塞其他主机
+            if self._running[ip] > 0:
+                self._has_more = True
+                return
+
+    @staticmethod
+    def _event(name, data):
+        return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
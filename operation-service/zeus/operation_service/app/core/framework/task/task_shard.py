@@ -0,0 +1,264 @@
+import functools
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from vulcanus.log.log import LOGGER
+from zeus.operation_service.app.constant import SingletonMeta
+from zeus.operation_service.app.settings import configuration
+from zeus.operation_service.database import Task
+from zeus.operation_service.app.core.framework.common.constant import ShardEvent
+from zeus.operation_service.app.core.framework.common.result_code import TaskResultCode, WorkFlowResultCode
+from zeus.operation_service.app.core.framework.task.task_detail.task_detail_parser import TaskDetailParser
+from zeus.operation_service.app.core.framework.task.task_factory.task_factory import TaskFactory
+from zeus.operation_service.app.core.framework.task.task_pool import TaskPool
+from zeus.operation_service.app.core.framework.task.task_progress import TaskProgress, MAX_RUNNING_PROGRESS
+from zeus.operation_service.app.core.framework.tools.cancellation import CancellationRegistry
+from zeus.operation_service.app.core.framework.tools.host_status import HostStatusRecorder
+from zeus.operation_service.app.core.framework.tools.shard_channel import ShardChannel
+from zeus.operation_service.app.core.framework.tools.worker import WorkerHeartbeat, worker_id
+from zeus.operation_service.app.proxy.task import TaskProxy
+
+
+class ShardedTask:
+    """
+    分片执行的协调者，由取出任务的进程在任务池中执行，代替该任务的所有子任务：
+    1. 按task.shard_size把每个子任务的主机划分为分片，通过ShardChannel放入所有进程共用的分片队列；
+    2. 各进程的ShardWorker取出分片后在本进程准备并执行，结果写入任务结果目录下各进程自己的结果存储；
+    3. 协调者合并各分片汇报的进度写入operation_task，所有分片结束后根据各分片的结果置任务状态；
+    4. 超过task.shard_idle_timeout秒没有任何分片事件、进度和心跳变化，且本次执行没有排队中的分片时，按超时结束任务。
+    多个节点执行分片时，RESULTS_DIR需要是各节点共享的目录。
+    协调者在任务池中占用一个运行槽位直到所有分片结束，期间只等待事件、不执行主机，
+    因此task.max_running_tasks限制的是同时运行的任务数，分片执行的并发由各进程的task.shard_worker_concurrency限制。
+    """
+
+    def __init__(self, task: Task, task_case_nodes):
+        self.task_id = task.task_id
+        self.task_name = task.task_name
+        self.shards = self.partition(task_case_nodes, configuration.task.shard_size)
+        self.channel = ShardChannel(task.task_id, uuid.uuid4().hex)
+        self.cancel_token = CancellationRegistry().get(self.task_id)
+
+    @staticmethod
+    def enabled(task: Task):
+        """启用分片且任务的主机数超过一个分片时分片执行"""
+        shard_size = configuration.task.shard_size
+        if shard_size <= 0:
+            return False
+        task_case_nodes = TaskDetailParser(task.task_detail).get_task_case_nodes()
+        return sum(len(task_case_node.get("node_indexes")) for task_case_node in task_case_nodes) > shard_size
+
+    @staticmethod
+    def prepare(task: Task):
+        """与TaskFactory.get_tasks_with_task_type相同返回Future，协调者不需要准备，直接完成"""
+        future = Future()
+        future.set_result(ShardedTask(task, TaskDetailParser(task.task_detail).get_task_case_nodes()))
+        return future
+
+    @staticmethod
+    def partition(task_case_nodes, shard_size):
+        shards = list()
+        for task_case_node in task_case_nodes:
+            node_indexes = task_case_node.get("node_indexes")
+            for start in range(0, len(node_indexes), shard_size):
+                shards.append({"shard": len(shards), "node_indexes": node_indexes[start:start + shard_size]})
+        return shards
+
+    def run(self):
+        LOGGER.warning(f"{self.task_name} dispatch {len(self.shards)} shards")
+        pending = {shard["shard"] for shard in self.shards}
+        failed = False
+        try:
+            self.channel.dispatch(self.shards)
+            pending, failed = self._wait(pending)
+            self._finish(pending, failed)
+        finally:
+            self.channel.clear()
+        return self
+
+    def _wait(self, pending):
+        """等待所有分片结束，返回未结束的分片和是否有分片失败"""
+        failed = False
+        cancel_sent = False
+        last_active = last_flush = time.monotonic()
+        last_progress = last_beats = None
+        while pending:
+            event = self.channel.receive_event(configuration.task.shard_poll_interval)
+            now = time.monotonic()
+            if event is not None:
+                last_active = now
+                if event["type"] == ShardEvent.FINISHED:
+                    pending.discard(event["shard"])
+                    if not event.get("cancelled") and event.get("status") != WorkFlowResultCode.NORMAL.code:
+                        LOGGER.error(f"{self.task_name} shard {event['shard']} on {event['worker']} failed")
+                        failed = True
+            if self.cancel_token.cancelled and not cancel_sent:
+                # 取消请求到达协调者所在进程时通知执行分片的进程
+                ShardChannel.cancel(self.task_id)
+                cancel_sent = True
+            if now - last_flush >= configuration.task.progress_flush_interval:
+                last_flush = now
+                progress = self.channel.progress()
+                if progress != last_progress:
+                    last_active = now
+                    last_progress = progress
+                    self._write_progress(*progress)
+                # 分片仍在排队，或执行分片的进程仍在刷新心跳
+                queued, beats = self.channel.liveness()
+                if queued > 0 or beats != last_beats:
+                    last_active = now
+                last_beats = beats
+            if now - last_active > configuration.task.shard_idle_timeout:
+                break
+        return pending, failed
+
+    def _finish(self, pending, failed):
+        if self.cancel_token.cancelled or self.channel.cancelled():
+            LOGGER.warning(f"{self.task_name} cancelled")
+        elif pending:
+            LOGGER.error(f"{self.task_name} shards {sorted(pending)} lost")
+            ShardChannel.cancel(self.task_id)
+            TaskProxy().set_failed_status(self.task_id, TaskResultCode.TIMEOUT.code)
+        elif not failed:
+            TaskProxy().set_success_status(self.task_id)
+        # 分片失败时执行分片的进程已置任务为失败状态
+
+    def _write_progress(self, finished, total):
+        if total <= 0:
+            return
+        try:
+            TaskProxy().update_progresses({self.task_id: round(min(finished / total, MAX_RUNNING_PROGRESS), 4)})
+        except Exception as e:
+            LOGGER.warning(f"update task progress failed: {e}")
+
+
+class ShardWorker(metaclass=SingletonMeta):
+    """
+    每个operation-service进程一个的分片执行者：
+    1. 有空闲槽位时从分片队列取出分片，同时执行的分片数不超过task.shard_worker_concurrency；
+    2. 分片按子任务准备和执行，进度通过ShardChannel汇报给协调者，不写入数据库，结果写入本进程的结果存储；
+    3. 分片开始和结束时向协调者发送事件，等待分片期间刷新执行中分片的心跳，并检查所属任务是否已被取消；
+    4. 每个进程心跳周期检查一次已退出的进程，把其取出但未执行完的分片放回分片队列。
+    """
+
+    def __init__(self):
+        self._concurrency = configuration.task.shard_worker_concurrency
+        self._workers = ThreadPoolExecutor(max(self._concurrency, 1), thread_name_prefix="ShardWorker")
+        self._slots = threading.Semaphore(self._concurrency)
+        self._lock = threading.Lock()
+        # task_id -> [ShardChannel, 本进程执行中的分片数]
+        self._running = dict()
+        self._receiver = None
+        self._last_requeue = 0
+
+    def start(self):
+        """启动取分片的线程，未启用分片时不启动，重复调用无影响"""
+        with self._lock:
+            if self._receiver is not None or configuration.task.shard_size <= 0 or self._concurrency <= 0:
+                return
+            self._receiver = threading.Thread(target=self._receive, name="ShardWorker-receiver", daemon=True)
+        # 其他进程根据心跳判断本进程执行中的分片是否需要放回队列
+        WorkerHeartbeat().start()
+        self._receiver.start()
+        LOGGER.warning(f"shard worker {worker_id()} started, concurrency: {self._concurrency}")
+
+    def _receive(self):
+        poll_interval = configuration.task.shard_poll_interval
+        while True:
+            self._check_running()
+            self._requeue_lost()
+            if not self._slots.acquire(timeout=poll_interval):
+                continue
+            try:
+                channel, shard = ShardChannel.receive(poll_interval)
+            except Exception as e:
+                LOGGER.error(f"receive shard failed, exception: {e}")
+                channel = None
+                time.sleep(poll_interval)
+            if channel is None:
+                self._slots.release()
+                continue
+            with self._lock:
+                self._running.setdefault(channel.task_id, [channel, 0])[1] += 1
+            future = self._workers.submit(self._execute, channel, shard)
+            future.add_done_callback(functools.partial(self._on_finished, channel, shard))
+
+    def _check_running(self):
+        with self._lock:
+            channels = [running[0] for running in self._running.values()]
+        for channel in channels:
+            try:
+                channel.beat()
+                if channel.cancelled():
+                    CancellationRegistry().cancel(channel.task_id)
+            except Exception as e:
+                LOGGER.warning(f"check task {channel.task_id} shards failed: {e}")
+
+    def _requeue_lost(self):
+        now = time.monotonic()
+        if now - self._last_requeue < configuration.task.worker_heartbeat_interval:
+            return
+        self._last_requeue = now
+        try:
+            count = ShardChannel.requeue(WorkerHeartbeat().alive_workers)
+        except Exception as e:
+            LOGGER.warning(f"requeue shards of exited workers failed: {e}")
+            return
+        if count:
+            LOGGER.warning(f"requeue {count} shards of exited workers")
+
+    @staticmethod
+    def _execute(channel, shard):
+        """准备并执行分片，返回workflow状态，分片已失效时返回None"""
+        task: Task = TaskProxy().get_task_by_id(channel.task_id)
+        # 其他分片失败时任务已置为失败状态，剩余的分片仍然执行，只跳过已取消或已失效的分片
+        if not task or not channel.active():
+            LOGGER.warning(f"skip shard {shard['shard']} of task {channel.task_id}")
+            return None
+        task_detail_parser = TaskDetailParser(task.task_detail)
+        params = {
+            "task_timeout": configuration.task.task_timeout,
+            "task_id": task.task_id,
+            "task_hosts": task_detail_parser.get_task_hosts(),
+            "task_assets": task_detail_parser.get_task_assets(),
+            "shard": shard["shard"]
+        }
+        TaskProgress().register(task.task_id, 1, channel)
+        channel.send_event(ShardEvent.STARTED, shard["shard"])
+        to_do_task = TaskFactory.prepare_case(task, shard["shard"], shard, params)
+        to_do_task.run()
+        return to_do_task.workflow.status
+
+    def _on_finished(self, channel, shard, future):
+        status = None
+        if future.exception() is not None:
+            LOGGER.error(f"shard {shard['shard']} of task {channel.task_id} failed: "
+                         f"{''.join(traceback.format_exception(None, future.exception(), None))}")
+            status = WorkFlowResultCode.ERR_WORKFLOW_EXECUTE.code
+        elif future.result() is not None:
+            status = future.result()
+        try:
+            channel.send_event(ShardEvent.FINISHED, shard["shard"], status=status,
+                               cancelled=status is None or CancellationRegistry().get(channel.task_id).cancelled)
+        except Exception as e:
+            LOGGER.error(f"report shard {shard['shard']} of task {channel.task_id} finished failed: {e}")
+        try:
+            channel.ack()
+        except Exception as e:
+            LOGGER.warning(f"ack shard {shard['shard']} of task {channel.task_id} failed: {e}")
+        finally:
+            self._release(channel.task_id)
+            self._slots.release()
+
+    def _release(self, task_id):
+        """本进程内该任务的分片全部结束且任务不由本进程协调时，释放任务在本进程内的资源"""
+        with self._lock:
+            self._running[task_id][1] -= 1
+            if self._running[task_id][1] > 0:
+                return
+            self._running.pop(task_id)
+        if task_id not in TaskPool().running_tasks():
+            CancellationRegistry().remove(task_id)
+            HostStatusRecorder().close(task_id)
@@ -1,12 +1,24 @@
 import copy
+import functools
+import math
+import threading
 import timeit
 import traceback
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from typing import Dict
 
+from zeus.operation_service.app.settings import configuration
 from zeus.operation_service.app.core.framework.Atomic.atomic_integer import AtomicInteger
+from zeus.operation_service.app.core.framework.common.constant import DispatcherEngine, HostStatus
 from zeus.operation_service.app.core.framework.common.result_code import PluginResultCode
 from zeus.operation_service.app.core.framework.process.task_executor import TaskExecutor
+from zeus.operation_service.app.core.framework.shared_dispatch_engine import SharedDispatchEngine
+from zeus.operation_service.app.core.framework.task.task_progress import TaskProgress
+from zeus.operation_service.app.core.framework.tools.cancellation import TaskCancelledException
+from zeus.operation_service.app.core.framework.tools.host_status import HostStatusRecorder
+from zeus.operation_service.app.core.framework.tools.output_group import OutputGroups
+from zeus.operation_service.app.core.framework.tools.ssh import SSH_CONNECTION_POOL
+from zeus.operation_service.app.core.framework.tools.task_result import TaskResult
 from vulcanus.log.log import LOGGER
 
 class TaskDispatcher:
@@ -24,28 +36,74 @@ class TaskDispatcher:
         self._stat = dict()
         self._stat['failed'] = list()
         self._stat['success'] = list()
+        # 相同的输出只保留一份，统计结果中按输出对主机分组
+        self._output_groups = OutputGroups()
         self._results = dict()
+        # 分批执行策略
+        self._window = self._init_window(context.get("parallelism"), context.get("batch_percent"))
+        self._fail_budget = None
+        if context.get("max_fail_percent") is not None:
+            self._fail_budget = int(self._host_num * context["max_fail_percent"] / 100)
+        self._per_host_timeout = context.get("per_host_timeout")
+        self._session_broker = context.get("session_broker")
+        self._checkpoint = context.get("checkpoint")
+        self._cancel_token = context.get("cancel_token")
+        # 执行中的主机开始建链的时间，id(host) -> 开始时间，工作线程写入，主机结束或超时后移除
+        self._host_start_time = dict()
+        # 执行中主机的执行器，id(host) -> TaskExecutor，主机超时后通过执行器关闭其连接
+        self._host_executors = dict()
+        self._host_start_lock = threading.Lock()
+        self._aborted = False
+
+    def _init_window(self, parallelism, batch_percent):
+        """同时在执行的主机数，未配置时所有主机一次性下发，由执行引擎控制并发"""
+        if parallelism:
+            return max(1, parallelism)
+        if batch_percent:
+            return max(1, math.ceil(self._host_num * batch_percent / 100))
+        return max(1, self._host_num)
 
     def run(self):
-        work_pool = ThreadPoolExecutor(max_workers=self._batch_size)
+        # 默认使用进程级共享的分发引擎，线程池引擎作为回退方式在每个work node内独立建池
+        work_pool = None
+        if configuration.task.dispatcher_engine == DispatcherEngine.THREAD:
+            pool_size = self._window if self._window < self._host_num else self._batch_size
+            work_pool = ThreadPoolExecutor(max_workers=pool_size)
         start_time = timeit.default_timer()
-        all_tasks = list()
+        running = dict()
         try:
-            while True:
-                if not self._todo_hosts:
-                    timeout_time = self._timeout - (timeit.default_timer() - start_time)
-                    for task in as_completed(all_tasks, timeout=timeout_time):
-                        self.handle_result(task.result(timeout=timeout_time))
-                    break
-
-                if len(self._todo_hosts) > 0:
+            self._todo_task['task_metadata'] = dict()
+            self._todo_task['task_metadata']['task_id'] = self._task_id
+            self._todo_task['task_metadata']['work_node_name'] = self._work_node_name
+            self._skip_succeeded_hosts()
+            while self._todo_hosts or running:
+                # 滚动下发：有主机完成就补充新的主机，保持窗口内的并发数
+                while self._todo_hosts and len(running) < self._window and not self._stopped():
                     host = self._todo_hosts.pop()
                     # 适配，zeus不支持免密登录
                     host['passwordless'] = False
-                    self._todo_task['task_metadata'] = dict()
-                    self._todo_task['task_metadata']['task_id'] = self._task_id
-                    task_executor = TaskExecutor(host, self._todo_task)
-                    all_tasks.append(work_pool.submit(TaskExecutor.run, task_executor))
+                    self._working_prc_count.increment()
+                    running[self._submit(work_pool, host)] = host
+                if self._stopped() and not running:
+                    break
+
+                timeout_time = self._timeout - (timeit.default_timer() - start_time)
+                if timeout_time <= 0:
+                    raise TimeoutError(f"{self._work_node_name} execute timeout")
+                done, _ = wait(running.keys(), timeout=self._next_wait_timeout(timeout_time, running),
+                               return_when=FIRST_COMPLETED)
+                # 按完成顺序逐个处理主机结果
+                for task in done:
+                    self._pop_start_time(running.pop(task))
+                    self.handle_result(task.result())
+                self._expire_timeout_hosts(running)
+                if self._stopped():
+                    self._cancel_pending(running)
+
+            # 任务取消或失败数超过阈值后，未下发的主机不再执行
+            while self._todo_hosts:
+                self._working_prc_count.increment()
+                self.handle_result(self._skipped_result(self._todo_hosts.pop()))
         except Exception as e:
             LOGGER.error(traceback.print_exc())
             self._results = {
@@ -55,11 +113,173 @@ class TaskDispatcher:
             }
             self._callback(self._results)
         finally:
-            LOGGER.warning(f"{self._task_id} shutdown pool:{id(work_pool)}")
-            work_pool.shutdown(wait=False)
+            self._stop_running(running)
+            if work_pool:
+                LOGGER.warning(f"{self._task_id} shutdown pool:{id(work_pool)}")
+                work_pool.shutdown(wait=False, cancel_futures=True)
         return self._results
 
-    def handle_result(self, exec_result):
+    def _cancelled(self):
+        return self._cancel_token is not None and self._cancel_token.cancelled
+
+    def _stopped(self):
+        return self._aborted or self._cancelled()
+
+    def _skipped_result(self, host):
+        if self._cancelled():
+            return TaskResult(host, self._todo_task, {
+                "error_code": PluginResultCode.CANCELED,
+                "error_msg": "Host skipped: task cancelled"
+            })
+        return TaskResult(host, self._todo_task, {
+            "error_code": PluginResultCode.FAILED,
+            "error_msg": "Host skipped: the failure threshold of the step is exceeded"
+        })
+
+    @staticmethod
+    def _host_status(error_code):
+        if error_code == PluginResultCode.SUCCESS:
+            return HostStatus.SUCCESS
+        if error_code == PluginResultCode.CANCELED:
+            return HostStatus.CANCELED
+        return HostStatus.FAILED
+
+    def _next_wait_timeout(self, timeout_time, running):
+        """等待时间取work node剩余时间和执行中主机最早到期的剩余时间的较小值"""
+        if not self._per_host_timeout:
+            return timeout_time
+        with self._host_start_lock:
+            start_times = [self._host_start_time[id(host)] for host in running.values()
+                           if id(host) in self._host_start_time]
+        if not start_times:
+            return timeout_time
+        earliest = min(start_times)
+        host_remaining = self._per_host_timeout - (timeit.default_timer() - earliest)
+        return max(0, min(timeout_time, host_remaining))
+
+    def _expire_timeout_hosts(self, running):
+        """单主机执行超时的按失败处理，不再等待其结果"""
+        if not self._per_host_timeout:
+            return
+        now = timeit.default_timer()
+        for task, host in list(running.items()):
+            with self._host_start_lock:
+                start = self._host_start_time.get(id(host))
+            if start is None or now - start < self._per_host_timeout:
+                continue
+            running.pop(task)
+            self._abort_host(task, host)
+            self.handle_result(TaskResult(host, self._todo_task, {
+                "error_code": PluginResultCode.FAILED,
+                "error_msg": f"Host execution timeout: {self._per_host_timeout}s"
+            }))
+
+    def _abort_host(self, task, host):
+        """
+        超时主机的工作线程可能阻塞在建链、SFTP传输等不受读超时控制的阶段，
+        先关闭其连接使工作线程尽快结束，再释放窗口，避免挂死的主机不断累积超出并发上限
+        """
+        task.cancel()
+        with self._host_start_lock:
+            self._host_start_time.pop(id(host), None)
+            executor = self._host_executors.pop(id(host), None)
+        if executor is not None:
+            LOGGER.warning(f"{self._work_node_name} {host['ip']} execution timeout, close its connection")
+            executor.abort()
+
+    def _stop_running(self, running):
+        """
+        work node超时或异常结束时仍有主机未结束：取消未开始的主机，关闭执行中主机的连接，
+        避免work node已失败、会话代理已关闭后这些主机仍然建链执行
+        """
+        if not running:
+            return
+        with self._host_start_lock:
+            self._aborted = True
+            executors = list(self._host_executors.values())
+            self._host_executors.clear()
+        for task in running:
+            task.cancel()
+        for executor in executors:
+            executor.abort()
+        LOGGER.warning(f"{self._work_node_name} stop {len(running)} unfinished hosts")
+
+    def _cancel_pending(self, running):
+        """任务取消或失败数超过阈值后，取消已提交但还未开始执行的主机，按跳过处理"""
+        for task, host in list(running.items()):
+            if task.cancel():
+                running.pop(task)
+                self.handle_result(self._skipped_result(host))
+
+    def _pop_start_time(self, host):
+        with self._host_start_lock:
+            self._host_start_time.pop(id(host), None)
+
+    def _submit(self, work_pool, host):
+        if work_pool is None:
+            return SharedDispatchEngine().submit(functools.partial(self._execute, host), host.get("cluster_id"))
+        return work_pool.submit(self._execute, host)
+
+    def _execute(self, host):
+        """在工作线程中建链并执行插件，建链失败只影响当前主机"""
+        # 已提交到执行引擎排队的主机，在任务取消或失败数超过阈值后不再建链
+        if self._stopped():
+            return self._skipped_result(host)
+        # 创建任务时未查询到主机信息，不建链直接失败
+        if host.get("error"):
+            return TaskResult(host, self._todo_task, {
+                "error_code": PluginResultCode.FAILED,
+                "error_msg": host["error"]
+            })
+        executor = TaskExecutor(host, self._todo_task, self._per_host_timeout, self._session_broker,
+                                self._cancel_token)
+        with self._host_start_lock:
+            # work node已异常结束时不再执行
+            if self._aborted:
+                return self._skipped_result(host)
+            self._host_start_time[id(host)] = timeit.default_timer()
+            self._host_executors[id(host)] = executor
+        HostStatusRecorder().record(self._task_id, self._work_node_name, host, HostStatus.RUNNING)
+        try:
+            return executor.run()
+        except TaskCancelledException:
+            return TaskResult(host, self._todo_task, {
+                "error_code": PluginResultCode.CANCELED,
+                "error_msg": "Host execution interrupted: task cancelled"
+            })
+        except Exception as e:
+            LOGGER.error(f"{self._work_node_name} execute on {host['ip']} failed: {e}")
+            return TaskResult(host, self._todo_task, {
+                "error_code": PluginResultCode.FAILED,
+                "error_msg": f"Host execution failed: {e}"
+            })
+        finally:
+            with self._host_start_lock:
+                self._host_executors.pop(id(host), None)
+
+    def _skip_succeeded_hosts(self):
+        """任务恢复或重试时，上次已执行成功的主机不再执行"""
+        if self._checkpoint is None:
+            return
+        todo_hosts = list()
+        succeeded_hosts = list()
+        for host in self._todo_hosts:
+            if self._checkpoint.succeeded(self._work_node_name, host.get("hostname")):
+                succeeded_hosts.append(host)
+            else:
+                todo_hosts.append(host)
+        if not succeeded_hosts:
+            return
+        LOGGER.warning(f"{self._work_node_name} skip {len(succeeded_hosts)} hosts succeeded last time")
+        self._todo_hosts = todo_hosts
+        for host in succeeded_hosts:
+            self._working_prc_count.increment()
+            self.handle_result(TaskResult(host, self._todo_task, {
+                "error_code": PluginResultCode.SUCCESS,
+                "error_msg": "Host skipped: succeeded last time"
+            }), record=False)
+
+    def handle_result(self, exec_result, record=True):
         self._working_prc_count.decrease()
         LOGGER.info("========================")
         LOGGER.info(f"work_node: {self._work_node_name}")
@@ -67,13 +287,20 @@ class TaskDispatcher:
         LOGGER.info(exec_result.result)
         LOGGER.info("========================")
         self._finished_count += 1
+        TaskProgress().advance(self._task_id)
+        HostStatusRecorder().record(self._task_id, self._work_node_name, exec_result.host,
+                                    self._host_status(exec_result.result['error_code']))
 
         # 统计结果
+        msg = self._output_groups.add(exec_result.host['ip'], exec_result.result['error_code'],
+                                      exec_result.result['error_msg'])
         if exec_result.result['error_code'] == PluginResultCode.SUCCESS:
+            if record and self._checkpoint is not None:
+                self._checkpoint.record(self._work_node_name, exec_result.host.get("hostname"))
             self._stat['success'].append(
                 {
                     'host': exec_result.host['ip'],
-                    'msg': exec_result.result['error_msg'],
+                    'msg': msg,
                     'code': exec_result.result['error_code']
                 }
             )
@@ -81,10 +308,15 @@ class TaskDispatcher:
             self._stat['failed'].append(
                 {
                     'host': exec_result.host['ip'],
-                    'msg': exec_result.result['error_msg'],
+                    'msg': msg,
                     'code': exec_result.result['error_code']
                 }
             )
+            if self._fail_budget is not None and len(self._stat['failed']) > self._fail_budget \
+                    and not self._aborted:
+                self._aborted = True
+                LOGGER.warning(f"{self._work_node_name} failed hosts exceed {self._fail_budget}, "
+                               f"stop dispatching remaining {len(self._todo_hosts)} hosts")
         if self._finished_count == self._host_num:
             self._results = self._statistic_execution_result()
             self._callback(self._results)
@@ -96,6 +328,8 @@ class TaskDispatcher:
         result['errors_info'] = dict()
         if self._host_num == len(self._stat['success']):
             result['result_code'] = PluginResultCode.SUCCESS
+        elif self._cancelled():
+            result['result_code'] = PluginResultCode.CANCELED
         elif len(self._stat['success']) > 0:
             result['result_code'] = PluginResultCode.PARTIAL_PASSED
         else:
@@ -105,5 +339,9 @@ class TaskDispatcher:
             result['errors_info'][item['host']] = item['msg']
         for item in self._stat['success']:
             result['errors_info'][item['host']] = item['msg']
+        result['output_groups'] = self._output_groups.groups()
+        LOGGER.info(f"{self._work_node_name} {self._host_num} hosts, "
+                    f"{len(result['output_groups'])} distinct outputs")
 
+        LOGGER.info(f"{self._work_node_name} ssh connection pool: {SSH_CONNECTION_POOL.statistics()}")
         return result
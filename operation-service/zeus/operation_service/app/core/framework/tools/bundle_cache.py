@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+功 能：脚本目录打包缓存模块
+"""
+import glob
+import hashlib
+import os
+import tarfile
+import threading
+import time
+from collections import namedtuple
+
+from zeus.operation_service.app.constant import BASE_DIR, SingletonMeta
+from zeus.operation_service.app.core.framework.common.constant import BundleCompression
+from zeus.operation_service.app.core.file_util import U_RW
+from zeus.operation_service.app.core.framework.tools.common_tools import HASH_CHUNK_SIZE, sha256sum
+from zeus.operation_service.app.core.framework.tools.transfer_cache import LocalDigestManifest
+from zeus.operation_service.app.settings import configuration
+from vulcanus.log.log import LOGGER
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BUNDLES_DIR = os.path.join(BASE_DIR, "bundles")
+# 压缩包摘要文件后缀，与压缩包放在同一目录，生成压缩包时写入
+DIGEST_SUFFIX = ".sha256"
+
+# path: 压缩包本地路径; sha256: 压缩包摘要; compression: 压缩格式; files: {相对路径: sha256}
+Bundle = namedtuple("Bundle", ["path", "sha256", "compression", "files"])
+
+
+class BundleCache(metaclass=SingletonMeta):
+    """
+    将脚本目录打包为压缩包并按目录内容摘要缓存，目录内容不变时所有主机、所有任务复用同一个压缩包。
+    get取得的压缩包在release前计为使用中；脚本内容变化生成新压缩包后，旧压缩包在本进程不再使用、
+    且超过任务超时时间未被任何进程使用时才删除，不影响仍在上传旧压缩包的任务。
+    压缩包的摘要在生成时写入同目录的<压缩包>.sha256，每次使用都会修改压缩包的修改时间，不能按修改时间缓存摘要
+    """
+
+    def __init__(self, bundles_dir=BUNDLES_DIR):
+        self._bundles_dir = bundles_dir
+        self._lock = threading.Lock()
+        self._building = dict()
+        # 本地已损坏、下次使用时需要重新生成的压缩包
+        self._invalid = set()
+        # 本进程内正在使用的压缩包，路径 -> 使用数
+        self._in_use = dict()
+
+    @staticmethod
+    def compression():
+        if configuration.task.bundle_compression == BundleCompression.ZSTD and zstandard is not None:
+            return BundleCompression.ZSTD
+        return BundleCompression.GZIP
+
+    def get(self, src_dir):
+        files = self._list_files(src_dir)
+        compression = self.compression()
+        content_digest = hashlib.sha256()
+        for relative_path, digest in files.items():
+            content_digest.update(f"{digest}  {relative_path}\n".encode("utf-8"))
+        name = os.path.basename(os.path.normpath(src_dir))
+        suffix = "tar.zst" if compression == BundleCompression.ZSTD else "tar.gz"
+        bundle_path = os.path.join(self._bundles_dir, f"{name}-{content_digest.hexdigest()[:16]}.{suffix}")
+
+        # 同一个压缩包只由一个线程生成，其他线程等待
+        with self._lock:
+            lock = self._building.setdefault(bundle_path, threading.Lock())
+        with lock:
+            rebuilt = bundle_path in self._invalid or not self._touch(bundle_path)
+            if rebuilt:
+                self._build(src_dir, files, bundle_path, compression)
+                self._invalid.discard(bundle_path)
+            bundle_digest = self._read_digest(bundle_path)
+            with self._lock:
+                self._in_use[bundle_path] = self._in_use.get(bundle_path, 0) + 1
+        if rebuilt:
+            self._remove_stale(name, bundle_path)
+        return Bundle(bundle_path, bundle_digest, compression, files)
+
+    @staticmethod
+    def _touch(bundle_path):
+        """修改时间记录最近一次使用，其他进程据此判断旧压缩包是否仍可能在使用，压缩包不存在时返回False"""
+        try:
+            os.utime(bundle_path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    @staticmethod
+    def _read_digest(bundle_path):
+        """读取生成压缩包时写入的摘要，摘要文件不存在或内容无效时重新计算并写入"""
+        try:
+            with open(bundle_path + DIGEST_SUFFIX, "r", encoding="utf-8") as f:
+                digest = f.read().strip()
+            if len(digest) == 64:
+                return digest
+        except FileNotFoundError:
+            pass
+        digest = sha256sum(bundle_path)
+        BundleCache._write_digest(bundle_path, digest)
+        return digest
+
+    @staticmethod
+    def _write_digest(bundle_path, digest):
+        tmp_path = f"{bundle_path}{DIGEST_SUFFIX}.{threading.get_ident()}.tmp"
+        file_fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, U_RW)
+        with os.fdopen(file_fd, "w", encoding="utf-8") as f:
+            f.write(digest)
+        os.replace(tmp_path, bundle_path + DIGEST_SUFFIX)
+
+    def release(self, bundle):
+        """压缩包上传和解压结束后调用，与get成对使用"""
+        with self._lock:
+            count = self._in_use.get(bundle.path, 0) - 1
+            if count > 0:
+                self._in_use[bundle.path] = count
+            else:
+                self._in_use.pop(bundle.path, None)
+
+    def invalidate(self, bundle):
+        """
+        压缩包解压失败时在本地解压校验其中每个文件的摘要，与目录内容一致说明失败原因在远端，不处理；
+        不一致时标记失效，下次使用时重新生成并原子替换，不删除其他主机可能正在上传的文件
+        """
+        with self._lock:
+            lock = self._building.setdefault(bundle.path, threading.Lock())
+        with lock:
+            if bundle.path in self._invalid or self._verify(bundle):
+                return
+            LOGGER.warning(f"[Bundle]: {bundle.path} is corrupted, rebuild it on next use")
+            self._invalid.add(bundle.path)
+
+    @staticmethod
+    def _verify(bundle):
+        """本地压缩包可以完整解压且文件摘要与生成时一致"""
+        digests = dict()
+        try:
+            with open(bundle.path, "rb") as raw_file:
+                if bundle.compression == BundleCompression.ZSTD:
+                    tar = tarfile.open(fileobj=zstandard.ZstdDecompressor().stream_reader(raw_file), mode="r|")
+                else:
+                    tar = tarfile.open(fileobj=raw_file, mode="r|gz")
+                with tar:
+                    for tar_info in tar:
+                        digest = hashlib.sha256()
+                        member = tar.extractfile(tar_info)
+                        for chunk in iter(lambda: member.read(HASH_CHUNK_SIZE), b""):
+                            digest.update(chunk)
+                        digests[tar_info.name] = digest.hexdigest()
+        except Exception as e:
+            LOGGER.warning(f"[Bundle]: verify {bundle.path} failed: {e}")
+            return False
+        return digests == bundle.files
+
+    @staticmethod
+    def _list_files(src_dir):
+        manifest = LocalDigestManifest()
+        files = dict()
+        for root, _, names in os.walk(src_dir):
+            for file_name in names:
+                path = os.path.join(root, file_name)
+                files[os.path.relpath(path, src_dir).replace("\\", "/")] = manifest.digest(path)
+        manifest.save()
+        return dict(sorted(files.items()))
+
+    def _build(self, src_dir, files, bundle_path, compression):
+        os.makedirs(self._bundles_dir, exist_ok=True)
+        tmp_path = f"{bundle_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as raw_file:
+            if compression == BundleCompression.ZSTD:
+                with zstandard.ZstdCompressor().stream_writer(raw_file, closefd=False) as writer:
+                    self._write_tar(src_dir, files, tarfile.open(fileobj=writer, mode="w|"))
+            else:
+                self._write_tar(src_dir, files, tarfile.open(fileobj=raw_file, mode="w:gz"))
+        digest = sha256sum(tmp_path)
+        os.replace(tmp_path, bundle_path)
+        self._write_digest(bundle_path, digest)
+        LOGGER.info(f"[Bundle]: build {bundle_path}, {len(files)} files, {os.path.getsize(bundle_path)} bytes")
+
+    @staticmethod
+    def _write_tar(src_dir, files, tar):
+        with tar:
+            for relative_path in files:
+                tar_info = tar.gettarinfo(os.path.join(src_dir, relative_path), arcname=relative_path)
+                tar_info.uid = tar_info.gid = 0
+                tar_info.uname = tar_info.gname = ""
+                with open(os.path.join(src_dir, relative_path), "rb") as f:
+                    tar.addfile(tar_info, f)
+
+    def _remove_stale(self, name, bundle_path):
+        """脚本内容变化后，同一目录的旧压缩包不再使用，本进程无人使用且超过任务超时时间未被使用的删除"""
+        pattern = f"{glob.escape(name)}-{'[0-9a-f]' * 16}.tar.*"
+        expire_time = time.time() - configuration.task.task_timeout
+        for stale_path in glob.glob(os.path.join(os.path.dirname(bundle_path), pattern)):
+            if stale_path == bundle_path or stale_path.endswith((".tmp", DIGEST_SUFFIX)):
+                continue
+            with self._lock:
+                if stale_path in self._in_use:
+                    continue
+            try:
+                if os.path.getmtime(stale_path) < expire_time:
+                    os.remove(stale_path)
+                    os.remove(stale_path + DIGEST_SUFFIX)
+            except FileNotFoundError:
+                continue
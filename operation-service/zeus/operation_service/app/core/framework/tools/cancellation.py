@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+功 能：任务取消模块
+"""
+import os
+import threading
+
+from zeus.operation_service.app.constant import SingletonMeta
+from vulcanus.log.log import LOGGER
+
+
+class TaskCancelledException(Exception):
+    """任务已被取消，正在执行的等待被中断"""
+
+
+class CancellationToken:
+    """
+    任务取消令牌，由BaseTask经WorkFlow、WorkNode、TaskDispatcher传递到TaskExecutor和SSH通道。
+    令牌内部持有一个管道，取消时向管道写入数据使其可读：SSH通道等待输出时把令牌和通道一起select，
+    取消后等待立即返回，不需要轮询，也不必等到命令超时。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._read_fd, self._write_fd = os.pipe()
+        self._closed = False
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            if not self._closed:
+                os.write(self._write_fd, b"c")
+
+    def check(self):
+        if self.cancelled:
+            raise TaskCancelledException("task cancelled")
+
+    def fileno(self):
+        """供select使用，取消后可读"""
+        return self._read_fd
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        """任务结束时关闭管道，关闭后仍可查询是否已取消，但不能再用于select"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            os.close(self._read_fd)
+            os.close(self._write_fd)
+
+    def __del__(self):
+        self.close()
+
+
+class CancellationRegistry(metaclass=SingletonMeta):
+    """
+    进程内正在执行的任务的取消令牌，task_id -> CancellationToken。
+    任务池取出任务前登记，任务准备期间到达的取消请求同样生效；同一任务的所有子任务共用一个令牌，任务结束时移除。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens = dict()
+
+    def create(self, task_id):
+        """任务开始执行前登记新的令牌，替换上次执行留下的令牌"""
+        with self._lock:
+            token = self._tokens[task_id] = CancellationToken()
+            return token
+
+    def get(self, task_id):
+        with self._lock:
+            token = self._tokens.get(task_id)
+            if token is None:
+                token = self._tokens[task_id] = CancellationToken()
+            return token
+
+    def cancel(self, task_id):
+        """取消本进程内正在执行的任务，任务不在本进程执行时返回False"""
+        with self._lock:
+            token = self._tokens.get(task_id)
+        if token is None:
+            return False
+        LOGGER.warning(f"task {task_id} cancelled, interrupt running work nodes")
+        token.cancel()
+        return True
+
+    def remove(self, task_id):
+        """任务结束时移除令牌并立即关闭其管道，不依赖垃圾回收释放文件描述符"""
+        with self._lock:
+            token = self._tokens.pop(task_id, None)
+        if token is not None:
+            token.close()
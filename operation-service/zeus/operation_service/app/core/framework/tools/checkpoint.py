@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+功 能：workflow执行检查点模块
+"""
+import fcntl
+import json
+import os
+import threading
+
+from zeus.operation_service.app.constant import RESULTS_DIR
+from zeus.operation_service.app.core.file_util import U_RW
+from vulcanus.log.log import LOGGER
+
+# 分片执行时任务可能由其他节点的进程重试，检查点与结果存储一样放在各节点共享的RESULTS_DIR下
+CHECKPOINTS_DIR = os.path.join(RESULTS_DIR, "checkpoints")
+
+
+class WorkflowCheckpoint:
+    """
+    workflow执行检查点：每个(work node, 主机)执行成功后追加一行记录到 CHECKPOINTS_DIR/<task_id>.jsonl，
+    同一任务的多个workflow写同一个文件，以子任务序号区分，任务重命名后检查点仍然有效。
+    任务恢复或重试时跳过已成功的(work node, 主机)，只重新执行失败和未执行的部分
+    """
+
+    def __init__(self, task_id, case_index):
+        self._case_index = case_index
+        self._checkpoint_file = self.checkpoint_file(task_id)
+        self._lock = threading.Lock()
+        self._succeeded = self._load()
+        self._file_fd = None
+
+    @staticmethod
+    def checkpoint_file(task_id):
+        return os.path.join(CHECKPOINTS_DIR, f"{task_id}.jsonl")
+
+    @staticmethod
+    def exists(task_id):
+        return os.path.exists(WorkflowCheckpoint.checkpoint_file(task_id))
+
+    @staticmethod
+    def clear(task_id):
+        """重新开始执行任务前清除检查点"""
+        checkpoint_file = WorkflowCheckpoint.checkpoint_file(task_id)
+        if os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
+
+    def succeeded(self, work_node_name, hostname):
+        return (work_node_name, hostname) in self._succeeded
+
+    def succeeded_count(self):
+        return len(self._succeeded)
+
+    def record(self, work_node_name, hostname):
+        line = json.dumps({"case": self._case_index, "node": work_node_name, "host": hostname}) + "\n"
+        with self._lock:
+            if (work_node_name, hostname) in self._succeeded:
+                return
+            self._succeeded.add((work_node_name, hostname))
+            try:
+                if self._file_fd is None:
+                    os.makedirs(CHECKPOINTS_DIR, exist_ok=True)
+                    self._file_fd = os.open(self._checkpoint_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, U_RW)
+                # 单次write追加整行，共享目录上O_APPEND不保证原子，其他节点的进程同时追加时加锁
+                fcntl.flock(self._file_fd, fcntl.LOCK_EX)
+                try:
+                    os.write(self._file_fd, line.encode("utf-8"))
+                finally:
+                    fcntl.flock(self._file_fd, fcntl.LOCK_UN)
+            except OSError as e:
+                LOGGER.warning(f"save checkpoint failed: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._file_fd is not None:
+                os.close(self._file_fd)
+                self._file_fd = None
+
+    def _load(self):
+        succeeded = set()
+        if not os.path.exists(self._checkpoint_file):
+            return succeeded
+        with open(self._checkpoint_file, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 进程异常退出时最后一行可能不完整
+                    continue
+                if record.get("case") == self._case_index:
+                    succeeded.add((record["node"], record["host"]))
+        return succeeded
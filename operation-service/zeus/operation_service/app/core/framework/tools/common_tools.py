@@ -1,6 +1,10 @@
 import hashlib
 import os.path
 import re
+import shlex
+
+# 计算摘要时每次读取的字节数
+HASH_CHUNK_SIZE = 1024 * 1024
 
 
 class NotFileException(Exception):
@@ -11,9 +15,11 @@ class NotFileException(Exception):
 def sha256sum(path):
     if not os.path.isfile(path):
         raise NotFileException()
+    digest = hashlib.sha256()
     with open(path, "rb") as f:
-        sha256res = hashlib.sha256(f.read()).hexdigest()
-    return sha256res
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
 
 def remove_color_and_format(string):
@@ -23,10 +29,25 @@ def remove_color_and_format(string):
     return re.compile(r'(\x9B|\x1B\[)[0-?]*[ -/]*[@-~]').sub('', string).replace('\b', '').replace('\r', '')
 
 
+def remote_sha256sum(ssh_con, remote_paths):
+    """
+    一次命令批量获取远端文件的sha256，不存在或无法读取的文件不在返回结果中
+    :return: {远端路径: sha256}
+    """
+    if not remote_paths:
+        return dict()
+    cmd = "sha256sum " + " ".join(shlex.quote(path) for path in remote_paths) + " 2>/dev/null"
+    _, stdout, _ = ssh_con.exec_command(cmd)
+    digests = dict()
+    for line in stdout.splitlines():
+        digest, _, path = line.partition("  ")
+        if path:
+            # 路径中含有特殊字符时，sha256sum会在摘要前加反斜杠
+            digests[path] = digest.lstrip("\\")
+    return digests
+
+
 def compare_remote_and_local_file(ssh_con, remote_path, local_path):
-    cmd = "sha256sum {}".format(remote_path)
-    echo = ssh_con.cmd(cmd)
-    echo = remove_color_and_format(echo)
-    remote_file_sha256sum = echo.split(" ")[0]
+    remote_file_sha256sum = remote_sha256sum(ssh_con, [remote_path]).get(remote_path)
     local_file_sha256sum = sha256sum(local_path)
     return remote_file_sha256sum == local_file_sha256sum
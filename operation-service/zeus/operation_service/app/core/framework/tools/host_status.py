@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+功 能：主机执行状态记录模块
+"""
+import fcntl
+import json
+import os
+import threading
+from datetime import datetime
+
+from zeus.operation_service.app.constant import RESULTS_DIR, SingletonMeta
+from zeus.operation_service.app.core.file_util import U_RW
+from vulcanus.log.log import LOGGER
+
+# 分片执行时同一任务的主机分布在多个节点的进程上，状态记录与检查点一样放在各节点共享的RESULTS_DIR下
+HOST_STATUS_DIR = os.path.join(RESULTS_DIR, "host_status")
+
+
+class HostStatusRecorder(metaclass=SingletonMeta):
+    """
+    主机执行状态记录：主机在work node上开始执行和执行结束时追加一行记录到 HOST_STATUS_DIR/<task_id>.jsonl，
+    任务结果流接口按偏移量读取该文件，向客户端推送主机状态变化，服务重启或客户端重连后可以从任意位置继续读取
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._file_fds = dict()
+
+    @staticmethod
+    def status_file(task_id):
+        return os.path.join(HOST_STATUS_DIR, f"{task_id}.jsonl")
+
+    @staticmethod
+    def clear(task_id):
+        """重新开始执行任务前清除状态记录"""
+        status_file = HostStatusRecorder.status_file(task_id)
+        if os.path.exists(status_file):
+            os.remove(status_file)
+
+    def record(self, task_id, work_node_name, host, status):
+        if task_id is None:
+            return
+        line = json.dumps({
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "node": work_node_name,
+            "host": host.get("hostname"),
+            "ip": host["ip"],
+            "status": status
+        }) + "\n"
+        with self._lock:
+            try:
+                file_fd = self._file_fds.get(task_id)
+                if file_fd is None:
+                    os.makedirs(HOST_STATUS_DIR, exist_ok=True)
+                    file_fd = os.open(self.status_file(task_id), os.O_WRONLY | os.O_CREAT | os.O_APPEND, U_RW)
+                    self._file_fds[task_id] = file_fd
+                # 单次write追加整行，共享目录上O_APPEND不保证原子，其他节点的进程同时追加时加锁
+                fcntl.flock(file_fd, fcntl.LOCK_EX)
+                try:
+                    os.write(file_fd, line.encode("utf-8"))
+                finally:
+                    fcntl.flock(file_fd, fcntl.LOCK_UN)
+            except OSError as e:
+                LOGGER.warning(f"save host status failed: {e}")
+
+    def close(self, task_id):
+        with self._lock:
+            file_fd = self._file_fds.pop(task_id, None)
+            if file_fd is not None:
+                os.close(file_fd)
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+功 能：主机输出分组模块
+"""
+import hashlib
+import threading
+
+
+class OutputDigest:
+    """
+    归一化输出的摘要：忽略空行和行尾空白（包括伪终端输出的\r），
+    只有这些差异的输出摘要相同。输出可以分段写入，按完整的行计算
+    """
+
+    def __init__(self):
+        self._digest = hashlib.sha256()
+        self._pending = ""
+
+    def update(self, text):
+        lines = (self._pending + text).split("\n")
+        self._pending = lines.pop()
+        for line in lines:
+            self._update_line(line)
+
+    def hexdigest(self):
+        if self._pending:
+            self._update_line(self._pending)
+            self._pending = ""
+        return self._digest.hexdigest()
+
+    def _update_line(self, line):
+        line = line.rstrip()
+        if line:
+            self._digest.update(line.encode("utf-8") + b"\n")
+
+    @staticmethod
+    def of(text):
+        digest = OutputDigest()
+        digest.update(text)
+        return digest.hexdigest()
+
+
+class OutputGroups:
+    """
+    按(结果码, 退出码, 归一化输出)对一个work node的主机执行结果分组，
+    相同的输出只保留第一台主机的结果，其余主机引用同一个对象
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._groups = dict()
+
+    def add(self, host, code, msg):
+        """登记主机的执行结果，返回分组内共用的结果"""
+        key = self._key(code, msg)
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = {
+                    "code": code.code if hasattr(code, "code") else code,
+                    "exitcode": msg.get("exitcode") if isinstance(msg, dict) else None,
+                    "digest": key[2],
+                    "output": msg,
+                    "hosts": list()
+                }
+            group["hosts"].append(host)
+            return group["output"]
+
+    def groups(self):
+        """分组结果，主机数多的分组在前"""
+        with self._lock:
+            groups = [dict(group, hosts=list(group["hosts"]), count=len(group["hosts"]))
+                      for group in self._groups.values()]
+        return sorted(groups, key=lambda group: group["count"], reverse=True)
+
+    @staticmethod
+    def _key(code, msg):
+        if isinstance(msg, dict):
+            return code, msg.get("exitcode"), OutputDigest.of(str(msg.get("echo", "")))
+        return code, None, OutputDigest.of(str(msg))
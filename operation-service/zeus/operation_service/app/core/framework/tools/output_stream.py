@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+功 能：命令输出流式处理模块
+"""
+import codecs
+import os
+import re
+
+from zeus.operation_service.app.core.file_util import U_RW, G_READ, O_READ
+
+COLOR_PATTERN = re.compile(r'\x1b(\[.*?[@-~]|\].*?(\x07|\x1b\\))')
+# 单行输出超过该长度时不再等待换行符，直接处理已缓存的数据
+MAX_PENDING_LINE = 64 * 1024
+# exec方式下标准输出和标准错误分别解码和按行缓存
+STDOUT = "stdout"
+STDERR = "stderr"
+
+
+class LineBuffer:
+    """一路输出的增量解码器和未完成的行"""
+
+    def __init__(self):
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.pending = ""
+
+
+class OutputStream:
+    """
+    命令输出的流式接收端：数据到达即去除颜色控制字符并追加写入结果文件，
+    内存中只保留开头和结尾各一段固定长度的输出供接口返回，避免大输出占满工作进程内存。
+    颜色控制字符按行处理，不完整的行先缓存，等待后续数据到达后再处理。
+    exec方式下标准输出和标准错误各自解码和按行缓存，两路输出以整行交替写入，不会截断多字节字符。
+    伪终端模式下输出的第一行是命令回显，结尾是提示符，二者都不写入；最后一行没有换行符时，提示符之前的部分照常写入。
+    record为结果存储的写入端，写入结果文件的内容同时写入结果存储，结果文件创建前先记录其在结果存储中的起始偏移。
+    """
+
+    def __init__(self, file_path=None, header="", head_size=64 * 1024, tail_size=64 * 1024, pty=False,
+                 record=None, prompt=None):
+        self._file = None
+        self._record = record
+        if record:
+            record.write(header, header=True)
+        if file_path:
+            if record and not os.path.exists(file_path):
+                record.start_spool(file_path)
+            file_fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, U_RW | G_READ | O_READ)
+            self._file = os.fdopen(file_fd, 'a', encoding="utf-8")
+            self._file.write(header)
+            self._file.flush()
+        self._buffers = {STDOUT: LineBuffer()}
+        self._head_size = head_size
+        self._tail_size = tail_size
+        self._head = ""
+        self._tail = ""
+        self._pty = pty
+        self._prompt = prompt
+        self._skip_echo_line = pty
+        self.total_size = 0
+        self._closed = False
+
+    def write(self, data, stream=STDOUT):
+        """接收一段原始输出，data可以是bytes或str，stream指定数据来自标准输出还是标准错误"""
+        buffer = self._buffers.get(stream)
+        if buffer is None:
+            buffer = self._buffers[stream] = LineBuffer()
+        if isinstance(data, bytes):
+            data = buffer.decoder.decode(data)
+        buffer.pending += data
+        if self._skip_echo_line and stream == STDOUT:
+            index = buffer.pending.find("\n")
+            if index == -1:
+                return
+            buffer.pending = buffer.pending[index + 1:]
+            self._skip_echo_line = False
+
+        index = buffer.pending.rfind("\n")
+        if index != -1:
+            lines, buffer.pending = buffer.pending[:index + 1], buffer.pending[index + 1:]
+            self._emit(lines)
+        if len(buffer.pending) > MAX_PENDING_LINE:
+            # 超长行在最后一个控制字符处截断，控制字符留待下次处理
+            index = buffer.pending.rfind("\x1b")
+            if index <= 0:
+                index = len(buffer.pending)
+            lines, buffer.pending = buffer.pending[:index], buffer.pending[index:]
+            self._emit(lines)
+
+    def close(self):
+        """结束输出：各路输出剩余的不完整行全部写出，伪终端模式去掉结尾的提示符"""
+        if self._closed:
+            return
+        self._closed = True
+        remainders = list()
+        for stream, buffer in self._buffers.items():
+            buffer.pending += buffer.decoder.decode(b"", final=True)
+            if stream == STDOUT and self._pty:
+                remainders.append(self._strip_prompt(buffer.pending))
+            else:
+                remainders.append(buffer.pending)
+            buffer.pending = ""
+        # 不同输出的剩余部分各占一行，不拼接到同一行中
+        self._emit("\n".join(remainder for remainder in remainders if remainder))
+        if self._file:
+            self._file.write("\n")
+            self._file.close()
+            self._file = None
+        if self._record:
+            self._record.write("\n")
+
+    def _strip_prompt(self, text):
+        """伪终端输出的最后一行以提示符结尾，未指定提示符时无法区分，整行丢弃"""
+        if self._skip_echo_line or not self._prompt:
+            return ""
+        index = text.rfind(self._prompt)
+        return text[:index] if index != -1 else text
+
+    def getvalue(self):
+        """返回内存中保留的输出，超出保留长度时中间部分以省略标记代替"""
+        value = self._head
+        omitted = self.total_size - len(self._head) - len(self._tail)
+        if omitted > 0:
+            value += f"\n...[{omitted} characters omitted]...\n"
+        value += self._tail
+        return value.strip("\r")
+
+    def _emit(self, text):
+        if not text:
+            return
+        text = COLOR_PATTERN.sub('', text)
+        if self._pty:
+            text = text.replace("\r\n", "\n")
+        if self._file:
+            self._file.write(text)
+            # 每段输出立即写入文件，任务结果流接口可以读取到执行中的输出
+            self._file.flush()
+        if self._record:
+            self._record.write(text)
+        self.total_size += len(text)
+        if len(self._head) < self._head_size:
+            free = self._head_size - len(self._head)
+            self._head += text[:free]
+            text = text[free:]
+        if not text:
+            return
+        self._tail += text
+        if len(self._tail) > self._tail_size:
+            self._tail = self._tail[-self._tail_size:]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+"""
+功 能：任务结果存储模块
+"""
+import fcntl
+import glob
+import hashlib
+import json
+import os
+import threading
+import zlib
+from collections import Counter, defaultdict
+
+from zeus.operation_service.app.constant import SingletonMeta
+from zeus.operation_service.app.core.file_util import U_RW, G_READ, O_READ
+from zeus.operation_service.app.core.framework.common.constant import ResultCompression
+from zeus.operation_service.app.core.framework.tools.output_group import OutputDigest
+from zeus.operation_service.app.settings import configuration
+from vulcanus.log.log import LOGGER
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SEGMENT_FILE = "results.seg"
+INDEX_FILE = "results.idx"
+# 分片执行时每个进程写入各自的results.<name>.seg、results.<name>.idx，读取时合并所有索引
+INDEX_FILE_PATTERN = "results*.idx"
+# 输出按块独立压缩，读取任意位置时只需解压所在的块
+BLOCK_SIZE = 1024 * 1024
+# 执行过程中每台主机的输出先写入该文件供实时查看，任务结束后由结果存储代替
+SPOOL_FILE_PATTERN = "result_*.log"
+# 主机日志文件在结果存储中的起始偏移，重试时日志文件从头写入，而结果存储中已有之前执行的输出
+SPOOL_BASE_SUFFIX = ".base"
+
+
+def _compression():
+    compression = configuration.task.result_store_compression
+    if compression == ResultCompression.ZSTD and zstandard is None:
+        # 未安装zstandard时使用标准库zlib压缩
+        return ResultCompression.ZLIB
+    return compression
+
+
+def _compress(codec, data):
+    if codec == ResultCompression.ZSTD:
+        return zstandard.ZstdCompressor().compress(data)
+    if codec == ResultCompression.ZLIB:
+        return zlib.compress(data)
+    return data
+
+
+def _decompress(codec, data):
+    if codec == ResultCompression.ZSTD:
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == ResultCompression.ZLIB:
+        return zlib.decompress(data)
+    return data
+
+
+class ResultRecord:
+    """
+    一条命令输出的写入端，输出累积到BLOCK_SIZE时压缩写入段文件，关闭时写入索引。
+    输出不超过BLOCK_SIZE时在关闭时才写入，与已保存的输出相同则直接引用其数据块，相同输出只保存一份
+    """
+
+    def __init__(self, store, host, work_node_name):
+        self._store = store
+        self._host = host
+        self._work_node_name = work_node_name
+        self._header = ""
+        self._buffer = bytearray()
+        self._blocks = list()
+        self._digest = hashlib.sha256()
+        self._normalized_digest = OutputDigest()
+        self._size = 0
+
+    def start_spool(self, spool_file):
+        """本次执行第一次写入主机日志文件前调用，记录日志文件在主机日志中的起始偏移"""
+        self._store.start_spool(self._host["ip"], spool_file)
+
+    def write(self, text, header=False):
+        """写入一段输出，header为命令行及执行时间，保存在索引中，不计入输出摘要"""
+        if header:
+            self._header += text
+            return
+        data = text.encode("utf-8")
+        self._digest.update(data)
+        self._normalized_digest.update(text)
+        self._size += len(data)
+        self._buffer.extend(data)
+        while len(self._buffer) >= BLOCK_SIZE:
+            self._blocks.append(self._store.write_block(bytes(self._buffer[:BLOCK_SIZE])))
+            del self._buffer[:BLOCK_SIZE]
+
+    def close(self, exit_code):
+        raw_digest = self._digest.hexdigest()
+        blocks = None if self._blocks else self._store.find_blocks(raw_digest)
+        if blocks is None:
+            if self._buffer:
+                self._blocks.append(self._store.write_block(bytes(self._buffer)))
+            blocks = self._blocks
+        self._buffer = bytearray()
+        header = self._header.encode("utf-8")
+        self._store.write_index({
+            "segment": self._store.segment_name,
+            "host": self._host.get("hostname"),
+            "ip": self._host["ip"],
+            "node": self._work_node_name,
+            "exit_code": exit_code,
+            "header": self._header,
+            "digest": self._normalized_digest.hexdigest(),
+            "raw_digest": raw_digest,
+            "size": len(header) + self._size,
+            "blocks": blocks
+        })
+
+
+class ResultStore:
+    """
+    任务结果存储：一个任务所有主机、所有step的命令输出追加写入同一个段文件，不再每台主机一个日志文件。
+    段文件：命令输出按BLOCK_SIZE分块，每块按task.result_store_compression独立压缩后追加写入；
+    索引文件：每条命令一行json记录，包含主机、step、退出码、命令行、输出摘要、长度及各块在段文件中的位置
+    [偏移, 存储长度, 原始长度, 压缩格式]，输出相同的记录引用同一组数据块；
+    同一主机的记录按host_offset首尾相接，命令行加输出与原来的result_<ip>.log相同，分页、搜索等按主机日志偏移读取；
+    重试时主机日志文件从头写入，其起始偏移记录在result_<ip>.log.base中，读取日志文件时同样使用主机日志偏移。
+    汇总查询只读取索引，不需要打开输出内容。
+    分片执行时各进程以name区分写入的文件，记录中的segment为数据块所在的段文件，读取时合并同一任务的所有索引。
+    """
+
+    def __init__(self, result_path, name=None):
+        self._result_path = result_path
+        self.name = name
+        self.segment_name = f"results.{name}.seg" if name else SEGMENT_FILE
+        self._segment_file = os.path.join(result_path, self.segment_name)
+        self._index_file = os.path.join(result_path, f"results.{name}.idx" if name else INDEX_FILE)
+        self._lock = threading.Lock()
+        self._codec = None
+        self._segment_fd = None
+        self._index_fd = None
+        # 索引文件 -> 已读取的位置
+        self._index_positions = dict()
+        # 本实例写入的主机
+        self._written_hosts = set()
+        self._records = list()
+        # ip -> 该主机的记录，按host_offset排序
+        self._host_records = defaultdict(list)
+        self._host_sizes = defaultdict(int)
+        # 原始输出摘要 -> 数据块，相同的输出不重复写入
+        self._digest_blocks = dict()
+        # 最近解压的块，分页和逐行读取时连续读取同一个块不重复解压
+        self._block_cache = (None, None)
+
+    @staticmethod
+    def exists(result_path):
+        return bool(glob.glob(os.path.join(result_path, INDEX_FILE_PATTERN)))
+
+    @staticmethod
+    def spool_base(spool_file):
+        """主机日志文件在主机日志中的起始偏移，没有记录时为0"""
+        try:
+            with open(spool_file + SPOOL_BASE_SUFFIX) as base_file:
+                return int(base_file.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def start_spool(self, ip, spool_file):
+        base = self.host_size(ip)
+        if base <= 0:
+            return
+        file_fd = os.open(spool_file + SPOOL_BASE_SUFFIX, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                          U_RW | G_READ | O_READ)
+        with os.fdopen(file_fd, "w") as base_file:
+            base_file.write(str(base))
+
+    def record(self, host, work_node_name):
+        return ResultRecord(self, host, work_node_name)
+
+    def write_block(self, data):
+        with self._lock:
+            self._open_for_write()
+            stored = _compress(self._codec, data)
+            os.write(self._segment_fd, stored)
+            # O_APPEND写入后本描述符的位置即为本次写入的末尾，其他进程同时追加同一文件时偏移也准确
+            offset = os.lseek(self._segment_fd, 0, os.SEEK_CUR) - len(stored)
+            return [offset, len(stored), len(data), self._codec]
+
+    def find_blocks(self, raw_digest):
+        with self._lock:
+            self._load_own()
+            return self._digest_blocks.get(raw_digest)
+
+    def write_index(self, record):
+        with self._lock:
+            self._open_for_write()
+            # 其他进程可能写入同一索引文件，读取最新记录、计算host_offset和追加期间对文件加锁；
+            # 重试时主机可能由其他进程执行，host_offset按所有索引计算
+            fcntl.flock(self._index_fd, fcntl.LOCK_EX)
+            try:
+                self._load()
+                record["host_offset"] = self._host_sizes[record["ip"]]
+                # 单次write追加整行，读取方不会读到不完整的记录
+                os.write(self._index_fd, (json.dumps(record) + "\n").encode("utf-8"))
+            finally:
+                fcntl.flock(self._index_fd, fcntl.LOCK_UN)
+            self._written_hosts.add(record["ip"])
+
+    def close(self):
+        with self._lock:
+            for file_fd in (self._segment_fd, self._index_fd):
+                if file_fd is not None:
+                    os.close(file_fd)
+            self._segment_fd = None
+            self._index_fd = None
+
+    def written_hosts(self):
+        with self._lock:
+            return set(self._written_hosts)
+
+    def records(self):
+        with self._lock:
+            self._load()
+            return list(self._records)
+
+    def hosts(self):
+        with self._lock:
+            self._load()
+            return list(self._host_records)
+
+    def host_size(self, ip):
+        with self._lock:
+            self._load()
+            return self._host_sizes.get(ip, 0)
+
+    def read(self, ip, offset, size):
+        """读取主机日志中 [offset, offset + size) 的内容，只解压涉及的块"""
+        with self._lock:
+            self._load()
+            records = list(self._host_records.get(ip, []))
+        end = offset + size
+        result = bytearray()
+        segments = dict()
+        try:
+            for record in records:
+                record_offset = record["host_offset"]
+                if record_offset + record["size"] <= offset or record_offset >= end:
+                    continue
+                header = record["header"].encode("utf-8")
+                result.extend(header[max(0, offset - record_offset):max(0, end - record_offset)])
+                block_offset = record_offset + len(header)
+                segment_name = record.get("segment", SEGMENT_FILE)
+                for position, length, raw_length, codec in record["blocks"]:
+                    if block_offset + raw_length > offset and block_offset < end:
+                        segment = segments.get(segment_name)
+                        if segment is None:
+                            segment = segments[segment_name] = open(os.path.join(self._result_path, segment_name), "rb")
+                        data = self._read_block(segment, segment_name, position, length, codec)
+                        result.extend(data[max(0, offset - block_offset):end - block_offset])
+                    block_offset += raw_length
+        finally:
+            for segment in segments.values():
+                segment.close()
+        return bytes(result)
+
+    def _read_block(self, segment, segment_name, position, length, codec):
+        cached_block, data = self._block_cache
+        if cached_block != (segment_name, position):
+            segment.seek(position)
+            data = _decompress(codec, segment.read(length))
+            self._block_cache = ((segment_name, position), data)
+        return data
+
+    def read_output(self, record, size):
+        """读取一条记录的输出，不包括命令行，最多读取size字节"""
+        header_size = len(record["header"].encode("utf-8"))
+        return self.read(record["ip"], record["host_offset"] + header_size, min(size, record["size"] - header_size))
+
+    def groups(self, work_node_name=None):
+        """按(step, 退出码, 归一化输出)对主机分组，主机数多的分组在前"""
+        groups = dict()
+        for record in self.records():
+            if work_node_name is not None and record["node"] != work_node_name:
+                continue
+            key = (record["node"], record["exit_code"], record["digest"])
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = {"node": record["node"], "exit_code": record["exit_code"],
+                                       "digest": record["digest"], "record": record, "hosts": list()}
+            group["hosts"].append(record["ip"])
+        return sorted(groups.values(), key=lambda item: len(item["hosts"]), reverse=True)
+
+    def statistics(self):
+        """汇总查询：退出码分布、失败主机、不同输出数量"""
+        records = self.records()
+        failed_hosts = sorted({record["ip"] for record in records if record["exit_code"] != 0})
+        stored_blocks = {(record.get("segment", SEGMENT_FILE), block[0]): block[1]
+                         for record in records for block in record["blocks"]}
+        stored_size = sum(stored_blocks.values())
+        return {
+            "records": len(records),
+            "hosts": len({record["ip"] for record in records}),
+            "exit_codes": dict(Counter(str(record["exit_code"]) for record in records)),
+            "failed_hosts": failed_hosts,
+            "distinct_outputs": len({record["digest"] for record in records}),
+            "output_size": sum(record["size"] for record in records),
+            "stored_size": stored_size
+        }
+
+    def _open_for_write(self):
+        if self._segment_fd is not None:
+            return
+        self._codec = _compression()
+        mode = U_RW | G_READ | O_READ
+        self._segment_fd = os.open(self._segment_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, mode)
+        self._index_fd = os.open(self._index_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, mode)
+
+    def _load_own(self):
+        """写入时只需要本实例的索引"""
+        if os.path.exists(self._index_file):
+            self._load([self._index_file])
+
+    def _load(self, index_files=None):
+        """增量读取各索引文件中新增的记录，只处理完整的行"""
+        if index_files is None:
+            index_files = sorted(glob.glob(os.path.join(self._result_path, INDEX_FILE_PATTERN)))
+        for index_file in index_files:
+            position = self._index_positions.get(index_file, 0)
+            with open(index_file, "rb") as index:
+                index.seek(position)
+                for line in index:
+                    if not line.endswith(b"\n"):
+                        break
+                    position += len(line)
+                    try:
+                        self._add(json.loads(line))
+                    except ValueError:
+                        LOGGER.warning(f"invalid result index: {line}")
+            self._index_positions[index_file] = position
+
+    def _add(self, record):
+        self._records.append(record)
+        # 只引用本实例段文件中的数据块
+        if record.get("segment", SEGMENT_FILE) == self.segment_name:
+            self._digest_blocks.setdefault(record["raw_digest"], record["blocks"])
+        self._host_records[record["ip"]].append(record)
+        self._host_sizes[record["ip"]] = record["host_offset"] + record["size"]
+
+
+class ResultStoreRegistry(metaclass=SingletonMeta):
+    """
+    执行中任务的结果存储写入端，同一进程内同一任务的所有step共用一个实例。
+    每次执行workflow或分片前acquire、结束后release，同一任务在本进程内的执行全部release后才关闭，
+    同一进程并发执行同一任务的多个分片时，先结束的分片不会关闭其他分片仍在写入的存储。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # result_path -> [ResultStore, 引用数]
+        self._stores = dict()
+
+    def acquire(self, result_path, name=None):
+        """引用任务的结果存储，分片执行时name为进程标识，各进程写入各自的段文件"""
+        with self._lock:
+            entry = self._stores.setdefault(result_path, [ResultStore(result_path, name), 0])
+            entry[1] += 1
+            return entry[0]
+
+    def get(self, result_path):
+        """
+        获取任务的结果存储，step执行时已由所属的workflow或分片acquire；
+        未acquire或已全部release时返回None，不创建无人关闭、也不区分分片进程的存储
+        """
+        with self._lock:
+            entry = self._stores.get(result_path)
+            return entry[0] if entry is not None else None
+
+    def release(self, result_path):
+        """释放引用，最后一个引用释放时关闭结果存储并删除已写入存储的主机日志文件，分片执行时只删除本进程写入的主机"""
+        with self._lock:
+            entry = self._stores.get(result_path)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            store = self._stores.pop(result_path)[0]
+        store.close()
+        if store.name is None:
+            spool_files = glob.glob(os.path.join(result_path, SPOOL_FILE_PATTERN))
+        else:
+            spool_files = [os.path.join(result_path, f"result_{ip}.log") for ip in store.written_hosts()]
+        for spool_file in spool_files:
+            for file_path in (spool_file, spool_file + SPOOL_BASE_SUFFIX):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+功 能：按主机复用SSH连接的会话代理模块
+"""
+import threading
+
+from zeus.operation_service.app.core.framework.tools.ssh import SshConnectionPool, SSH_CONNECTION_POOL
+from zeus.operation_service.app.settings import configuration
+from vulcanus.log.log import LOGGER
+
+
+# 每个step固定占用的通道数：shell、sftp、exec命令、一个文件传输通道
+CHANNELS_PER_LEASE = 4
+
+
+class HostSession:
+    """
+    一台主机上的一个已认证连接，多个step同时在该连接上各自打开shell/sftp/exec通道。
+    client由第一个使用者建立，lock保证同一连接只握手一次。
+    """
+
+    def __init__(self, key, max_channels):
+        self.key = key
+        self.client = None
+        self.lock = threading.Lock()
+        self._leases = 0
+        self._max_channels = max_channels
+        self._extra_channels = 0
+        self._channel_lock = threading.Lock()
+        # workflow异常结束时仍有step在使用的连接直接关闭，不再归还连接池，之后由使用者自行关闭
+        self.discarded = False
+
+    def try_lease(self):
+        """剩余通道数满足一个step的固定占用时分配给该step"""
+        with self._channel_lock:
+            used = (self._leases + 1) * CHANNELS_PER_LEASE + self._extra_channels
+            if self._leases > 0 and used > self._max_channels:
+                return False
+            self._leases += 1
+            return True
+
+    def end_lease(self):
+        with self._channel_lock:
+            self._leases -= 1
+
+    def reserve_channels(self, count):
+        """为并行传输申请额外通道，不等待，返回实际分配到的数量"""
+        with self._channel_lock:
+            spare = self._max_channels - self._leases * CHANNELS_PER_LEASE - self._extra_channels
+            granted = max(0, min(count, spare))
+            self._extra_channels += granted
+            return granted
+
+    def release_channels(self, count):
+        with self._channel_lock:
+            self._extra_channels -= count
+
+
+class SessionBroker:
+    """
+    WorkFlow生命周期内的主机会话代理：同一主机的所有step共用一个transport，不再为每个step重新握手和认证。
+    sshd默认MaxSessions为10，每个step固定占用CHANNELS_PER_LEASE个通道，并行传输需要的额外通道按剩余数量分配；
+    单个连接上的step数超过上限时再为该主机建立新的连接。
+    WorkFlow正常结束时连接归还到进程级连接池，供后续任务继续复用；
+    超时或异常结束时可能仍有工作线程在使用连接，此时直接关闭连接，避免把仍在使用的连接交给其他任务。
+    """
+
+    def __init__(self, max_sessions=None):
+        self._max_sessions = max_sessions or configuration.task.ssh_max_sessions
+        self._lock = threading.Lock()
+        self._sessions = dict()
+        self._leases = 0
+        self._closed = False
+
+    def acquire(self, host):
+        """分配主机会话，会话代理关闭后返回None，调用方单独建链"""
+        key = SshConnectionPool.make_key(host["ip"], host["port"], host["username"], host["password"])
+        with self._lock:
+            if self._closed:
+                return None
+            self._leases += 1
+            sessions = self._sessions.setdefault(key, list())
+            for session in sessions:
+                if session.try_lease():
+                    return session
+            session = HostSession(key, self._max_sessions)
+            session.try_lease()
+            sessions.append(session)
+            return session
+
+    @staticmethod
+    def release(session):
+        session.end_lease()
+
+    def statistics(self):
+        with self._lock:
+            return {
+                "hosts": len(self._sessions),
+                "transports": sum(len(sessions) for sessions in self._sessions.values()),
+                "leases": self._leases
+            }
+
+    def close(self, discard=False):
+        """
+        关闭会话代理
+        :param discard: 为True时说明仍有step可能在使用连接，直接关闭连接而不是归还连接池
+        """
+        LOGGER.info(f"[ssh]: session broker {self.statistics()}, discard: {discard}")
+        with self._lock:
+            self._closed = True
+            sessions = [session for host_sessions in self._sessions.values() for session in host_sessions]
+            self._sessions.clear()
+        for session in sessions:
+            with session.lock:
+                client = session.client
+                session.client = None
+                session.discarded = discard
+            if client is None:
+                continue
+            if discard:
+                client.close()
+            else:
+                SSH_CONNECTION_POOL.release(session.key, client)
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+功 能：分片执行消息通道模块
+"""
+import json
+
+from vulcanus.database.proxy import RedisProxy
+
+from zeus.operation_service.app.core.framework.tools.worker import worker_id
+
+# 所有进程共用的分片队列，协调者从左侧加入分片，执行分片的进程从右侧取出分片
+SHARD_QUEUE = "operation_task_shards"
+# 进程取出分片时原子地移入自己的执行中列表，分片结束后删除；进程退出后由其他进程放回分片队列
+PROCESSING_QUEUE = "operation_task_shards_processing:{}"
+# 有执行中列表的进程
+PROCESSING_WORKERS = "operation_task_shard_workers"
+# 协调者退出后遗留的键在该时间后过期
+KEY_EXPIRE = 24 * 3600
+
+
+class ShardChannel:
+    """
+    协调者与执行分片的进程之间经redis传递的消息，每次执行(run_id)使用独立的键：
+    1. 分片：协调者加入SHARD_QUEUE，执行进程取出时移入本进程的执行中列表，分片结束后ack删除，
+       进程心跳过期后其执行中的分片由其他进程requeue放回SHARD_QUEUE重新执行，不会因进程退出而丢失；
+    2. 事件：执行进程在分片开始、结束时追加到 operation_task_shard_events:<run_id>，由协调者取出；
+    3. 进度：执行进程把(work node, 主机)总数和完成数的增量累加到 operation_task_shard_progress:<run_id>；
+    4. 取消：按任务设置 operation_task_shard_cancel:<task_id>，执行进程检查到后取消本进程内的分片；
+    5. 任务当前的run_id保存在 operation_task_shard_run:<task_id>，协调者异常退出后遗留的分片不再执行；
+    6. 存活：operation_task_shard_state:<run_id>中queued为本次执行仍在队列中的分片数，
+       beats为执行分片的进程定期累加的心跳，协调者据此判断分片是否仍在排队或执行，不受其他任务的分片影响。
+    """
+
+    def __init__(self, task_id, run_id, item=None):
+        self.task_id = task_id
+        self.run_id = run_id
+        # 从队列取出的原始分片消息，ack时从执行中列表删除
+        self._item = item
+        self._events_key = f"operation_task_shard_events:{run_id}"
+        self._progress_key = f"operation_task_shard_progress:{run_id}"
+        self._state_key = f"operation_task_shard_state:{run_id}"
+
+    @staticmethod
+    def _redis():
+        if RedisProxy.redis_connect is None:
+            RedisProxy()
+        return RedisProxy.redis_connect
+
+    @staticmethod
+    def _cancel_key(task_id):
+        return f"operation_task_shard_cancel:{task_id}"
+
+    @staticmethod
+    def _run_key(task_id):
+        return f"operation_task_shard_run:{task_id}"
+
+    def dispatch(self, shards):
+        """分片加入队列，shard为{"shard": 序号, "node_indexes": [...]}"""
+        pipeline = self._redis().pipeline(transaction=False)
+        pipeline.delete(self._cancel_key(self.task_id))
+        pipeline.set(self._run_key(self.task_id), self.run_id, ex=KEY_EXPIRE)
+        pipeline.hset(self._state_key, mapping={"queued": len(shards)})
+        pipeline.expire(self._state_key, KEY_EXPIRE)
+        pipeline.lpush(SHARD_QUEUE, *[json.dumps(dict(shard, task_id=self.task_id, run_id=self.run_id))
+                                      for shard in shards])
+        pipeline.execute()
+
+    @staticmethod
+    def receive(timeout):
+        """
+        取出一个分片并移入本进程的执行中列表，timeout秒内没有分片时返回(None, None)；
+        使用BRPOPLPUSH而不是BLMOVE，兼容6.2以前的redis
+        """
+        redis = ShardChannel._redis()
+        processing_queue = PROCESSING_QUEUE.format(worker_id())
+        redis.sadd(PROCESSING_WORKERS, worker_id())
+        item = redis.brpoplpush(SHARD_QUEUE, processing_queue, timeout=timeout)
+        if not item:
+            return None, None
+        shard = json.loads(item)
+        channel = ShardChannel(shard["task_id"], shard["run_id"], item)
+        ShardChannel._count_queued(channel._state_key, -1)
+        return channel, shard
+
+    def ack(self):
+        """分片结束，从本进程的执行中列表删除"""
+        if self._item is not None:
+            self._redis().lrem(PROCESSING_QUEUE.format(worker_id()), 1, self._item)
+
+    @staticmethod
+    def requeue(alive_workers):
+        """
+        把心跳已过期的进程执行中的分片放回分片队列，返回放回的分片数；
+        每次RPOPLPUSH只移动一个分片，多个进程同时检查时同一分片不会重复放回
+        :param alive_workers: 接收worker_id列表、返回心跳未过期进程的函数
+        """
+        redis = ShardChannel._redis()
+        workers = [worker.decode("utf-8") if isinstance(worker, bytes) else worker
+                   for worker in redis.smembers(PROCESSING_WORKERS)]
+        alive = alive_workers(workers)
+        count = 0
+        for worker in workers:
+            if worker in alive:
+                continue
+            processing_queue = PROCESSING_QUEUE.format(worker)
+            while True:
+                item = redis.rpoplpush(processing_queue, SHARD_QUEUE)
+                if not item:
+                    break
+                shard = json.loads(item)
+                ShardChannel._count_queued(ShardChannel(shard["task_id"], shard["run_id"])._state_key, 1)
+                count += 1
+            redis.srem(PROCESSING_WORKERS, worker)
+        return count
+
+    @staticmethod
+    def _count_queued(state_key, increment):
+        pipeline = ShardChannel._redis().pipeline(transaction=False)
+        pipeline.hincrby(state_key, "queued", increment)
+        # 已结束的执行遗留的分片也会计数，键随之过期
+        pipeline.expire(state_key, KEY_EXPIRE)
+        pipeline.execute()
+
+    def beat(self):
+        """执行分片的进程定期调用，协调者看到心跳变化即认为分片仍在执行"""
+        pipeline = self._redis().pipeline(transaction=False)
+        pipeline.hincrby(self._state_key, "beats", 1)
+        pipeline.expire(self._state_key, KEY_EXPIRE)
+        pipeline.execute()
+
+    def liveness(self):
+        """
+        返回(仍在队列中的分片数, 心跳计数)；
+        队列已空时本次执行不可能还有排队的分片，分片被取出后进程在计数前退出时不会一直视为排队
+        """
+        pipeline = self._redis().pipeline(transaction=False)
+        pipeline.hmget(self._state_key, ["queued", "beats"])
+        pipeline.llen(SHARD_QUEUE)
+        (queued, beats), queue_length = pipeline.execute()
+        return min(int(queued or 0), queue_length), int(beats or 0)
+
+    def send_event(self, event_type, shard, **kwargs):
+        pipeline = self._redis().pipeline(transaction=False)
+        pipeline.rpush(self._events_key, json.dumps(dict(kwargs, type=event_type, shard=shard, worker=worker_id())))
+        pipeline.expire(self._events_key, KEY_EXPIRE)
+        pipeline.execute()
+
+    def receive_event(self, timeout):
+        """取出一个事件，timeout秒内没有事件时返回None"""
+        item = self._redis().blpop([self._events_key], timeout=timeout)
+        return json.loads(item[1]) if item else None
+
+    def report_progress(self, finished, total):
+        pipeline = self._redis().pipeline(transaction=False)
+        pipeline.hincrby(self._progress_key, "finished", finished)
+        pipeline.hincrby(self._progress_key, "total", total)
+        pipeline.expire(self._progress_key, KEY_EXPIRE)
+        pipeline.execute()
+
+    def progress(self):
+        """所有分片累计的(完成数, 总数)"""
+        finished, total = self._redis().hmget(self._progress_key, ["finished", "total"])
+        return int(finished or 0), int(total or 0)
+
+    @staticmethod
+    def cancel(task_id):
+        ShardChannel._redis().set(ShardChannel._cancel_key(task_id), 1, ex=KEY_EXPIRE)
+
+    def cancelled(self):
+        return bool(self._redis().exists(self._cancel_key(self.task_id)))
+
+    def active(self):
+        """分片属于任务当前的执行且任务未被取消"""
+        run_id, cancelled = self._redis().mget([self._run_key(self.task_id), self._cancel_key(self.task_id)])
+        if isinstance(run_id, bytes):
+            run_id = run_id.decode("utf-8")
+        return run_id == self.run_id and not cancelled
+
+    def clear(self):
+        """执行结束后清除本次执行的键，队列中遗留的分片随之失效"""
+        self._redis().delete(self._events_key, self._progress_key, self._state_key, self._run_key(self.task_id))
@@ -5,9 +5,12 @@
 
 """
 
+import hashlib
 from io import StringIO
+import select
 import socket
 import string
+import threading
 import time
 import warnings
 from collections import OrderedDict
@@ -16,41 +19,156 @@ from secrets import SystemRandom
 import paramiko
 from paramiko import AuthenticationException
 from paramiko import SSHException
+from paramiko.common import cMSG_CHANNEL_REQUEST
+from paramiko.message import Message
 
 from paramiko.ssh_exception import NoValidConnectionsError
 # from wtforms.validators import IPAddress
 
 from zeus.operation_service.app.core.framework.common.constant import DEFAULT_SSH_PORT
+from zeus.operation_service.app.core.framework.tools.cancellation import TaskCancelledException
+from zeus.operation_service.app.core.framework.tools.output_stream import STDERR
+from zeus.operation_service.app.settings import configuration
 from vulcanus.log.log import LOGGER
 
 warnings.filterwarnings("ignore")
 
+# 单次从通道读取的最大字节数
+RECV_CHUNK_SIZE = 64 * 1024
 
-# class SshConnectionLruCache:
-#     def __init__(self, capacity):
-#         self.capacity = capacity
-#         self.cache = OrderedDict()
 
-#     def cached(self, key):
-#         return key in self.cache
+class ChannelClosedException(SSHException):
+    """等待命令输出时通道被对端关闭，区别于命令执行超时，调用方应按连接错误处理而不是按超时重试"""
 
-#     def get(self, key):
-#         if not self.cached(key):
-#             return -1
-#         entity = self.cache.pop(key)
-#         self.cache[key] = entity
-#         return entity
 
-#     def set(self, key, entity):
-#         if key in self.cache:
-#             self.cache.pop(key)
-#         elif len(self.cache) == self.capacity:
-#             _, entity = self.cache.popitem(last=False)
-#             entity.close()
-#         self.cache[key] = entity
+class SshConnectionPool:
+    """
+    进程级SSH连接池，按 主机/端口/用户/密钥指纹 缓存已认证的连接，跨step、跨任务复用，避免重复握手。
+    连接以独占方式借出：acquire 取出空闲连接，release 归还；超出容量时按LRU淘汰最久未使用的连接。
+    """
+
+    def __init__(self, capacity, idle_timeout):
+        self.capacity = capacity
+        self.idle_timeout = idle_timeout
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(host_ip, port, user, pkey):
+        """
+        连接缓存键，私钥只参与摘要计算，不在键中明文保存
+        """
+        fingerprint = hashlib.sha256(pkey.encode("utf-8")).hexdigest() if pkey else "passwordless"
+        return f"{user}@{host_ip}:{port}#{fingerprint}"
+
+    @staticmethod
+    def is_alive(client):
+        """
+        通过transport的keepalive状态检查连接是否可用，并发送一个ignore报文探测对端
+        """
+        transport = client.get_transport()
+        if transport is None or not transport.is_active() or not transport.is_authenticated():
+            return False
+        try:
+            transport.send_ignore()
+        except Exception:
+            return False
+        return True
 
+    def acquire(self, key):
+        """
+        借出一个空闲连接，未命中或连接已失效时返回(None, None)
+        """
+        with self._lock:
+            entity = self._cache.pop(key, None)
+            if entity is None:
+                self.misses += 1
+                return None, None
+        client, sftp, release_time = entity
+        if time.time() - release_time > self.idle_timeout or not self.is_alive(client):
+            self._close_entity(client, sftp)
+            with self._lock:
+                self.misses += 1
+            return None, None
+        with self._lock:
+            self.hits += 1
+        return client, sftp
 
-# SSH_CONNECTION_CACHE = SshConnectionLruCache(capacity=15)
+    def release(self, key, client, sftp=None):
+        """
+        归还连接，连接已失效则直接关闭；容量已满时淘汰最久未使用的连接
+        """
+        if self.capacity <= 0 or not self.is_alive(client):
+            self._close_entity(client, sftp)
+            return
+        expired = list()
+        with self._lock:
+            # 顺带回收超过空闲时间的连接
+            while self._cache:
+                oldest_key = next(iter(self._cache))
+                if time.time() - self._cache[oldest_key][2] <= self.idle_timeout:
+                    break
+                expired.append(self._cache.pop(oldest_key))
+            if key in self._cache:
+                expired.append(self._cache.pop(key))
+            elif len(self._cache) >= self.capacity:
+                _, entity = self._cache.popitem(last=False)
+                expired.append(entity)
+                self.evictions += 1
+            self._cache[key] = (client, sftp, time.time())
+        for old_client, old_sftp, _ in expired:
+            self._close_entity(old_client, old_sftp)
+
+    def statistics(self):
+        with self._lock:
+            return {
+                "size": len(self._cache),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+    def clear(self):
+        with self._lock:
+            entities = list(self._cache.values())
+            self._cache.clear()
+        for client, sftp, _ in entities:
+            self._close_entity(client, sftp)
+
+    @staticmethod
+    def _close_entity(client, sftp):
+        try:
+            if sftp:
+                sftp.close()
+            client.close()
+        except Exception as ex:
+            LOGGER.warning(f"[ssh]: close pooled connection failed: {ex}")
+
+
+SSH_CONNECTION_POOL = SshConnectionPool(capacity=configuration.task.ssh_connection_pool_size,
+                                        idle_timeout=configuration.task.ssh_connection_idle_timeout)
+
+
+class PromptMatcher:
+    """
+    流式提示符匹配：只扫描新到达的数据，并向前回看 (最长等待字符串长度 - 1) 个字节，
+    以匹配跨两次读取被截断的等待字符串，避免每次都重新扫描全部输出
+    """
+
+    def __init__(self, wait_list):
+        self._tokens = [wait.encode("utf-8") for wait in wait_list if wait]
+        self.look_behind = max([len(token) for token in self._tokens], default=1) - 1
+
+    def match(self, buffer, scan_start):
+        start = max(0, scan_start - self.look_behind)
+        for token in self._tokens:
+            if buffer.find(token, start) != -1:
+                return True
+        return False
 
 
 class RemoteControl(object):
@@ -59,9 +177,6 @@ class RemoteControl(object):
     SSH和SFTP通道相互独立，SSH和SFTP上下文的操作互不干扰。
     """
 
-    # def _cached_key(self):
-    #     return f"@{self.__host_ip}@_@{self.__user}@"
-
     def _new_ssh_connection(self):
         self.m_client = paramiko.client.SSHClient()
         policy = paramiko.client.AutoAddPolicy()
@@ -69,23 +184,46 @@ class RemoteControl(object):
         if self.__passwordless:
             self.m_client.load_system_host_keys()
             self.m_client.connect(hostname=self.__host_ip, port=self.__port, username=self.__user, timeout=self.timeout,
-                                  banner_timeout=300, allow_agent=False, look_for_keys=True)
+                                  banner_timeout=self._banner_timeout, allow_agent=False, look_for_keys=True)
         else:
             private_key = paramiko.RSAKey.from_private_key(StringIO(self.__password))
             self.m_client.connect(self.__host_ip, self.__port, self.__user, pkey=private_key, timeout=self.timeout,
-                                  banner_timeout=300, allow_agent=False)
+                                  banner_timeout=self._banner_timeout, allow_agent=False)
         self.m_sftp = self.m_client.open_sftp()
-
-    # def _connect(self):
-    #     cache_key = self._cached_key()
-    #     if SSH_CONNECTION_CACHE.cached(cache_key):
-    #         self.m_client = SSH_CONNECTION_CACHE.get(cache_key)
-    #         self.m_sftp = self.m_client.open_sftp()
-    #         self._cached = True
-    #         return
-
-    #     self._new_ssh_connection()
-    #     SSH_CONNECTION_CACHE.set(cache_key, self.m_client)
+        if self._session is not None:
+            self._session.client = self.m_client
+
+    def _connect_session(self):
+        """在会话代理的共享连接上打开本实例的sftp通道，共享连接不可用时从连接池获取或重新建立"""
+        with self._session.lock:
+            client = self._session.client
+            if client is None or not SshConnectionPool.is_alive(client):
+                if client is not None:
+                    client.close()
+                    self._session.client = None
+                client, sftp = SSH_CONNECTION_POOL.acquire(self._pool_key) if self._pool_key else (None, None)
+                if client is None:
+                    self._new_ssh_connection()
+                    return
+                self._session.client = client
+                self.m_client = client
+                self.m_sftp = sftp if sftp else client.open_sftp()
+                return
+        self.m_client = client
+        self.m_sftp = client.open_sftp()
+
+    def _connect(self):
+        if self._session is not None:
+            self._connect_session()
+            return
+        if self._pool_key:
+            client, sftp = SSH_CONNECTION_POOL.acquire(self._pool_key)
+            if client is not None:
+                self.m_client = client
+                self.m_sftp = sftp if sftp else self.m_client.open_sftp()
+                self._cached = True
+                return
+        self._new_ssh_connection()
 
     def __init__(self, host_ip, user, password, passwordless=False, port=DEFAULT_SSH_PORT, **args):
         """
@@ -99,6 +237,12 @@ class RemoteControl(object):
         shell       ：  用户的shell类型，可选，默认为bash
         supassword  ：  su切换root的密码，可选，如果指定，在登陆时会切换为root，仅适用于SSH通道
         timeout     ：  超时时间，可选，默认为4秒
+        pooled      ：  是否从进程级连接池复用连接，可选，默认为True
+        session     ：  会话代理分配的主机会话，可选，指定时与同一主机的其他实例共用连接，只打开各自的通道
+        interactive ：  是否在建链时打开交互式shell通道，可选，默认为True；为False时仅在首次调用cmd时打开，
+                        只使用exec_command执行命令时可省去伪终端和提示符设置的开销
+        cancel_token：  任务取消令牌，可选，取消后正在等待的read_until和exec_command立即中断并抛出TaskCancelledException
+        banner_timeout：建链时等待SSH banner的超时时间，可选，默认为300秒
         """
 
         self.timeout = 4
@@ -108,7 +252,6 @@ class RemoteControl(object):
         self.waitstr = self.prompt
         if args.get("waitstr") is not None:
             self.waitstr = args.get("waitstr")
-        self.interval = 0.2
         # 内部适配：Gkit目前支持双栈ip，其中使用ssh连接可能传入双栈ip（以英文逗号分隔），在这里进行host ip 的统一适配，加强检查，支持传入双IP，仅取第一个有效ip进行连接
         host_ip = self.check_host_ip(host_ip)
         LOGGER.info("[ssh]: Start to connect %s:%s", host_ip, port)
@@ -129,8 +272,16 @@ class RemoteControl(object):
         self.__backoff_time = args.get("backoff_time", 1)
         self.__last_exception = None
         self._cached = False
+        self._closed = False
+        self.m_channel = None
+        self._pool_key = None
+        self._session = args.get("session")
+        self._cancel_token = args.get("cancel_token")
+        self._banner_timeout = args.get("banner_timeout") or 300
+        if args.get("pooled", True):
+            self._pool_key = SshConnectionPool.make_key(host_ip, port, user, password)
         try:
-            self._new_ssh_connection()
+            self._connect()
         except AuthenticationException as ex:
             LOGGER.error("[ssh]: Catch AuthenticationException [%s] %s", ex, host_ip)
             raise ex
@@ -139,8 +290,11 @@ class RemoteControl(object):
             self.__last_exception = ex
             begin_time = time.time()
             self.__backoff_reconnect(host_ip, port, user, password, begin_time, self.__retry_time)
-        if not self._cached:
+        if args.get("interactive", True):
             self.check_ssh(args)
+        else:
+            # 保持心跳没有任何交互下30s发送一次keepalive
+            self.m_client.get_transport().set_keepalive(30)
 
     def __backoff_reconnect(self, host_ip, port, user, password, begin_time, retry_time):
         """
@@ -155,14 +309,7 @@ class RemoteControl(object):
             raise self.__last_exception
         time.sleep(self.__backoff_time)
         try:
-            if self.__passwordless:
-                self.m_client.load_system_host_keys()
-                self.m_client.connect(hostname=self.__host_ip, port=self.__port, username=self.__user, timeout=self.timeout,
-                                    banner_timeout=300, allow_agent=False, look_for_keys=True)
-            else:
-                private_key = paramiko.RSAKey.from_private_key(StringIO(self.__password))
-                self.m_client.connect(self.__host_ip, self.__port, self.__user, pkey=private_key, timeout=self.timeout,
-                                    banner_timeout=300, allow_agent=False)
+            self._new_ssh_connection()
         except (socket.timeout, SSHException) as ex:
             self.__last_exception = ex
             LOGGER.info("[ssh]: Catch exception [%s],connect again!", ex)
@@ -196,6 +343,11 @@ class RemoteControl(object):
         if self.waitstr != 'iBMC:/->':
             self.set_prompt("bash" if not args.get("shell") else args.get("shell"))
 
+    def _ensure_shell(self):
+        """非交互方式建链时，在第一次使用交互式通道前打开shell"""
+        if self.m_channel is None:
+            self.check_ssh({"shell": self.__shell})
+
     @staticmethod
     def get_prompt():
         """
@@ -251,6 +403,7 @@ class RemoteControl(object):
         :param shell:
         :return:
         """
+        self._ensure_shell()
         cmd = "su - %s --shell=%s\n" % (user, shell)
         self.m_channel.send(cmd.encode("utf-8"))
         if password:
@@ -287,6 +440,7 @@ class RemoteControl(object):
         :param port:
         :return:
         """
+        self._ensure_shell()
         tmp_timeout = self.timeout
         self.timeout = 30
         for _ in range(3):
@@ -338,48 +492,60 @@ class RemoteControl(object):
                 return True
         return False
 
-    def read_until(self, wait_str, timeout, ignore_log=False, wait_list=None):
-        """ 通过分析输出流中是否出现预期的字符串，确认是否可以返回已经读到的字符串 """
-        # 通过分析输出流中是否出现预期的字符串，确认是否可以返回已经读到的字符串
+    def read_until(self, wait_str, timeout, ignore_log=False, wait_list=None, sink=None):
+        """
+        通过分析输出流中是否出现预期的字符串，确认是否可以返回已经读到的字符串
+        指定sink时读到的数据直接交给sink处理，内存中只保留用于匹配等待字符串的回看窗口
+        等待过程中通道被关闭时抛出ChannelClosedException，不按超时返回
+        """
+        # 阻塞在通道上等待数据到达，每次只扫描新到达的数据及其前面有限长度的回看窗口
         if wait_list is None:
             wait_list = []
-        result = b""
+        matcher = PromptMatcher([wait_str] + wait_list)
+        result = bytearray()
 
-        self.m_channel.settimeout(timeout)
         self.timeout_flag = False
-        begin = time.time()
+        deadline = time.time() + timeout
         exec_timeout = False
-        recv_number = 1024
 
         while True:
-            time.sleep(self.interval)
-            try:
-                while self.m_channel.recv_ready():
-                    result = result + self.m_channel.recv(recv_number)
-            except socket.timeout:
-                if not ignore_log:
-                    LOGGER.warning("[ssh]: recv timeout(%s)", timeout)
-                continue
-            except Exception as ex:
-                raise ex
-
-            # 检查是否超时
-            now = time.time()
-            diff = now - begin
-            if diff >= timeout:
+            remaining = deadline - time.time()
+            if remaining <= 0:
                 self.timeout_flag = True
                 if not ignore_log:
                     LOGGER.warning('[ssh]: Wait "%s" time out!', wait_str)
                 exec_timeout = True
                 break
 
-            waitlist = []
-            waitlist.append(wait_str)
-            waitlist.extend(wait_list)
-            if self.check_return(result, waitlist):
+            readable, _, _ = select.select(self._waitables(self.m_channel), [], [], remaining)
+            self._check_cancelled(self.m_channel, interactive=True)
+            if not readable:
+                continue
+            if sink is not None and len(result) > matcher.look_behind:
+                # 已交给sink的数据只保留回看窗口长度
+                del result[:len(result) - matcher.look_behind]
+            scan_start = len(result)
+            try:
+                chunk = self.m_channel.recv(RECV_CHUNK_SIZE)
+                # 指定sink时每次只处理一块数据，保证回看窗口之外的数据及时释放
+                while chunk and sink is None and self.m_channel.recv_ready():
+                    result.extend(chunk)
+                    chunk = self.m_channel.recv(RECV_CHUNK_SIZE)
+            except socket.timeout:
+                continue
+            if not chunk:
+                # 通道已关闭，不会再有新的输出
+                if not ignore_log:
+                    LOGGER.warning('[ssh]: Channel closed while waiting "%s"!', wait_str)
+                raise ChannelClosedException(f'channel closed while waiting "{wait_str}"')
+            result.extend(chunk)
+            if sink is not None:
+                sink.write(chunk)
+
+            if matcher.match(result, scan_start):
                 break
 
-        return result, exec_timeout
+        return bytes(result), exec_timeout
 
     def set_timeout(self, timeout):
         """
@@ -452,6 +618,7 @@ class RemoteControl(object):
         reset_prompt=True时，因为需要去设置命令提示符，所以不能通过get_last_result去查该调命令的结果
         """
         # 禁止使用su命令在这里切换用户
+        self._ensure_shell()
         try:
             self.m_channel.send(command + "\n")
         except Exception as e:
@@ -481,6 +648,22 @@ class RemoteControl(object):
             self.cmd("whoami")
         return info.decode("utf-8", "replace"), exec_timeout
 
+    def cmd_to_stream(self, command, sink):
+        """
+        SSH通道中执行命令，输出在读取过程中直接写入sink，不在内存中拼接完整结果
+        sink需要自行去除命令回显和结尾的提示符
+        :return: 命令是否执行超时
+        """
+        self._ensure_shell()
+        try:
+            self.m_channel.send(command + "\n")
+        except Exception as e:
+            # 如果socket关闭则重连
+            self.relogin()
+            self.m_channel.send(command + "\n")
+        _, exec_timeout = self.read_until(self.waitstr, self.timeout, sink=sink)
+        return exec_timeout
+
     def cmd_with_backoff_retry(self, command, waitstr=None, retflag=False, ignorelog=False, retry_time=None,
                                backoff_time=None, reset_prompt=False):
         """
@@ -528,6 +711,7 @@ class RemoteControl(object):
         return info
 
     def __wait_exec_cmd_result(self, command, waitstr, reset_prompt=False):
+        self._ensure_shell()
         self.m_channel.send(command + "\n")
         if waitstr:
             if reset_prompt:
@@ -565,14 +749,143 @@ class RemoteControl(object):
                                           backoff_time, reset_prompt=reset_prompt)
         return result
 
+    def exec_command(self, command, timeout=None, sink=None):
+        """
+        非交互方式执行命令：在已认证的连接上新开session通道执行命令，不经过伪终端和提示符匹配，
+        一次往返同时返回退出码、标准输出和标准错误
+        :param command: 执行的命令字符串
+        :param timeout: 超时时间，默认使用self.timeout
+        :param sink: 输出接收端，指定时标准输出和标准错误按到达顺序写入sink，标准错误以stream=STDERR写入，返回的输出为空
+        :return: (exit_code, stdout, stderr)，命令执行超时时exit_code为None；命令结束前通道被关闭时抛出ChannelClosedException
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.time() + timeout
+        stdout = bytearray()
+        stderr = bytearray()
+        exit_code = None
+        channel = self.m_client.get_transport().open_session(timeout=timeout)
+        try:
+            channel.exec_command(command)
+            while not channel.eof_received or channel.recv_ready() or channel.recv_stderr_ready():
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    LOGGER.warning("[ssh]: exec command time out!")
+                    break
+                select.select(self._waitables(channel), [], [], remaining)
+                self._check_cancelled(channel, interactive=False)
+                if channel.closed and not channel.eof_received and not channel.recv_ready() \
+                        and not channel.recv_stderr_ready():
+                    LOGGER.warning("[ssh]: channel closed while executing command!")
+                    raise ChannelClosedException("channel closed while executing command")
+                while channel.recv_ready():
+                    chunk = channel.recv(RECV_CHUNK_SIZE)
+                    if sink is not None:
+                        sink.write(chunk)
+                    else:
+                        stdout.extend(chunk)
+                while channel.recv_stderr_ready():
+                    chunk = channel.recv_stderr(RECV_CHUNK_SIZE)
+                    if sink is not None:
+                        sink.write(chunk, stream=STDERR)
+                    else:
+                        stderr.extend(chunk)
+            remaining = deadline - time.time()
+            if remaining > 0 and channel.status_event.wait(remaining):
+                exit_code = channel.recv_exit_status()
+        finally:
+            channel.close()
+        return exit_code, stdout.decode("utf-8", "replace"), stderr.decode("utf-8", "replace")
+
+    def _waitables(self, channel):
+        """等待通道输出时同时等待取消令牌，任务取消后select立即返回"""
+        if self._cancel_token is None or self._cancel_token.closed:
+            return [channel]
+        return [channel, self._cancel_token]
+
+    def _check_cancelled(self, channel, interactive):
+        """任务已取消时按配置中断远端命令，并抛出TaskCancelledException结束等待"""
+        if self._cancel_token is None or not self._cancel_token.cancelled:
+            return
+        LOGGER.warning(f"[ssh]: {self.__host_ip} task cancelled, stop waiting for command output")
+        if configuration.task.cancel_send_sigint:
+            try:
+                self._send_sigint(channel, interactive)
+            except Exception as e:
+                LOGGER.warning(f"[ssh]: {self.__host_ip} send SIGINT failed: {e}")
+        raise TaskCancelledException("task cancelled")
+
+    @staticmethod
+    def _send_sigint(channel, interactive):
+        """
+        交互式通道在伪终端中输入Ctrl+C；exec通道没有伪终端，按RFC 4254 6.9发送signal请求。
+        paramiko没有提供发送signal请求的接口，这里直接构造channel request报文
+        """
+        if interactive:
+            channel.send("\x03")
+            return
+        message = Message()
+        message.add_byte(cMSG_CHANNEL_REQUEST)
+        message.add_int(channel.remote_chanid)
+        message.add_string("signal")
+        message.add_boolean(False)
+        message.add_string("INT")
+        channel.get_transport()._send_user_message(message)
+
     def close(self):
         """
-        关闭通道连接
+        关闭通道连接，启用连接池时将底层连接归还连接池复用
         :return:
         """
+        if not hasattr(self, "_closed") or self._closed:
+            return
+        self._closed = True
+        if self.m_channel:
+            self.m_channel.close()
+        if not getattr(self, "m_client", None):
+            return
+        if self._session is not None:
+            # 共享连接由会话代理统一归还，这里只关闭本实例打开的通道
+            if self.m_sftp:
+                self.m_sftp.close()
+            if self.m_client is not self._session.client or self._session.discarded:
+                self.m_client.close()
+            return
+        if self._pool_key and self.m_client.get_transport() is not None:
+            if self.m_sftp:
+                # 复位sftp工作目录，避免影响下一个使用者
+                try:
+                    self.m_sftp.chdir(None)
+                except Exception:
+                    self.m_sftp = None
+            SSH_CONNECTION_POOL.release(self._pool_key, self.m_client, self.m_sftp)
+            return
         # 关闭通道连接
-        if hasattr(self, "m_sftp") and self.m_sftp:
+        if self.m_sftp:
             self.m_sftp.close()
+        self.m_client.close()
+
+    def abort(self):
+        """
+        强制关闭底层连接，阻塞在命令输出或SFTP传输上的调用立即出错返回，用于单主机执行超时后释放工作线程。
+        连接关闭后不会再被归还到连接池中复用
+        """
+        client = getattr(self, "m_client", None)
+        if client is None:
+            return
+        try:
+            client.close()
+        except Exception as e:
+            LOGGER.warning(f"[ssh]: abort connection of {self.__host_ip} failed: {e}")
+
+    @property
+    def session(self):
+        """会话代理分配的主机会话，未使用会话代理时为None"""
+        return self._session
+
+    @property
+    def cancel_token(self):
+        """任务取消令牌，未指定时为None"""
+        return self._cancel_token
 
     @property
     def login_ip(self):
@@ -621,6 +934,7 @@ class RemoteControl(object):
         """
         info = b""
         # 禁止使用su命令在这里切换用户
+        self._ensure_shell()
         try:
             self.m_channel.send(command + "\n")
         except Exception as e:
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+功 能：SFTP并行传输模块
+"""
+import hashlib
+import os
+import queue
+import threading
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+
+import paramiko
+
+from zeus.operation_service.app.settings import configuration
+from vulcanus.log.log import LOGGER
+
+
+class TransferEngine:
+    """
+    基于同一SSH连接的SFTP并行传输：
+    1. 每个工作线程在同一个transport上打开独立的SFTP通道，多个文件同时传输；
+    2. 上传时开启pipelined写，下载时开启prefetch，请求不再逐个等待响应；
+    3. 传输过程中按固定大小分块读写，同时计算SHA-256，无需再次读取整个文件；
+    4. 记录传输字节数和耗时，用于统计每台主机的吞吐量。
+    """
+
+    def __init__(self, ssh_con, concurrency=None, chunk_size=None, window_size=None):
+        self._transport = ssh_con.m_client.get_transport()
+        self._host_ip = ssh_con.login_ip
+        self._session = ssh_con.session
+        self._cancel_token = ssh_con.cancel_token
+        self._concurrency = concurrency or configuration.task.transfer_concurrency
+        self._chunk_size = chunk_size or configuration.task.transfer_chunk_size
+        self._window_size = window_size or configuration.task.transfer_window_size
+        self._lock = threading.Lock()
+        self.transferred_bytes = 0
+        self.elapsed = 0.0
+
+    def upload(self, local_path, remote_path):
+        """上传单个文件，返回本地文件的sha256"""
+        return self.upload_files([(local_path, remote_path)])[remote_path]
+
+    def download(self, remote_path, local_path):
+        """下载单个文件，返回下载内容的sha256"""
+        return self._run([(remote_path, local_path)], self._download)[local_path]
+
+    def upload_files(self, file_pairs):
+        """
+        并行上传多个文件，远端目录需已存在
+        :param file_pairs: [(本地路径, 远端路径)]
+        :return: {远端路径: sha256}
+        """
+        return self._run(file_pairs, self._upload)
+
+    def throughput(self):
+        """传输吞吐量，单位 MB/s"""
+        if self.elapsed <= 0:
+            return 0.0
+        return self.transferred_bytes / self.elapsed / 1024 / 1024
+
+    def statistics(self):
+        return {
+            "host": self._host_ip,
+            "bytes": self.transferred_bytes,
+            "seconds": round(self.elapsed, 3),
+            "throughput": f"{self.throughput():.2f}MB/s"
+        }
+
+    def _run(self, file_pairs, transfer_func):
+        todo = queue.Queue()
+        for pair in file_pairs:
+            todo.put(pair)
+        digests = dict()
+        start_time = timeit.default_timer()
+        extra_workers = max(1, min(self._concurrency, len(file_pairs))) - 1
+        # 与其他step共用连接时，额外的传输通道受主机MaxSessions限制
+        if self._session is not None:
+            extra_workers = self._session.reserve_channels(extra_workers)
+        try:
+            with ThreadPoolExecutor(max_workers=extra_workers + 1) as pool:
+                workers = [pool.submit(self._worker, todo, transfer_func, digests) for _ in range(extra_workers + 1)]
+                for worker in workers:
+                    worker.result()
+        finally:
+            if self._session is not None:
+                self._session.release_channels(extra_workers)
+        with self._lock:
+            self.elapsed += timeit.default_timer() - start_time
+        LOGGER.info(f"[Transfer]: {len(file_pairs)} files, {self.statistics()}")
+        return digests
+
+    def _worker(self, todo, transfer_func, digests):
+        """每个工作线程独占一个SFTP通道，依次处理队列中的文件"""
+        sftp = paramiko.SFTPClient.from_transport(self._transport, window_size=self._window_size)
+        try:
+            while True:
+                try:
+                    src, dest = todo.get_nowait()
+                except queue.Empty:
+                    return
+                # 任务取消后不再传输剩余文件
+                if self._cancel_token is not None:
+                    self._cancel_token.check()
+                digest, size = transfer_func(sftp, src, dest)
+                with self._lock:
+                    digests[dest] = digest
+                    self.transferred_bytes += size
+        finally:
+            sftp.close()
+
+    def _upload(self, sftp, local_path, remote_path):
+        digest = hashlib.sha256()
+        size = 0
+        with open(local_path, "rb") as local_file, sftp.open(remote_path, "wb") as remote_file:
+            remote_file.set_pipelined(True)
+            while True:
+                chunk = local_file.read(self._chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                remote_file.write(chunk)
+                size += len(chunk)
+        return digest.hexdigest(), size
+
+    def _download(self, sftp, remote_path, local_path):
+        digest = hashlib.sha256()
+        size = 0
+        with sftp.open(remote_path, "rb") as remote_file, open(local_path, "wb") as local_file:
+            remote_file.prefetch(remote_file.stat().st_size)
+            while True:
+                chunk = remote_file.read(self._chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                local_file.write(chunk)
+                size += len(chunk)
+        return digest.hexdigest(), size
+
+
+def list_local_files(local_dir, remote_dir):
+    """列出本地目录下的所有文件及其对应的远端路径"""
+    file_pairs = list()
+    for root, _, files in os.walk(local_dir):
+        relative_dir = os.path.relpath(root, local_dir)
+        for file in sorted(files):
+            remote_path = os.path.normpath(os.path.join(remote_dir, relative_dir, file)).replace("\\", "/")
+            file_pairs.append((os.path.join(root, file), remote_path))
+    return file_pairs
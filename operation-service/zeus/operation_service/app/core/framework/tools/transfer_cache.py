@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+功 能：文件传输内容寻址缓存模块
+"""
+import fcntl
+import json
+import os
+import threading
+
+from zeus.operation_service.app.constant import BASE_DIR, SingletonMeta
+from zeus.operation_service.app.core.file_util import U_RW
+from zeus.operation_service.app.core.framework.tools.common_tools import sha256sum
+from vulcanus.log.log import LOGGER
+
+# 本地文件摘要清单
+MANIFEST_FILE = os.path.join(BASE_DIR, "transfer_manifest.json")
+# 任务传输统计信息，保存在任务结果目录下
+TRANSFER_STATISTICS_FILE = "transfer_statistics.json"
+
+
+class LocalDigestManifest(metaclass=SingletonMeta):
+    """
+    本地文件sha256清单，以文件路径、修改时间和大小为键，文件未变化时直接复用已计算的摘要，
+    避免每次传输前都重新读取整个文件
+    """
+
+    def __init__(self, manifest_file=MANIFEST_FILE):
+        self._manifest_file = manifest_file
+        self._lock = threading.Lock()
+        self._entries = self._load()
+        self._dirty = False
+
+    def digest(self, path):
+        path = os.path.abspath(path)
+        file_stat = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry and entry["mtime_ns"] == file_stat.st_mtime_ns and entry["size"] == file_stat.st_size:
+            return entry["sha256"]
+        digest = sha256sum(path)
+        with self._lock:
+            self._entries[path] = {"mtime_ns": file_stat.st_mtime_ns, "size": file_stat.st_size, "sha256": digest}
+            self._dirty = True
+        return digest
+
+    def save(self):
+        # 写入和替换也在锁内完成，避免较早的快照在较新的快照之后替换清单文件
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                tmp_file = f"{self._manifest_file}.{threading.get_ident()}.tmp"
+                file_fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, U_RW)
+                with os.fdopen(file_fd, "w", encoding="utf-8") as f:
+                    json.dump(self._entries, f)
+                os.replace(tmp_file, self._manifest_file)
+                self._dirty = False
+            except OSError as e:
+                LOGGER.warning(f"save transfer manifest failed: {e}")
+
+    def _load(self):
+        if not os.path.exists(self._manifest_file):
+            return dict()
+        try:
+            with open(self._manifest_file, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            LOGGER.warning(f"load transfer manifest failed: {e}")
+            return dict()
+        # 已删除的文件不再保留
+        return {path: entry for path, entry in entries.items() if os.path.exists(path)}
+
+
+class TransferStatistics(metaclass=SingletonMeta):
+    """按任务统计实际传输和因远端内容一致而跳过的字节数、文件数"""
+
+    FIELDS = ("sent_bytes", "skipped_bytes", "sent_files", "skipped_files")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._statistics = dict()
+
+    def record(self, task_id, sent_bytes=0, skipped_bytes=0, sent_files=0, skipped_files=0):
+        with self._lock:
+            statistics = self._statistics.setdefault(task_id, dict.fromkeys(self.FIELDS, 0))
+            statistics["sent_bytes"] += sent_bytes
+            statistics["skipped_bytes"] += skipped_bytes
+            statistics["sent_files"] += sent_files
+            statistics["skipped_files"] += skipped_files
+
+    def get(self, task_id, result_path=None):
+        """获取任务的统计信息，包括已落盘和尚未落盘的部分"""
+        statistics = self._load(result_path)
+        with self._lock:
+            for field, value in self._statistics.get(task_id, dict()).items():
+                statistics[field] += value
+        return statistics
+
+    def flush(self, task_id, result_path):
+        """
+        将内存中的统计信息累加到任务结果目录下的统计文件中，
+        分片执行时多个进程累加同一个文件，读取和写入期间对文件加锁
+        """
+        with self._lock:
+            delta = self._statistics.get(task_id)
+            if not delta:
+                return None
+            file_fd = os.open(os.path.join(result_path, TRANSFER_STATISTICS_FILE), os.O_RDWR | os.O_CREAT, U_RW)
+            with os.fdopen(file_fd, "r+", encoding="utf-8") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                statistics = dict.fromkeys(self.FIELDS, 0)
+                content = f.read()
+                if content:
+                    statistics.update(json.loads(content))
+                for field, value in delta.items():
+                    statistics[field] += value
+                f.seek(0)
+                f.truncate()
+                json.dump(statistics, f)
+            # 写入成功后才移除内存中的统计信息，写入失败时保留到下次写入
+            self._statistics.pop(task_id, None)
+        return statistics
+
+    def _load(self, result_path):
+        statistics = dict.fromkeys(self.FIELDS, 0)
+        if not result_path:
+            return statistics
+        statistics_file = os.path.join(result_path, TRANSFER_STATISTICS_FILE)
+        if os.path.exists(statistics_file):
+            with open(statistics_file, "r", encoding="utf-8") as f:
+                statistics.update(json.load(f))
+        return statistics
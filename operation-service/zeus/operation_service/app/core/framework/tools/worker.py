@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+功 能：operation-service进程标识和心跳模块
+"""
+import os
+import socket
+import threading
+import uuid
+
+from redis import RedisError
+from vulcanus.database.proxy import RedisProxy
+from vulcanus.log.log import LOGGER
+
+from zeus.operation_service.app.constant import SingletonMeta
+from zeus.operation_service.app.settings import configuration
+
+# 各进程的心跳键，超过3个心跳周期未刷新的进程视为已退出
+HEARTBEAT_KEY = "operation_worker_heartbeat:{}"
+HEARTBEAT_MISSES = 3
+
+_worker_id = None
+_worker_pid = None
+_worker_lock = threading.Lock()
+
+
+def worker_id():
+    """
+    当前进程的标识：主机名-进程号-随机串，fork后在子进程中重新生成；
+    随机串区分重启前后进程号相同的进程，重启前进程的任务不会被当作重启后进程的任务
+    """
+    global _worker_id, _worker_pid
+    with _worker_lock:
+        if _worker_pid != os.getpid():
+            _worker_pid = os.getpid()
+            _worker_id = f"{socket.gethostname()}-{_worker_pid}-{uuid.uuid4().hex[:8]}"
+        return _worker_id
+
+
+class WorkerHeartbeat(metaclass=SingletonMeta):
+    """
+    每个进程每task.worker_heartbeat_interval秒在redis中刷新一次心跳，
+    其他进程据此判断执行任务的进程是否仍然存活，只恢复已退出进程的任务
+    """
+
+    def __init__(self):
+        self._interval = configuration.task.worker_heartbeat_interval
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @staticmethod
+    def _redis():
+        if RedisProxy.redis_connect is None:
+            RedisProxy()
+        return RedisProxy.redis_connect
+
+    def start(self):
+        """启动刷新心跳的线程，重复调用无影响"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._beat()
+            self._thread = threading.Thread(target=self._run, name="WorkerHeartbeat", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        event = threading.Event()
+        while not event.wait(self._interval):
+            self._beat()
+
+    def _beat(self):
+        try:
+            self._redis().set(HEARTBEAT_KEY.format(worker_id()), 1, ex=self._interval * HEARTBEAT_MISSES)
+        except (RedisError, AttributeError) as e:
+            LOGGER.warning(f"refresh worker {worker_id()} heartbeat failed: {e}")
+
+    def alive_workers(self, worker_ids):
+        """返回worker_ids中心跳未过期的进程，redis不可用时抛出异常，调用方不能据此判断进程已退出"""
+        worker_ids = list(worker_ids)
+        if not worker_ids:
+            return set()
+        beats = self._redis().mget([HEARTBEAT_KEY.format(item) for item in worker_ids])
+        return {item for item, beat in zip(worker_ids, beats) if beat is not None}
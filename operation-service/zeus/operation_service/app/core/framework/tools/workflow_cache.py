@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+功 能：workflow定义缓存模块
+"""
+import copy
+import hashlib
+import json
+import threading
+import time
+import uuid
+
+from redis import RedisError
+from vulcanus.database.proxy import RedisProxy
+from vulcanus.log.log import LOGGER
+
+from zeus.operation_service.app.constant import SingletonMeta, HOST_REVISIONS, OPERATION_REVISIONS
+from zeus.operation_service.app.settings import configuration
+
+
+def refresh_revisions(kind, ids):
+    """命令、脚本修改或删除后刷新其版本号，引用它们的workflow定义缓存随之失效，kind为command或script"""
+    if not ids:
+        return
+    revision = uuid.uuid4().hex
+    try:
+        RedisProxy.redis_connect.hset(OPERATION_REVISIONS, mapping={f"{kind}:{item}": revision for item in ids})
+    except (RedisError, AttributeError) as e:
+        LOGGER.warning(f"refresh {kind} revisions {ids} failed: {e}")
+
+
+class WorkflowCache(metaclass=SingletonMeta):
+    """
+    子任务workflow定义的缓存，按(任务id, 子任务序号)保存，定时任务周期执行时内容未变化的子任务直接复用，
+    不再查询主机、命令和生成workflow定义。
+    缓存键为task_detail、子任务主机及影响定义的配置，加上所引用主机、命令、脚本在redis中的版本号的摘要：
+    主机连接信息、命令、脚本修改或删除时刷新版本号，缓存键随之变化，不依赖缓存过期时间。
+    redis不可用时不使用缓存；缓存超过task.workflow_cache_ttl秒后淘汰，为0时不缓存
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (task_id, index) -> (缓存键, workflow定义, 过期时间)
+        self._entries = dict()
+
+    @staticmethod
+    def enabled():
+        return configuration.task.workflow_cache_ttl > 0
+
+    def key(self, task, node_indexes, sources):
+        """
+        计算子任务的缓存键，sources为子任务引用的主机、命令、脚本id：{"hosts": [], "commands": [], "scripts": []}；
+        无法读取版本号时返回None
+        """
+        if not self.enabled():
+            return None
+        host_ids = list(sources.get("hosts", []))
+        fields = [f"command:{item}" for item in sources.get("commands", [])] + \
+                 [f"script:{item}" for item in sources.get("scripts", [])]
+        try:
+            pipeline = RedisProxy.redis_connect.pipeline(transaction=False)
+            for name, items in ((HOST_REVISIONS, host_ids), (OPERATION_REVISIONS, fields)):
+                if items:
+                    pipeline.hmget(name, items)
+            revisions = pipeline.execute()
+        except (RedisError, AttributeError) as e:
+            LOGGER.warning(f"read workflow revisions of {task.task_name} failed: {e}")
+            return None
+        content = {
+            "task_type": task.task_type,
+            "task_detail": task.task_detail,
+            "node_indexes": node_indexes,
+            "workflow_mode": configuration.task.workflow_mode,
+            "transfer_mode": configuration.task.transfer_mode,
+            "hosts": host_ids,
+            "operations": fields,
+            "revisions": revisions
+        }
+        return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, task_id, index, key):
+        """缓存键一致时返回workflow定义的副本，执行过程不会修改缓存的定义"""
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get((task_id, index))
+            if entry is None or entry[0] != key or entry[2] < time.monotonic():
+                return None
+            return copy.deepcopy(entry[1])
+
+    def put(self, task_id, index, key, workflow):
+        if key is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for entry_key in [entry_key for entry_key, entry in self._entries.items() if entry[2] < now]:
+                del self._entries[entry_key]
+            self._entries[(task_id, index)] = (key, copy.deepcopy(workflow), now + configuration.task.workflow_cache_ttl)
+
+    def discard(self, task_id):
+        """删除任务的所有缓存，任务删除时调用"""
+        with self._lock:
+            for entry_key in [entry_key for entry_key in self._entries if entry_key[0] == task_id]:
+                del self._entries[entry_key]
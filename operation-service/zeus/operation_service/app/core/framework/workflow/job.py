@@ -1,4 +1,4 @@
-from zeus.operation_service.app.core.framework.common.common_init import init_host_map, init_dependency
+from zeus.operation_service.app.core.framework.common.common_init import init_host_map, init_dependency, init_barrier
 from zeus.operation_service.app.core.framework.workflow.step import Step
 
 
@@ -9,11 +9,16 @@ class Job:
         self.name = job_json.get("name")
         self._hosts_map = init_host_map(job_json, hosts_map)
         self._dependency = init_dependency(job_json)
+        # 流水线模式下job开始前等待所依赖job在所有主机上完成
+        self.barrier = init_barrier(job_json)
         self._steps_map = Job._init_steps(job_json, self.name, self._hosts_map)
 
     def get_steps(self):
         return self._steps_map
 
+    def get_hosts_map(self):
+        return self._hosts_map
+
     def have_dependency(self):
         if len(self._dependency) > 0:
             return True
@@ -28,7 +33,7 @@ class Job:
         steps = {}
         steps_list = job_json.get("steps")
         for step_json in steps_list:
-            step = Step(job_name, step_json, host_map)
+            step = Step(job_name, step_json, host_map, job_json)
             steps[step.name] = step
         return steps
 
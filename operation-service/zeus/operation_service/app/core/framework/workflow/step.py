@@ -1,8 +1,18 @@
-from zeus.operation_service.app.core.framework.common.common_init import init_host_map, init_dependency
+from zeus.operation_service.app.core.framework.common.common_init import init_host_map, init_dependency, init_barrier
+
+# 主机分批执行策略字段，step未配置时继承所属job的配置
+# parallelism: 同时执行的主机数; batch_percent: 每批主机占比(%); max_fail_percent: 允许失败的主机占比(%)，
+# 超过后不再下发剩余主机; per_host_timeout: 单主机执行超时时间(s)
+EXECUTION_POLICY_FIELDS = {
+    "parallelism": int,
+    "batch_percent": float,
+    "max_fail_percent": float,
+    "per_host_timeout": int,
+}
 
 
 class Step:
-    def __init__(self, job_name, step_json, host_map):
+    def __init__(self, job_name, step_json, host_map, job_json=None):
         self.job_name = job_name
         self.name = step_json.get("name")
         self._hosts_map = init_host_map(step_json, host_map)
@@ -11,6 +21,9 @@ class Step:
         self.essential = step_json.get('essential', "False")
         self.ignore_result = step_json.get('ignore_result', "False")
         self.is_depend_self_task = self.is_depend_self_task_other_step()
+        # 流水线模式下step开始前等待所依赖的节点在所有主机上完成
+        self.barrier = init_barrier(step_json)
+        self.execution_policy = Step.init_execution_policy(step_json, job_json or dict())
 
     def get_module(self):
         return self._module
@@ -33,3 +46,12 @@ class Step:
             if depend_step_name_len == 1:
                 return True
         return False
+
+    @staticmethod
+    def init_execution_policy(step_json, job_json):
+        policy = dict()
+        for field, field_type in EXECUTION_POLICY_FIELDS.items():
+            value = step_json.get(field, job_json.get(field))
+            if value is not None and value != "":
+                policy[field] = field_type(value)
+        return policy
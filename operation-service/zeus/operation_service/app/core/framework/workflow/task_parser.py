@@ -12,10 +12,14 @@ class TaskParser:
         self._task_name = ""
         self._params = dict()
         self._hosts = dict()
+        self._mode = None
 
     def parse(self):
         try:
-            if os.path.isfile(self._task_file):
+            if isinstance(self._task_file, dict):
+                # 直接生成的workflow定义，不需要解析
+                self._task_json = self._task_file
+            elif os.path.isfile(self._task_file):
                 with open(self._task_file, "r", encoding="utf-8") as yml_file:
                     self._task_json = yaml.safe_load(yml_file)
             else:
@@ -34,6 +38,7 @@ class TaskParser:
         self._task_name = self._task_json.get("name")
         self._params = self._task_json.get("params")
         self._hosts = self._task_json.get("hosts")
+        self._mode = self._task_json.get("mode")
         return True
 
     def jobs(self):
@@ -51,3 +56,7 @@ class TaskParser:
     def hosts(self):
         """返回hosts的json"""
         return self._hosts
+
+    def mode(self):
+        """返回workflow的调度粒度"""
+        return self._mode
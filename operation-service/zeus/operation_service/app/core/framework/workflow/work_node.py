@@ -1,12 +1,15 @@
 from zeus.operation_service.app.core.framework.Atomic.atomic_integer import AtomicInteger
 from zeus.operation_service.app.core.framework.Atomic.atomic_string import AtomicString
 from zeus.operation_service.app.core.framework.common.result_code import PluginResultCode
+from zeus.operation_service.app.core.framework.task.task_progress import TaskProgress
 from zeus.operation_service.app.core.framework.task_dispatcher import TaskDispatcher
+from zeus.operation_service.app.settings import configuration
 from vulcanus.log.log import LOGGER
 
 
 class WorkNode:
-    def __init__(self, worknode_name, task_id, step):
+    def __init__(self, worknode_name, task_id, step, session_broker=None, hostname=None, checkpoint=None,
+                 cancel_token=None):
         self.name = worknode_name
         self.pre_status = AtomicInteger(0)
         self.status_reason = AtomicString("")
@@ -14,7 +17,10 @@ class WorkNode:
         self._status = "waiting"
         self.step = step
         self.task_id = task_id
-        self._hosts_map = WorkNode.init_hosts_map(step)
+        self.session_broker = session_broker
+        self.checkpoint = checkpoint
+        self.cancel_token = cancel_token
+        self._hosts_map = WorkNode.init_hosts_map(step, hostname)
         self.next_nodes = []
 
     def set_status(self, status):
@@ -26,12 +32,26 @@ class WorkNode:
     def get_status(self):
         return self._status
 
+    def host_count(self):
+        """work node需要执行的主机数，start/end等不执行step的节点为0"""
+        return len(self._hosts_map)
+
     def work(self, handle_result_func):
+        # 任务已取消，尚未开始的step不再下发
+        if self.step and self.cancel_token is not None and self.cancel_token.cancelled:
+            LOGGER.warning(f"{self.name} task cancelled, no execute")
+            TaskProgress().advance(self.task_id, self.host_count())
+            result_msg = dict()
+            result_msg["result_code"] = PluginResultCode.CANCELED
+            result_msg["work_node_name"] = self.name
+            result_msg['errors_info'] = "task cancelled"
+            return handle_result_func(result_msg)
 
         # 如果前置依赖失败且该step不是必须做的时候，直接返回失败
         if self.pre_status.value == -1:
             if (self.step and self.step.essential == "False") or not self.step:
                 LOGGER.warning(f"{self.name} pre status failed, no execute")
+                TaskProgress().advance(self.task_id, self.host_count())
                 result_msg = dict()
                 result_msg["result_code"] = PluginResultCode.PRE_DEPENDENCY_ERROR
                 result_msg["work_node_name"] = self.name
@@ -48,24 +68,23 @@ class WorkNode:
         for item in self._hosts_map.values():
             task_context["hosts"].append(item)
         task_context["task"] = self.step.get_module()
-        task_context["batch_size"] = 5
+        task_context["batch_size"] = configuration.task.batch_size_hosts
         task_context["callback"] = handle_result_func
         task_context["work_node_name"] = self.name
         task_context["task_id"] = self.task_id
-        task_context["timeout"] = 900
+        task_context["session_broker"] = self.session_broker
+        task_context["checkpoint"] = self.checkpoint
+        task_context["cancel_token"] = self.cancel_token
+        task_context["timeout"] = configuration.task.task_timeout
+        task_context.update(self.step.execution_policy)
         # 多个节点批量执行step
         return TaskDispatcher(task_context).run()
 
-    def get_next_free_nodes(self):
-        next_free_nodes = []
-        for dependency_node in self.next_nodes:
-            dependency_node.dependency_account.decrease()
-            if dependency_node.dependency_account.get_value() == 0:
-                next_free_nodes.append(dependency_node)
-        return next_free_nodes
-
     @staticmethod
-    def init_hosts_map(step):
+    def init_hosts_map(step, hostname=None):
         if step is None:
             return {}
+        # 流水线模式下每个work node只在一台主机上执行step
+        if hostname is not None:
+            return {hostname: step.get_hosts_map()[hostname]}
         return step.get_hosts_map()
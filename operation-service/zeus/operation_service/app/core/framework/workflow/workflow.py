@@ -1,35 +1,55 @@
-import copy
 import queue
-import timeit
+import threading
 from abc import ABCMeta, abstractmethod
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from zeus.operation_service.app.core.framework.common.constant import WorkflowMode
 from zeus.operation_service.app.core.framework.common.result_code import PluginResultCode, WorkFlowResultCode
+from zeus.operation_service.app.core.framework.tools.checkpoint import WorkflowCheckpoint
+from zeus.operation_service.app.core.framework.tools.session_broker import SessionBroker
 from zeus.operation_service.app.core.framework.workflow.job import Job
 from zeus.operation_service.app.core.framework.workflow.task_parser import TaskParser
 from zeus.operation_service.app.core.framework.workflow.work_node import WorkNode
 from zeus.operation_service.app.core.framework.workflow.workflow_exception import WorkFlowException
+from zeus.operation_service.app.settings import configuration
 from vulcanus.log.log import LOGGER
 
 
 class WorkFlow:
     __metaclass__ = ABCMeta
 
-    def __init__(self, task_file, task_param):
+    def __init__(self, task_file, task_param, cancel_token=None):
         self._task_file = task_file
         self.task_name = task_param.get("task_name", task_file)
         self.task_id = task_param.get('task_id')
         self._params = dict()
         self._jobs_map = dict()
         self._hosts_map = dict()
-        self.worknode_found = dict()
         self.worknode_map = dict()
-        self._waiting_queue = queue.Queue()
         self.result = queue.Queue()
-        self._get_jobs_number = 0
         self._jobs_number = 0
+        # 调度状态：拓扑序、各节点剩余未完成的前置节点数、已完成节点
+        self._topological_order = list()
+        self._pending_dependency = dict()
+        self._finished_nodes = set()
+        self._finished_number = 0
+        self._schedule_lock = threading.Lock()
+        self._finished_event = threading.Event()
+        self._work_pool = None
+        self._work_futures = list()
+        self._work_exception = None
         self.max_work_jobs = task_param.get("max_work_jobs", 5)
         self.timeout = task_param.get("timeout", 900)
         self.status = WorkFlowResultCode.NORMAL.code
+        self.mode = WorkflowMode.STEP
+        # 同一主机的所有step共用连接，workflow结束时统一归还
+        self.session_broker = SessionBroker()
+        # 记录已执行成功的(work node, 主机)，任务恢复或重试时跳过
+        case_index = task_param.get("case_index")
+        self.checkpoint = WorkflowCheckpoint(self.task_id, case_index) \
+            if self.task_id and case_index is not None else None
+        # 任务取消令牌，取消后未开始的节点不再执行，执行中的节点中断等待
+        self.cancel_token = cancel_token
 
     def parse(self):
         task_parser = TaskParser(self._task_file)
@@ -37,6 +57,7 @@ class WorkFlow:
             LOGGER.error("parse workflow failed")
             raise WorkFlowException(WorkFlowResultCode.ERR_WORKFLOW_PARSE)
         self._params = task_parser.params()
+        self.mode = task_parser.mode() or WorkflowMode.STEP
 
         hosts_json = task_parser.hosts()
         for host_json in hosts_json:
@@ -56,6 +77,7 @@ class WorkFlow:
 
     # 根据Jobs_map生成任务之间的依赖关系，初始化workflow
     def init_workflow(self):
+        job_step_nodes = dict()
         for job_name, job in self._jobs_map.items():
             job_start_name = job_name + ":start"
             job_end_name = job_name + ":end"
@@ -65,9 +87,13 @@ class WorkFlow:
             if len(steps) == 0:
                 LOGGER.error("steps is null")
                 raise WorkFlowException(WorkFlowResultCode.ERR_WORKFLOW_STEPS_NULL)
+            job_step_nodes[job_name] = list()
             for _, step in steps.items():
                 job_step_name = job_name + ":" + step.name
-                self.worknode_map[job_step_name] = WorkNode(job_step_name, self.task_id, step)
+                self.worknode_map[job_step_name] = WorkNode(job_step_name, self.task_id, step, self.session_broker,
+                                                         checkpoint=self.checkpoint,
+                                                         cancel_token=self.cancel_token)
+                job_step_nodes[job_name].append(self.worknode_map[job_step_name])
 
         for job_name, job in self._jobs_map.items():
 
@@ -76,12 +102,15 @@ class WorkFlow:
             for _, step in job.get_steps().items():
                 self._generate_step_dependency(job_name, step)
 
-            # 建立task：end的依赖关系
-            self._generate_job_end_dependency(job_name, job_name + ":start")
+        # 建立task：end的依赖关系，需在所有step依赖建立完成后进行
+        for job_name, step_nodes in job_step_nodes.items():
+            self._generate_job_end_dependency(job_name, step_nodes)
+        if self.mode == WorkflowMode.PIPELINE:
+            self._expand_host_nodes()
         self._jobs_number = len(self.worknode_map)
         for worknode_name, worknode in self.worknode_map.items():
-            LOGGER.info(
-                f"{worknode_name}, next worknodes: {worknode.next_nodes}, dependency count: {worknode.dependency_account.get_value()}")
+            LOGGER.debug(f"{worknode_name}, next worknodes: {[node.name for node in worknode.next_nodes]}, "
+                         f"dependency count: {worknode.dependency_account.get_value()}")
 
     def _generate_jobs_dependency(self, job_name, depend_jobs):
         job_start_name = job_name + ":start"
@@ -116,67 +145,90 @@ class WorkFlow:
             self.worknode_map[job_step_name].dependency_account.increment()
             self.worknode_map[job_start_name].add_next_node(self.worknode_map[job_step_name])
 
-    def _generate_job_end_dependency(self, job_name, worknode_name):
-        job_end_name = job_name + ":end"
-        if worknode_name == job_end_name:
-            return
-
-        have_self_task_step = False
-        for depend_worknode in self.worknode_map[worknode_name].next_nodes:
-            if depend_worknode.name not in self.worknode_found.keys() and depend_worknode.name.split(":")[
-                -2] == job_name:
-                have_self_task_step = True
-                self.worknode_found[depend_worknode.name] = 1
-                self._generate_job_end_dependency(job_name, depend_worknode.name)
+    def _generate_job_end_dependency(self, job_name, step_nodes):
+        """job内没有后继step的节点即为job的出口节点，与job:end建立依赖"""
+        job_end_node = self.worknode_map[job_name + ":end"]
+        job_step_names = set(step_node.name for step_node in step_nodes)
+        for step_node in step_nodes:
+            if any(next_node.name in job_step_names for next_node in step_node.next_nodes):
+                continue
+            job_end_node.dependency_account.increment()
+            step_node.add_next_node(job_end_node)
+
+    def _expand_host_nodes(self):
+        """
+        流水线模式：将每个节点按主机拆分为独立调度的(节点, 主机)单元，依赖按主机建立，
+        某台主机完成前一个step后即可继续执行后续step，不再等待其他主机。
+        后继节点声明了barrier，或前置节点不在该主机上执行时，通过前置节点的汇聚节点(节点名@all)等待所有主机完成
+        """
+        node_hosts = dict()
+        barrier_nodes = set()
+        for job_name, job in self._jobs_map.items():
+            node_hosts[job_name + ":start"] = list(job.get_hosts_map())
+            node_hosts[job_name + ":end"] = list(job.get_hosts_map())
+            if job.barrier:
+                barrier_nodes.add(job_name + ":start")
+            for _, step in job.get_steps().items():
+                node_hosts[job_name + ":" + step.name] = list(step.get_hosts_map())
+                if step.barrier:
+                    barrier_nodes.add(job_name + ":" + step.name)
+
+        host_nodes = dict()
+        for name, work_node in self.worknode_map.items():
+            host_nodes[name] = {
+                hostname: WorkNode(f"{name}@{hostname}", self.task_id, work_node.step, self.session_broker, hostname,
+                                   self.checkpoint, self.cancel_token)
+                for hostname in node_hosts[name]
+            }
+        all_hosts_nodes = dict()
+        for name, work_node in self.worknode_map.items():
+            for next_work_node in work_node.next_nodes:
+                for hostname, next_host_node in host_nodes[next_work_node.name].items():
+                    pre_host_node = host_nodes[name].get(hostname)
+                    if pre_host_node is None or next_work_node.name in barrier_nodes:
+                        pre_host_node = all_hosts_nodes.get(name)
+                        if pre_host_node is None:
+                            pre_host_node = self._generate_all_hosts_node(name, host_nodes[name].values())
+                            all_hosts_nodes[name] = pre_host_node
+                    next_host_node.dependency_account.increment()
+                    pre_host_node.add_next_node(next_host_node)
 
-        if not have_self_task_step:
-            self.worknode_map[job_end_name].dependency_account.increment()
-            self.worknode_map[worknode_name].add_next_node(self.worknode_map[job_end_name])
+        self.worknode_map = dict()
+        for nodes in host_nodes.values():
+            for host_node in nodes.values():
+                self.worknode_map[host_node.name] = host_node
+        for all_hosts_node in all_hosts_nodes.values():
+            self.worknode_map[all_hosts_node.name] = all_hosts_node
+
+    def _generate_all_hosts_node(self, name, host_nodes):
+        all_hosts_node = WorkNode(f"{name}@all", self.task_id, None)
+        for host_node in host_nodes:
+            all_hosts_node.dependency_account.increment()
+            host_node.add_next_node(all_hosts_node)
+        return all_hosts_node
 
     def validate_workflow(self):
-        # 可能存在一开始就有依赖的情况
-        if not self._waiting_queue:
-            LOGGER.error(f"{self._waiting_queue} is null")
+        """
+        Kahn算法拓扑排序：依次摘除入度为0的节点，排序结束后仍有节点未被摘除说明存在环
+        （包括不与其他job相连的单独闭环），排序结果供执行阶段确定初始可执行节点
+        """
+        in_degree = {name: work_node.dependency_account.get_value() for name, work_node in self.worknode_map.items()}
+        ready_nodes = deque(name for name, degree in in_degree.items() if degree == 0)
+        topological_order = list()
+        while ready_nodes:
+            work_node_name = ready_nodes.popleft()
+            topological_order.append(work_node_name)
+            for next_work_node in self.worknode_map[work_node_name].next_nodes:
+                in_degree[next_work_node.name] -= 1
+                if in_degree[next_work_node.name] == 0:
+                    ready_nodes.append(next_work_node.name)
+        if len(topological_order) != len(self.worknode_map):
+            circle_nodes = [name for name, degree in in_degree.items() if degree > 0]
+            LOGGER.error(f"{circle_nodes[:10]} get circle, {len(circle_nodes)} work nodes in total")
             return False
-        work_node_back = queue.Queue()
-        queue_size = self._waiting_queue.qsize()
-        waitting_queue = queue.Queue()
-        checked_node = dict()
-        for i in range(0, queue_size):
-            work_node = self._waiting_queue.get()
-            waitting_queue.put(work_node)
-            self._waiting_queue.put(work_node)
-        while not waitting_queue.empty():
-            work_node = waitting_queue.get()
-            checked_node[work_node.name] = True
-            for next_work_node in work_node.next_nodes:
-                if checked_node.get(next_work_node.name):
-                    LOGGER.error(f"{next_work_node.name} get circle")
-                    return False
-                work_node_back.put(next_work_node)
-                next_work_node.dependency_account.decrease()
-                if next_work_node.dependency_account.get_value() == 0:
-                    waitting_queue.put(next_work_node)
-        # 可能存在单独闭环的job，以搜索过的work_node节点判断，如果存在未搜索过的节点，则存在单独闭环的job
-        for work_node_name in self.worknode_map.keys():
-            if work_node_name not in checked_node.keys():
-                LOGGER.error(f"{work_node_name} not in flow")
-                return False
-        self.rollback_dependency_count(work_node_back)
+        self._topological_order = topological_order
         return True
 
-    @staticmethod
-    def rollback_dependency_count(work_node_queue: queue.Queue):
-        while not work_node_queue.empty():
-            work_node = work_node_queue.get()
-            work_node.dependency_account.increment()
-
-    def init_queue(self):
-        for _, worknode in self.worknode_map.items():
-            if worknode.dependency_account.get_value() == 0:
-                LOGGER.warning(f"queue_init: {worknode.name}")
-                self._waiting_queue.put(worknode)
-
     def _start_before(self):
         """workflow开始执行前操作"""
         pass
@@ -201,6 +253,11 @@ class WorkFlow:
     def _handle_result(self, result_msg):
         work_node_name = result_msg["work_node_name"]
         work_node = self.worknode_map[work_node_name]
+        with self._schedule_lock:
+            if work_node_name in self._finished_nodes:
+                LOGGER.warning(f"work node: {work_node_name} result already handled")
+                return result_msg
+            self._finished_nodes.add(work_node_name)
         if result_msg["result_code"] == PluginResultCode.PRE_DEPENDENCY_ERROR:
             work_node.set_status('failed')
 
@@ -208,6 +265,15 @@ class WorkFlow:
             for next_work_node in work_node.next_nodes:
                 next_work_node.pre_status.set_value(-1)
                 next_work_node.status_reason.set_value(work_node.status_reason.value)
+        elif result_msg["result_code"] == PluginResultCode.CANCELED:
+            # 任务取消不按step失败处理，后续节点在执行前检查取消令牌直接结束
+            work_node.set_status('canceled')
+            work_node.status_reason.set_value(result_msg["errors_info"])
+            self.status = WorkFlowResultCode.ERR_WORKFLOW_CANCELED.code
+            for next_work_node in work_node.next_nodes:
+                next_work_node.pre_status.set_value(-1)
+                next_work_node.status_reason.set_value(work_node_name + ' canceled')
+            LOGGER.warning(f"{work_node_name} canceled")
         elif result_msg["result_code"] == PluginResultCode.SUCCESS or (result_msg["result_code"] != PluginResultCode.SUCCESS and work_node.step.ignore_result):
             work_node.set_status('success')
             work_node.status_reason.set_value('ok')
@@ -224,52 +290,87 @@ class WorkFlow:
             self._handle_error_result(result_msg)
             LOGGER.warning(f"{work_node_name} execute failed, error: {result_msg['errors_info']}")
 
-        # 获取下一批可执行的work nodes
-        next_free_work_nodes = work_node.get_next_free_nodes()
-        if len(next_free_work_nodes) == 0:
-            return result_msg
-        for next_work_node in next_free_work_nodes:
-            LOGGER.warning(f"put next work nodes: {next_work_node.name}")
-            self._waiting_queue.put(next_work_node)
+        self.result.put(result_msg)
+        # 前置节点全部完成的后继节点立即提交执行
+        next_free_work_nodes = list()
+        with self._schedule_lock:
+            for next_work_node in work_node.next_nodes:
+                self._pending_dependency[next_work_node.name] -= 1
+                if self._pending_dependency[next_work_node.name] == 0:
+                    next_free_work_nodes.append(next_work_node)
+            self._finished_number += 1
+            all_finished = self._finished_number == self._jobs_number
+        self._submit(next_free_work_nodes)
+        if all_finished:
+            self._finished_event.set()
         return result_msg
 
+    def _submit(self, work_nodes):
+        for work_node in work_nodes:
+            # start/end等不执行step的节点直接在当前线程完成，不占用线程池
+            if work_node.step is None:
+                work_node.work(self._handle_result)
+                continue
+            LOGGER.info(f"submit work node: {work_node.name}")
+            try:
+                future = self._work_pool.submit(work_node.work, self._handle_result)
+            except RuntimeError:
+                # workflow超时后线程池已关闭，不再提交后续节点
+                LOGGER.warning(f"{self.task_name} work pool is shutdown, {work_node.name} not submitted")
+                return
+            self._work_futures.append(future)
+            future.add_done_callback(self._check_work_exception)
+
+    def _check_work_exception(self, future):
+        """work node执行抛出异常时不会再回调结果，直接结束workflow"""
+        if future.cancelled() or future.exception() is None:
+            return
+        self._work_exception = future.exception()
+        self._finished_event.set()
+
     # 运行前的准备动作
     def init(self):
         self.parse()
         LOGGER.info(f"{self.task_name} parse successfully")
         self.init_workflow()
         LOGGER.info(f"{self.task_name} workflow init successfully")
-        self.init_queue()
-        LOGGER.info(f"{self.task_name} queue init successfully")
         if not self.validate_workflow():
             raise WorkFlowException(WorkFlowResultCode.ERR_WORKFLOW_CIRCLE)
         LOGGER.info("workflow check successfully")
 
     def start(self):
-        work_pool = ThreadPoolExecutor(max_workers=self.max_work_jobs)
-        start_time = timeit.default_timer()
-        all_tasks = list()
+        """
+        事件驱动执行：先提交所有入度为0的节点，之后每个节点完成时在结果回调中提交前置节点已全部完成的后继节点，
+        主线程只等待全部节点完成或超时
+        """
+        # 流水线模式下每个work node只在一台主机上执行，线程池大小即同时执行的主机数
+        max_workers = self.max_work_jobs
+        if self.mode == WorkflowMode.PIPELINE:
+            max_workers = max(max_workers, configuration.task.pipeline_max_hosts)
+        self._work_pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._pending_dependency = {name: work_node.dependency_account.get_value()
+                                    for name, work_node in self.worknode_map.items()}
         try:
-            while True:
-                timeout_time = self.timeout - (timeit.default_timer() - start_time)
-                if timeout_time < 0:
-                    LOGGER.error(f"{self.task_name} execute timeout, begin to shutdown pool")
-                    raise WorkFlowException(WorkFlowResultCode.ERR_WORKFLOW_TIMEOUT)
-                work_node = self._waiting_queue.get(timeout=timeout_time)
-                self._get_jobs_number += 1
-                LOGGER.warning(
-                    f"get work_node: {work_node.name}, get jobs number: {self._get_jobs_number}, all jobs number: {self._jobs_number}")
-                all_tasks.append(work_pool.submit(work_node.work, self._handle_result))
-                if self._get_jobs_number == self._jobs_number:
-                    LOGGER.warning("get all jobs, wait for all jobs result")
-                    timeout_time = self.timeout - (timeit.default_timer() - start_time)
-                    for task in as_completed(all_tasks, timeout=timeout_time):
-                        self.result.put(task.result(timeout=timeout_time))
-                    LOGGER.warning(f"{self.task_name} execute successfully")
-                    break
+            self._submit([self.worknode_map[name] for name in self._topological_order
+                          if self._pending_dependency[name] == 0])
+            if not self._finished_event.wait(timeout=self.timeout):
+                LOGGER.error(f"{self.task_name} execute timeout, begin to shutdown pool")
+                raise WorkFlowException(WorkFlowResultCode.ERR_WORKFLOW_TIMEOUT)
+            if self._work_exception is not None:
+                raise self._work_exception
+            LOGGER.warning(f"{self.task_name} execute successfully")
         finally:
-            LOGGER.warning(f"{self.task_name} shutdown pool:{id(work_pool)}")
-            work_pool.shutdown(wait=False)
+            LOGGER.warning(f"{self.task_name} shutdown pool:{id(self._work_pool)}")
+            # 超时或异常结束时未开始的节点不再执行，仍在执行的节点可能还在使用连接，连接关闭而不归还连接池
+            self._work_pool.shutdown(wait=False, cancel_futures=True)
+            drained = all(future.done() for future in list(self._work_futures))
+            self.session_broker.close(discard=not drained)
+            if self.checkpoint is not None:
+                self.checkpoint.close()
+
+    def host_work_count(self):
+        """workflow需要执行的(work node, 主机)总数，用于计算任务进度"""
+        return sum(work_node.host_count() for work_node in self.worknode_map.values())
 
     def get_result_from_queue(self, worknode_name):
         my_list = list(self.result.queue)
@@ -1,5 +1,6 @@
 import os
 import traceback
+from redis import RedisError
 from vulcanus.log.log import LOGGER
 from vulcanus.database.proxy import MysqlProxy
 
@@ -7,11 +8,16 @@ from zeus.operation_service.database import Task
 from zeus.operation_service.app.proxy.task import TaskProxy
 from zeus.operation_service.app.core.framework.task.task_factory.task_factory import TaskFactory
 from zeus.operation_service.app.core.framework.task.task_pool import TaskPool
+from zeus.operation_service.app.core.framework.task.task_shard import ShardedTask
+from zeus.operation_service.app.core.framework.tools.cancellation import CancellationRegistry
+from zeus.operation_service.app.core.framework.tools.checkpoint import WorkflowCheckpoint
+from zeus.operation_service.app.core.framework.tools.shard_channel import ShardChannel
+from zeus.operation_service.app.core.framework.tools.host_status import HostStatusRecorder
 from zeus.operation_service.app.core.framework.common.result_code import TaskResultCode 
-from zeus.operation_service.app.core.framework.common.constant import TaskType
 from zeus.operation_service.app.core.file_util import FileUtil
 from zeus.operation_service.app.core.task_exception import TaskException
 from zeus.operation_service.app.constant import TaskOperationResultCode, WORK_DIR, RESULTS_DIR
+from zeus.operation_service.app.settings import configuration
 from vulcanus.restful.resp.state import (
     SUCCEED,
     NO_DATA,
@@ -26,20 +32,18 @@ class TaskManager():
     def __init__(self) -> None:
         self.mysql_session = MysqlProxy()
 
-    def do_action(self, task_id, action):
+    def do_action(self, task_id, action, params=None):
         action_map = {
             "start": self.start_task,
             "retry": self.retry_task,
             "cancel": self.cancel_task
         }
-        return action_map[action](task_id, {})
+        return action_map[action](task_id, params or {})
 
-    def start_task(self, task_id, params: dict, reset_task_status=True):
+    def start_task(self, task_id, params: dict, reset_task_status=True, resume=False):
         """
-        1.获取hosts
-        2.获取资产包
-        3.获取巡检项
-        4.构建下发数据
+        任务置为等待状态后由任务池按优先级调度执行
+        resume为True时保留检查点，已执行成功的(work node, 主机)不再执行
         """
         task_proxy = TaskProxy()
         task_proxy.connect()
@@ -48,51 +52,90 @@ class TaskManager():
         if not task:
             return NO_DATA, None
 
-        params['task_pool_timeout'] = 300
-        params['max_running_task'] = 5
-        params['task_timeout'] = 900
+        # 任务已在等待队列中
+        if task.status == TaskResultCode.WAITING.code:
+            return SUCCEED, None
+        task_pool = TaskPool()
+        if not task_pool.admit():
+            LOGGER.error(f"waiting tasks exceed {configuration.task.max_task_number_in_task_pool}, "
+                         f"reject task: {task.task_name}")
+            return TASK_START_FAILED, task.task_name
+        if not resume:
+            WorkflowCheckpoint.clear(task_id)
+            HostStatusRecorder.clear(task_id)
+        if reset_task_status:
+            task_proxy.reset_task_status(task_id)
+        task_proxy.set_wait_status(task_id)
+        task_pool.start()
+        task_pool.notify()
+        return SUCCEED, None
+
+    def prepare_task(self, task_id):
+        """
+        任务出队后生成待执行的子任务，返回各子任务准备完成的Future
+        1.获取hosts
+        2.获取资产包
+        3.获取巡检项
+        4.构建下发数据
+        """
+        task_proxy = TaskProxy()
+        task: Task = task_proxy.get_task_by_id(task_id)
+        params = dict()
+        params['task_timeout'] = configuration.task.task_timeout
         params['task_id'] = task.task_id
-        
+        task_upload_path = os.path.join(RESULTS_DIR, task.task_type, task.task_id)
+        work_path = os.path.join(WORK_DIR, task.task_id)
+        # 从检查点恢复时保留已成功主机的执行结果
+        resume = WorkflowCheckpoint.exists(task_id)
+
         try:
-            task_upload_path = os.path.join(RESULTS_DIR, task.task_type, task.task_id)
-            if os.path.exists(task_upload_path):
+            if not resume and os.path.exists(task_upload_path):
                 FileUtil.dir_remove(task_upload_path)
-            os.makedirs(task_upload_path, exist_ok=False)
-            work_path = os.path.join(WORK_DIR, task.task_id)
-            if os.path.exists(work_path):
-                FileUtil.dir_remove(work_path)
-            os.makedirs(work_path, exist_ok=False)
+            os.makedirs(task_upload_path, exist_ok=True)
+            # 工作目录只保存用于定位问题的workflow.yaml，按需创建
+            FileUtil.dir_remove(work_path)
             LOGGER.info(f"starting task: {task.task_name}")
 
-            tasks = TaskFactory.get_tasks_with_task_type(task=task, params=params)
+            # 主机数超过task.shard_size时分片到各进程执行，由协调者代替子任务在任务池中执行
+            if ShardedTask.enabled(task):
+                tasks = [ShardedTask.prepare(task)]
+            else:
+                tasks = TaskFactory.get_tasks_with_task_type(task=task, params=params)
         except Exception as e:
             LOGGER.error(traceback.print_exc())
-            FileUtil.dir_remove(task_upload_path)
+            if not resume:
+                FileUtil.dir_remove(task_upload_path)
             FileUtil.dir_remove(work_path)
-            return TASK_START_FAILED, task.task_name
-        if reset_task_status:
-            task_proxy.reset_task_status(task_id)
-        task_proxy.set_wait_status(task_id)
-        LOGGER.warning(f"task pool timeout: {params['task_timeout']}s")
-        for each_task in tasks:
-            TaskPool(max_running_job=params['max_running_task'], timeout=params['task_timeout']).submit_task(each_task)
-        return SUCCEED, None
+            task_proxy.set_failed_status(task_id, TaskResultCode.FAILED.code)
+            return None
+        return tasks
 
 
     def retry_task(self, task_id, params: dict):
+        """
+        重新执行任务，默认重新执行所有主机；
+        params中resume为True时从检查点恢复，只重新执行上次失败和未执行的(work node, 主机)
+        """
         task = TaskProxy().get_task_by_id(task_id)
         if task.status == TaskResultCode.RUNNING.code or task.status == TaskResultCode.WAITING.code:
             return TASK_RETRY_RUNNING_TASK_ERROR, task.task_name
-        if task.task_type == TaskType.COMMAND_EXECUTION:
-            FileUtil.dir_remove(os.path.join(RESULTS_DIR, task.task_type, task.task_id))
-        return self.start_task(task_id, params)
+        return self.start_task(task_id, params, resume=bool(params.get("resume")))
 
 
     def cancel_task(self, task_id, params: dict):
         task = TaskProxy().get_task_by_id(task_id)
         LOGGER.info(f"task.status:{task.status}")
-        if task.status == TaskResultCode.RUNNING.code:
+        # 等待中的任务取消后不会再被任务池取出
+        if task.status in (TaskResultCode.RUNNING.code, TaskResultCode.WAITING.code):
             TaskProxy().cancel_task(task_id)
+            # 执行中的任务通过取消令牌中断正在下发的主机和等待中的命令
+            CancellationRegistry().cancel(task_id)
+            if configuration.task.shard_size > 0:
+                # 分片可能在其他进程中执行
+                try:
+                    ShardChannel.cancel(task_id)
+                except RedisError as e:
+                    LOGGER.error(f"notify shards of {task.task_name} to cancel failed: {e}")
             LOGGER.info(f"{params.get('user')} cancel task")
             return SUCCEED, None
         else:
@@ -102,4 +145,4 @@ class TaskManager():
 
     def recover_task(self, task_id, params: dict):
         params['recover'] = True
-        return self.start_task(task_id, params, False)
\ No newline at end of file
+        return self.start_task(task_id, params, False, resume=True)
\ No newline at end of file
@@ -19,6 +19,7 @@ from vulcanus.restful.resp.state import (
 )
 from zeus.operation_service.app.serialize.command import GetCommandPage_ResponseSchema
 from zeus.operation_service.database import Command
+from zeus.operation_service.app.core.framework.tools.workflow_cache import refresh_revisions
 
 class CommandProxy(MysqlProxy):
 
@@ -73,6 +74,7 @@ class CommandProxy(MysqlProxy):
                     continue
                 self.session.delete(command)
                 self.session.commit()
+                refresh_revisions("command", [command_id])
                 LOGGER.info(f"Command {command_id} delete succeed ")
             except sqlalchemy.exc.SQLAlchemyError as error:
                 LOGGER.error(error)
@@ -101,6 +103,7 @@ class CommandProxy(MysqlProxy):
         try:
             modified_rows = self.session.query(Command).filter_by(command_id = command_id).update(data)
             self.session.commit()
+            refresh_revisions("command", [command_id])
             if modified_rows != 1:
                 LOGGER.info("update command [%s] failed", data['command_name'])
                 return DATABASE_UPDATE_ERROR, None
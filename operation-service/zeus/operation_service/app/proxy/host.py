@@ -10,24 +10,41 @@
 # PURPOSE.
 # See the Mulan PSL v2 for more details.
 # ******************************************************************************/
+from functools import lru_cache
+
 from vulcanus.restful.resp import state
 from vulcanus.restful.response import BaseResponse
 from vulcanus.rsa import load_private_key, sign_data
 from vulcanus.conf.constant import HOSTS, HOSTS_FILTER, ADMIN_USER
+from vulcanus.log.log import LOGGER
 from zeus.operation_service.app.settings import configuration
 from flask import g
 from urllib.parse import urlencode
 from zeus.operation_service.app import cache
 
+# 批量查询主机时每次请求的主机数，主机信息服务单次最多接受1000台
+HOST_BATCH_QUERY_SIZE = 500
+
+
+@lru_cache(maxsize=4)
+def _load_cluster_key(private_key):
+    """集群私钥只解析一次，后续请求直接用于签名"""
+    return load_private_key(private_key)
+
+
 class HostProxy:
     """
     Host related table operation
     """
 
+    @staticmethod
+    def _headers(params):
+        signature = sign_data(params, _load_cluster_key(cache.location_cluster.get("private_key")))
+        return {"X-Permission": "RSA", "X-Signature": signature, "X-Cluster-Username": ADMIN_USER}
+
     def get_host_by_id(self, host_id) -> dict:
 
-        signature = sign_data({}, load_private_key(cache.location_cluster.get("private_key")))
-        headers = {"X-Permission": "RSA", "X-Signature": signature, "X-Cluster-Username": ADMIN_USER}
+        headers = self._headers({})
 
         url = f"http://{configuration.domain}{HOSTS}/{host_id}"
         response = BaseResponse.get_response(method="GET", url=url, header=headers)
@@ -42,8 +59,7 @@ class HostProxy:
             "host_ids": [host_id]
             }
 
-        signature = sign_data(params, load_private_key(cache.location_cluster.get("private_key")))
-        headers = {"X-Permission": "RSA", "X-Signature": signature, "X-Cluster-Username": ADMIN_USER}
+        headers = self._headers(params)
 
         url = f"http://{configuration.domain}{HOSTS_FILTER}?{urlencode(params)}"
         response = BaseResponse.get_response(method="GET", url=url, header=headers)
@@ -52,3 +68,23 @@ class HostProxy:
             return ""
         host_info = response.get("data")[0]
         return host_info.get("pkey")
+
+    def get_hosts_by_ids(self, host_ids) -> tuple:
+        """
+        批量查询主机信息，包括ssh登录用户、端口和私钥，每HOST_BATCH_QUERY_SIZE台主机一次请求
+        返回 (host_id -> 主机信息, 查询请求失败的host_id集合)，查询成功但不存在的主机两者都不包含
+        """
+        hosts = dict()
+        failed_host_ids = set()
+        host_ids = list(dict.fromkeys(host_ids))
+        url = f"http://{configuration.domain}{HOSTS}/batch_query"
+        for index in range(0, len(host_ids), HOST_BATCH_QUERY_SIZE):
+            params = {"host_ids": host_ids[index:index + HOST_BATCH_QUERY_SIZE]}
+            response = BaseResponse.get_response(method="POST", url=url, data=params, header=self._headers(params))
+            if response.get("label") != state.SUCCEED:
+                LOGGER.error(f"batch query {len(params['host_ids'])} hosts failed: {response.get('label')}")
+                failed_host_ids.update(params["host_ids"])
+                continue
+            for host in (response.get("data") or {}).get("hosts", []):
+                hosts[host["host_id"]] = host
+        return hosts, failed_host_ids
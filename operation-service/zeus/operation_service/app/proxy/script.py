@@ -26,6 +26,7 @@ from zeus.operation_service.database import Script, TaskOperate, OperateScript,
 from zeus.operation_service.app.constant import SCRIPTS_DIR
 from zeus.operation_service.app.settings import configuration
 from zeus.operation_service.app.core.file_util import U_RW
+from zeus.operation_service.app.core.framework.tools.workflow_cache import refresh_revisions
 from flask import request
 
 class ScriptProxy(MysqlProxy):
@@ -89,7 +90,9 @@ class ScriptProxy(MysqlProxy):
         script = self.session.query(Script).filter_by(script_id = script_id)
         if not script:
             return PARAM_ERROR
-        return self._save_file(script_id)
+        status_code = self._save_file(script_id)
+        refresh_revisions("script", [script_id])
+        return status_code
         
 
     def batch_delete_script(self, script_ids):
@@ -111,6 +114,7 @@ class ScriptProxy(MysqlProxy):
                 save_file_dir = os.path.join(SCRIPTS_DIR, script_id)
                 if os.path.exists(save_file_dir):
                     shutil.rmtree(save_file_dir)
+                refresh_revisions("script", [script_id])
                 LOGGER.info(f"Script {script_id} delete succeed ")
             except sqlalchemy.exc.SQLAlchemyError as error:
                 LOGGER.error(error)
@@ -143,6 +147,7 @@ class ScriptProxy(MysqlProxy):
                 self.session.query(OperateScript).filter_by(script_id = script_id).update({"operate_id": operate_id})
             modified_rows = self.session.query(Script).filter_by(script_id = script_id).update(data)
             self.session.commit()
+            refresh_revisions("script", [script_id])
             if modified_rows != 1:
                 LOGGER.info("update script [%s] failed", data['script_name'])
                 return DATABASE_UPDATE_ERROR, None
@@ -22,11 +22,15 @@ from vulcanus.restful.resp.state import (
 )
 from zeus.operation_service.app.serialize.task import GetTaskPage_ResponseSchema
 from zeus.operation_service.database import Task, TaskOperate, TaskHost, TaskCommand
-from zeus.operation_service.app.core.framework.common.constant import TaskType
+from zeus.operation_service.app.core.framework.common.constant import TaskType, TaskPriority
 from zeus.operation_service.app.constant import Shcheduler
 
 from zeus.operation_service.app.core.framework.common.result_code import TaskResultCode
 from zeus.operation_service.app.core.framework.task.task_detail.task_detail_context import TaskDetailContext
+from zeus.operation_service.app.core.framework.tools.checkpoint import WorkflowCheckpoint
+from zeus.operation_service.app.core.framework.tools.workflow_cache import WorkflowCache
+from zeus.operation_service.app.core.framework.tools.host_status import HostStatusRecorder
+from zeus.operation_service.app.core.framework.task.task_progress import TaskProgress
 
 
 def sche_job(task_id, action):
@@ -66,8 +70,19 @@ class TaskProxy(MysqlProxy):
         )
         result['total_page'] = total_page
         result['task_infos'] = GetTaskPage_ResponseSchema(many=True).dump(processed_query.all())
+        for task_info in result['task_infos']:
+            self.apply_running_status(task_info)
         return result
 
+    @staticmethod
+    def apply_running_status(task_info):
+        """本进程执行中的任务以内存中的状态和进度为准，数据库中的进度按刷新周期延迟写入"""
+        task_status = TaskProgress().get(task_info.get("task_id"))
+        if task_status is not None:
+            task_info["status"] = task_status.status
+            task_info["progress"] = task_status.progress
+        return task_info
+
     def get_tasks(self, task_page_filter):
         """
         Get host according to host group from table
@@ -148,7 +163,8 @@ class TaskProxy(MysqlProxy):
                                   task_type=data['task_type'],
                                   task_id=task_id, 
                                   task_detail=task_detail, 
-                                  task_total=task_total))
+                                  task_total=task_total,
+                                  priority=data.get('priority', TaskPriority.NORMAL)))
             if scheduler_info:
                 self.add_task_sheduler(scheduler_info, task_id)
             self.session.commit()
@@ -199,6 +215,9 @@ class TaskProxy(MysqlProxy):
                 self.delete_task_associations(task_id)
                 self.session.delete(task)
                 self.session.commit()
+                WorkflowCheckpoint.clear(task_id)
+                HostStatusRecorder.clear(task_id)
+                WorkflowCache().discard(task_id)
                 LOGGER.info(f"Task {task_id} delete succeed ")
             except sqlalchemy.exc.SQLAlchemyError as error:
                 LOGGER.error(error)
@@ -240,6 +259,18 @@ class TaskProxy(MysqlProxy):
 
     def get_task_by_id(self, task_id):
         return self.session.query(Task).get(task_id)
+
+    def get_task_status(self, task_id):
+        """
+        只查询任务状态和进度，供结果流轮询使用：本进程执行中的任务直接读取内存，不访问数据库；
+        查询数据库后结束事务，否则同一会话的后续查询仍读取REPEATABLE READ下事务开始时的快照，看不到其他会话提交的状态
+        """
+        task_status = TaskProgress().get(task_id)
+        if task_status is not None:
+            return task_status
+        task_status = self.session.query(Task.status, Task.progress).filter(Task.task_id == task_id).first()
+        self.session.commit()
+        return task_status
     
     def get_commands(self, task_id):
         commands = self.session.query(TaskCommand).filter(TaskCommand.task_id == task_id).all()
@@ -247,8 +278,45 @@ class TaskProxy(MysqlProxy):
 
     def set_wait_status(self, task_id):
         self.session.query(Task).filter(Task.task_id == task_id).update(
-            {'status': TaskResultCode.WAITING.code, 'progress': 0.0, 'end_time': None})
+            {'status': TaskResultCode.WAITING.code, 'progress': 0.0, 'end_time': None, 'queue_time': datetime.now()})
+        self.session.commit()
+
+    def count_waiting_tasks(self):
+        return self.session.query(Task).filter(Task.status == TaskResultCode.WAITING.code).count()
+
+    def get_waiting_tasks(self, limit, exclude_task_ids=None):
+        """按优先级从高到低、入队时间从早到晚获取等待执行的任务"""
+        query = self.session.query(Task).filter(Task.status == TaskResultCode.WAITING.code)
+        if exclude_task_ids:
+            query = query.filter(Task.task_id.notin_(exclude_task_ids))
+        return query.order_by(Task.priority.desc(), Task.queue_time.asc()).limit(limit).all()
+
+    def claim_waiting_task(self, task_id, owner):
+        """将等待中的任务置为运行状态并记录执行进程，任务已被取消或已被取出时返回False"""
+        claimed = self.session.query(Task).filter(
+            Task.task_id == task_id, Task.status == TaskResultCode.WAITING.code).update(
+            {'status': TaskResultCode.RUNNING.code, 'start_time': datetime.now(), 'owner': owner},
+            synchronize_session=False)
+        self.session.commit()
+        return claimed == 1
+
+    def get_running_task_owners(self):
+        """运行中任务的执行进程，升级前取出的任务没有记录执行进程，为None"""
+        owners = self.session.query(Task.owner).filter(Task.status == TaskResultCode.RUNNING.code).distinct().all()
+        self.session.commit()
+        return [owner for owner, in owners]
+
+    def set_interrupted_tasks_status(self, owners):
+        """执行进程已退出的运行中任务已中断，置为服务重启状态"""
+        owners = list(owners)
+        conditions = [Task.owner.in_([owner for owner in owners if owner is not None])]
+        if None in owners:
+            conditions.append(Task.owner.is_(None))
+        interrupted = self.session.query(Task).filter(
+            Task.status == TaskResultCode.RUNNING.code, sqlalchemy.or_(*conditions)).update(
+            {'status': TaskResultCode.SERVER_RESTART.code, 'end_time': datetime.now()}, synchronize_session=False)
         self.session.commit()
+        return interrupted
 
     def set_running_status(self, task_id):
         self.session.query(Task).filter(Task.task_id == task_id).update(
@@ -256,15 +324,35 @@ class TaskProxy(MysqlProxy):
         self.session.commit()
 
     def set_failed_status(self, task_id, error_code):
-        self.session.query(Task).filter(Task.task_id == task_id).update(
+        TaskProgress().set_status(task_id, error_code)
+        # 已取消的任务在中断过程中产生的失败不覆盖取消状态
+        self.session.query(Task).filter(Task.task_id == task_id, Task.status != TaskResultCode.CANCELED.code).update(
             {'status': error_code, 'end_time': datetime.now()})
         self.session.commit()
 
     def update_progress(self, task_id, progress):
-        task = self.session.query(Task).filter(Task.task_id == task_id).first()
-        if task.status == TaskResultCode.RUNNING.code:
-            task.progtess = progress
-            self.session.commit()
+        self.update_progresses({task_id: progress})
+
+    def update_progresses(self, progresses):
+        """批量更新运行中任务的进度，所有任务的更新在一次提交中完成"""
+        for task_id, progress in progresses.items():
+            self.session.query(Task).filter(
+                Task.task_id == task_id, Task.status == TaskResultCode.RUNNING.code).update(
+                {'progress': progress}, synchronize_session=False)
+        self.session.commit()
+
+    def set_success_status(self, task_id):
+        """
+        运行中的任务置为成功，已失败或已取消的任务不受影响；
+        任务成功后清除检查点，再次重试或恢复时重新执行所有主机
+        """
+        succeeded = self.session.query(Task).filter(
+            Task.task_id == task_id, Task.status == TaskResultCode.RUNNING.code).update(
+            {'status': TaskResultCode.SUCCESS.code, 'end_time': datetime.now(), 'progress': 1.0},
+            synchronize_session=False)
+        self.session.commit()
+        if succeeded:
+            WorkflowCheckpoint.clear(task_id)
 
     def reset_task_status(self, task_id):
         self.session.query(Task).filter(Task.task_id == task_id).update(
@@ -276,6 +364,7 @@ class TaskProxy(MysqlProxy):
         self.session.commit()
 
     def cancel_task(self, task_id):
+        TaskProgress().set_status(task_id, TaskResultCode.CANCELED.code)
         self.session.query(Task).filter(Task.task_id == task_id).update(
             {'status': TaskResultCode.CANCELED.code, 'progress': 0.0, 'end_time': None})
         self.session.commit()
\ No newline at end of file
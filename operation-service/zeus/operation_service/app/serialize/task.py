@@ -22,6 +22,40 @@ class AddTaskSchema(Schema):
     scheduler_info = fields.Dict()
     only_push = fields.Bool(required=False)
     remote_path = fields.String(required=False)
+    exec_mode = fields.String(required=False, validate=validate.OneOf(["pty", "exec"]))
+    parallelism = fields.Integer(required=False, validate=lambda s: s > 0)
+    batch_percent = fields.Float(required=False, validate=lambda s: 100.0 >= s > 0.0)
+    max_fail_percent = fields.Float(required=False, validate=lambda s: 100.0 >= s >= 0.0)
+    per_host_timeout = fields.Integer(required=False, validate=lambda s: s > 0)
+    transfer_mode = fields.String(required=False, validate=validate.OneOf(["file", "bundle"]))
+    workflow_mode = fields.String(required=False, validate=validate.OneOf(["step", "pipeline"]))
+    priority = fields.Integer(required=False, validate=lambda s: 9 >= s >= 0)
+
+class TaskResultStreamSchema(Schema):
+    status_offset = fields.Integer(required=False, missing=0, validate=lambda s: s >= 0)
+    offsets = fields.String(required=False, missing="")
+
+class TaskResultSchema(Schema):
+    task_id = fields.String(required=True, validate=lambda s: 0 < len(s) <= 36)
+    node_index = fields.Integer(required=True, validate=lambda s: s >= 0)
+    offset = fields.Integer(required=False, validate=lambda s: s >= 0)
+    size = fields.Integer(required=False, validate=lambda s: s > 0)
+    tail = fields.Integer(required=False, validate=lambda s: s >= 0)
+    pattern = fields.String(required=False, validate=lambda s: 0 < len(s) <= 1024)
+    regex = fields.Boolean(required=False, missing=False)
+    ignore_case = fields.Boolean(required=False, missing=False)
+    max_matches = fields.Integer(required=False, validate=lambda s: s > 0)
+
+class TaskResultSearchSchema(Schema):
+    task_id = fields.String(required=True, validate=lambda s: 0 < len(s) <= 36)
+    pattern = fields.String(required=True, validate=lambda s: 0 < len(s) <= 1024)
+    regex = fields.Boolean(required=False, missing=False)
+    ignore_case = fields.Boolean(required=False, missing=False)
+    node_index = fields.Integer(required=False, missing=0, validate=lambda s: s >= 0)
+    offset = fields.Integer(required=False, missing=0, validate=lambda s: s >= 0)
+
+class TaskResultGroupsSchema(Schema):
+    work_node_name = fields.String(required=False, validate=lambda s: len(s) <= 255)
 
 class ModifyTaskSchedulerSchema(Schema):
     task_id = fields.String(required=True, validate=lambda s: len(s) <= 255)
@@ -38,7 +72,8 @@ class TaskSchema(Schema):
 
     class Meta:
         model = Task
-        fields = ["task_id", "task_name", "status", "progress", "start_time", "end_time", "task_detail", "task_type"]
+        fields = ["task_id", "task_name", "status", "progress", "start_time", "end_time", "task_detail", "task_type",
+                  "priority"]
 
 
 class GetTaskPage_ResponseSchema(Schema):
@@ -53,4 +88,5 @@ class GetTaskPage_ResponseSchema(Schema):
 
     class Meta:
         model = Task
-        fields = ["task_id", "task_name", "status", "progress", "start_time", "end_time", "task_detail", "task_type"]
+        fields = ["task_id", "task_name", "status", "progress", "start_time", "end_time", "task_detail", "task_type",
+                  "priority"]
@@ -4,11 +4,13 @@ from vulcanus.restful.response import BaseResponse
 from vulcanus.conf.constant import HOSTS_FILTER
 
 from zeus.operation_service.app.settings import configuration
-from zeus.operation_service.app.serialize.task import GetTaskSchema, AddTaskSchema, TaskSchema, ModifyTaskSchedulerSchema
+from zeus.operation_service.app.serialize.task import GetTaskSchema, AddTaskSchema, TaskSchema, ModifyTaskSchedulerSchema, \
+    TaskResultStreamSchema, TaskResultGroupsSchema, TaskResultSearchSchema, TaskResultSchema
 from zeus.operation_service.app.proxy.task import TaskProxy
 from zeus.operation_service.app.core.task_manager import TaskManager
 from zeus.operation_service.app.core.framework.task.task_result.task_result_context import TaskResultContext
-from flask import request,g
+from zeus.operation_service.app.core.framework.task.task_result.task_result_stream import TaskResultStream
+from flask import request, g, Response, stream_with_context
 
 class TaskManageAPI(BaseResponse):
     @BaseResponse.handle(schema=GetTaskSchema, proxy=TaskProxy)
@@ -51,22 +53,135 @@ class TaskInfoManageAPI(BaseResponse):
     def get(self, callback: TaskProxy, task_id, **params):
         status_code, task, host_ids = callback.get_task_info(task_id)
         if task:
-            task =  TaskSchema().dump(task)
+            task = callback.apply_running_status(TaskSchema().dump(task))
             task['host_ids'] = host_ids
         return self.response(code=status_code, data=task)
     
     @BaseResponse.handle()
     def post(self, task_id):
         action = request.args.get('action')
+        # 重试时指定resume=true只重新执行上次失败和未执行的主机
+        params = {"resume": request.args.get('resume', '').lower() == 'true'}
         task_mng = TaskManager()
-        code, result = task_mng.do_action(task_id, action)
+        code, result = task_mng.do_action(task_id, action, params)
         return self.response(code=code, data=result)
 
 class TaskResultAPI(BaseResponse):
 
-    @BaseResponse.handle(proxy=TaskProxy)
+    @BaseResponse.handle(schema=TaskResultSchema, proxy=TaskProxy)
     def post(self, callback: TaskProxy, **params):
+        """
+        查询单台主机的执行结果，不指定分页参数时返回全部结果
+
+        Args:
+            task_id (str): 任务id
+            node_index (int): 主机序号
+            offset (int): 分页读取或搜索的起始位置
+            size (int): 分页读取的字节数
+            tail (int): 读取最后的行数
+            pattern (str): 搜索内容，regex为True时按正则表达式匹配
+            max_matches (int): 搜索返回的最大匹配行数
+
+        Returns:
+            dict: 结果内容及下一次读取的位置next_offset
+        """
         task = callback.get_task_by_id(params["task_id"])
         task_result = TaskResultContext(task)
         code, result = task_result.get_items_detail(params)
         return self.response(code=code, data=result)
+
+
+class TaskResultSearchAPI(BaseResponse):
+
+    @BaseResponse.handle(schema=TaskResultSearchSchema, proxy=TaskProxy)
+    def post(self, callback: TaskProxy, **params):
+        """
+        在任务所有主机的结果中搜索，返回输出匹配的主机，每次调用扫描的数据量有上限
+
+        Args:
+            task_id (str): 任务id
+            pattern (str): 搜索内容
+            regex (bool): pattern是否为正则表达式，默认按字面量匹配
+            ignore_case (bool): 是否忽略大小写
+            node_index (int): 开始搜索的主机，取上一次返回的next_node_index
+            offset (int): 该主机日志中开始搜索的位置，取上一次返回的next_offset
+
+        Returns:
+            dict: 匹配的主机及其第一个匹配行，has_more为True时从next_node_index、next_offset继续搜索
+        """
+        task = callback.get_task_by_id(params["task_id"])
+        if not task:
+            return self.response(code=state.NO_DATA)
+        task_result = TaskResultContext(task)
+        code, result = task_result.search_hosts(params)
+        return self.response(code=code, data=result)
+
+
+class TaskResultStreamAPI(BaseResponse):
+
+    @BaseResponse.handle(schema=TaskResultStreamSchema, proxy=TaskProxy)
+    def get(self, callback: TaskProxy, task_id, **params):
+        """
+        以server-sent events推送任务的主机状态变化和增量输出
+
+        Args:
+            status_offset (int): 主机状态的起始位置，取最后收到的status事件的offset
+            offsets (str): 各主机输出的起始位置，格式为ip:offset，多个以逗号分隔，取各主机最后收到的output事件的offset
+
+        Returns:
+            text/event-stream
+        """
+        task = callback.get_task_by_id(task_id)
+        if not task:
+            return self.response(code=state.NO_DATA)
+        stream = TaskResultStream(task, params["status_offset"], TaskResultStream.parse_offsets(params["offsets"]))
+        response = Response(stream_with_context(stream.events()), mimetype="text/event-stream")
+        response.headers["Cache-Control"] = "no-cache"
+        # 关闭反向代理的缓冲，事件到达即转发
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+
+
+class TaskTransferStatisticsAPI(BaseResponse):
+
+    @BaseResponse.handle(proxy=TaskProxy)
+    def get(self, callback: TaskProxy, task_id, **params):
+        task = callback.get_task_by_id(task_id)
+        if not task:
+            return self.response(code=state.NO_DATA)
+        task_result = TaskResultContext(task)
+        return self.response(code=state.SUCCEED, data=task_result.get_transfer_statistics())
+
+
+class TaskResultSummaryAPI(BaseResponse):
+
+    @BaseResponse.handle(proxy=TaskProxy)
+    def get(self, callback: TaskProxy, task_id, **params):
+        """任务结果汇总：退出码分布、失败主机、不同输出的数量"""
+        task = callback.get_task_by_id(task_id)
+        if not task:
+            return self.response(code=state.NO_DATA)
+        task_result = TaskResultContext(task)
+        status_code, result = task_result.get_result_summary()
+        return self.response(code=status_code, data=result)
+
+
+class TaskResultGroupsAPI(BaseResponse):
+
+    @BaseResponse.handle(schema=TaskResultGroupsSchema, proxy=TaskProxy)
+    def get(self, callback: TaskProxy, task_id, **params):
+        """
+        按输出对主机分组，相同退出码且输出只有空行、行尾空白差异的主机在同一组，每组只返回一份输出
+
+        Args:
+            work_node_name (str): 只返回该step的分组，不指定时返回所有step
+
+        Returns:
+            dict: 分组列表及任务主机总数
+        """
+        task = callback.get_task_by_id(task_id)
+        if not task:
+            return self.response(code=state.NO_DATA)
+        task_result = TaskResultContext(task)
+        status_code, result = task_result.get_output_groups(params)
+        return self.response(code=status_code, data=result)
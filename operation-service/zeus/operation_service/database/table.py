@@ -73,6 +73,11 @@ class Task(Base):
     task_type = Column(String(64))
 
     only_push = Column(Boolean)
+    # 等待执行的任务按优先级从高到低、入队时间从早到晚调度
+    priority = Column(Integer, default=5)
+    queue_time = Column(DateTime, nullable=True)
+    # 执行任务的进程标识，服务重启后只恢复已退出进程的任务
+    owner = Column(String(255), nullable=True)
     # asset被删除且[task引用为空]时,删除该巡检项（行）
 
 class OperateScript(Base):
@@ -48,7 +48,11 @@ CREATE TABLE IF NOT EXISTS `operation_task`  (
   `task_type` varchar(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NULL DEFAULT NULL,
   `task_total` int NULL DEFAULT NULL,
   `only_push` tinyint(1) NULL DEFAULT NULL,
-  PRIMARY KEY (`task_id`) USING BTREE
+  `priority` int NOT NULL DEFAULT 5,
+  `queue_time` datetime NULL DEFAULT NULL,
+  `owner` varchar(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NULL DEFAULT NULL,
+  PRIMARY KEY (`task_id`) USING BTREE,
+  INDEX `idx_status_priority`(`status`, `priority`, `queue_time`) USING BTREE
 ) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_bin ROW_FORMAT = Dynamic;
 
 -- ----------------------------
@@ -92,3 +96,34 @@ CREATE TABLE IF NOT EXISTS `script`  (
   `os_name` varchar(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NULL DEFAULT NULL,
   PRIMARY KEY (`script_id`) USING BTREE
 ) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_bin ROW_FORMAT = Dynamic;
+
+-- ----------------------------
+-- Upgrade operation_task for the task queue: add the scheduling columns and index on existing installs
+-- ----------------------------
+SET @sql = (SELECT IF(COUNT(*) = 0, 'ALTER TABLE `operation_task` ADD COLUMN `priority` int NOT NULL DEFAULT 5', 'DO 0')
+  FROM information_schema.COLUMNS
+  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'operation_task' AND COLUMN_NAME = 'priority');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET @sql = (SELECT IF(COUNT(*) = 0, 'ALTER TABLE `operation_task` ADD COLUMN `queue_time` datetime NULL DEFAULT NULL', 'DO 0')
+  FROM information_schema.COLUMNS
+  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'operation_task' AND COLUMN_NAME = 'queue_time');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET @sql = (SELECT IF(COUNT(*) = 0, 'ALTER TABLE `operation_task` ADD COLUMN `owner` varchar(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NULL DEFAULT NULL', 'DO 0')
+  FROM information_schema.COLUMNS
+  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'operation_task' AND COLUMN_NAME = 'owner');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET @sql = (SELECT IF(COUNT(*) = 0, 'ALTER TABLE `operation_task` ADD INDEX `idx_status_priority`(`status`, `priority`, `queue_time`) USING BTREE', 'DO 0')
+  FROM information_schema.STATISTICS
+  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'operation_task' AND INDEX_NAME = 'idx_status_priority');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
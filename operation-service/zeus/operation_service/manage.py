@@ -29,11 +29,33 @@ from vulcanus import init_application
 # from zeus.host_information_service.app.core.subscription import TaskCallbackSubscribe
 from zeus.operation_service.app.settings import configuration
 from zeus.operation_service.urls import URLS
+from zeus.operation_service.app.core.framework.task.task_pool import TaskPool
+from zeus.operation_service.app.core.framework.task.task_shard import ShardWorker
 
 app = init_application(name="zeus.operation_service", settings=configuration, register_urls=URLS, 
                        template=os.path.join(os.path.dirname(__file__), "templates"))
 
 
+def start_task_workers():
+    # 服务启动后继续调度等待中的任务
+    TaskPool().start()
+    # 启用分片时执行各进程分发的分片
+    ShardWorker().start()
+
+
+try:
+    import uwsgi
+    from uwsgidecorators import postfork
+except ImportError:
+    uwsgi = None
+
+if uwsgi is not None and uwsgi.masterpid() == os.getpid():
+    # uwsgi主进程加载应用后fork出工作进程，线程不会保留到工作进程中，在每个工作进程fork后启动
+    postfork(start_task_workers)
+else:
+    start_task_workers()
+
+
 # def register_service():
 #     """
 #     register service
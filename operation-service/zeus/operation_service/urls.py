@@ -31,7 +31,12 @@ from zeus.operation_service.app.views.operate import (
 from zeus.operation_service.app.views.task import (
     TaskManageAPI,
     TaskInfoManageAPI,
-    TaskResultAPI
+    TaskResultAPI,
+    TaskResultSearchAPI,
+    TaskResultStreamAPI,
+    TaskResultSummaryAPI,
+    TaskResultGroupsAPI,
+    TaskTransferStatisticsAPI
 )
 
 
@@ -45,7 +50,12 @@ URLS = [
     (OperateInfoManageAPI, "/operations/operate" + "/<string:operate_id>"),
     (TaskManageAPI, "/operations/tasks"),
     (TaskInfoManageAPI, "/operations/tasks" + "/<string:task_id>"),
-    (TaskResultAPI, "/operations/tasks/host_items_result")
+    (TaskResultAPI, "/operations/tasks/host_items_result"),
+    (TaskResultSearchAPI, "/operations/tasks/host_result_search"),
+    (TaskResultStreamAPI, "/operations/tasks" + "/<string:task_id>/result_stream"),
+    (TaskTransferStatisticsAPI, "/operations/tasks" + "/<string:task_id>/transfer_statistics"),
+    (TaskResultSummaryAPI, "/operations/tasks" + "/<string:task_id>/result_summary"),
+    (TaskResultGroupsAPI, "/operations/tasks" + "/<string:task_id>/result_groups")
     # (HostManageAPI, constant.HOSTS),
     # (HostInfoManageAPI, constant.HOSTS + "/<string:host_id>"),
     # (HostFilterAPI, constant.HOSTS_FILTER),